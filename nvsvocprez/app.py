@@ -1,7 +1,17 @@
 import logging
 import json
 
-from routes import about_page, contact_page, collection_pages, index_page, scheme_pages, sparql_pages
+from routes import (
+    about_page,
+    contact_page,
+    collection_pages,
+    index_page,
+    mappings,
+    ords,
+    scheme_pages,
+    sparql_pages,
+    standard_names,
+)
 
 from routes.fair_impact import endpoints as modapi_endpoints
 
@@ -13,6 +23,7 @@ from pathlib import Path
 import fastapi
 from fastapi import HTTPException
 import uvicorn
+from starlette.concurrency import run_in_threadpool
 from starlette.config import Config
 from starlette.requests import Request
 from starlette.responses import (
@@ -20,6 +31,7 @@ from starlette.responses import (
     Response,
     PlainTextResponse,
     JSONResponse,
+    StreamingResponse,
 )
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.staticfiles import StaticFiles
@@ -28,23 +40,27 @@ from pyldapi.renderer import RDF_MEDIATYPES
 from pyldapi.data import RDF_FILE_EXTS
 from profiles import void, nvs, skos, dd, vocpub, dcat, sdo
 from routes.utils import (
-    sparql_query,
-    sparql_construct,
+    construct_rdf,
+    TriplestoreError,
     cache_return,
     cache_clear,
+    collections_pickle,
     get_accepts,
     exists_triple,
     get_alt_profiles,
     get_alt_profile_objects,
     get_collection_query,
     get_ontologies,
+    prefetch_external_mappings,
 )
 
-from pyldapi import Renderer, ContainerRenderer, DisplayProperty
+from routes.collection_dumps import DumpNotReady, dump_not_ready_response, dump_response
+from routes.rdf_documents import document_response, load_document
+
+from pyldapi import ProfileRegistry, Renderer, ContainerRenderer, DisplayProperty
 from config import SYSTEM_URI, DATA_URI, PORT
-from rdflib import Graph, URIRef
-from rdflib import Literal as RdfLiteral, Namespace
-from rdflib.namespace import DC, DCTERMS, ORG, OWL, RDF, RDFS, SKOS, VOID
+from rdflib import Literal as RdfLiteral
+from rdflib.namespace import DCTERMS, OWL, RDF, RDFS, SKOS, VOID
 
 #### Initial Setup ####
 # NOTE: This should be refactored into a function/Class
@@ -88,6 +104,11 @@ acc_dep_map = {
     None: "",
 }
 
+STANDARD_NAME_PROFILES = ProfileRegistry({"nvs": nvs, "skos": skos, "vocpub": vocpub, "dd": dd})
+MAPPING_PROFILES = ProfileRegistry({"nvs": nvs})
+VOID_PROFILES = ProfileRegistry({"void": void})
+void_document = load_document(api_home_dir / "void.ttl", f"{DATA_URI}/.well_known/void")
+
 #### Add the imported routes to the API ####
 # NOTE: To be refactored into a function, or part of a Class.
 api.include_router(index_page.router)
@@ -100,6 +121,87 @@ api.include_router(sparql_pages.router)
 api.include_router(modapi_endpoints.router)
 
 
+@api.on_event("startup")
+def prefetch_ords():
+    # the external mappings of every collection are fetched while the first requests are served, not by them. If the
+    # collections index cache isn't filled yet, they're prefetched once it is, by cache_fill().
+    if collections_pickle.is_file():
+        ords.in_background(prefetch_external_mappings)
+
+
+class StandardNameRenderer(Renderer):
+    def __init__(self, request, acc_dep_or_concept):
+        self.acc_dep_or_concept = acc_dep_or_concept
+        self.instance_uri = f"{DATA_URI}/collection/P07/current/"
+        self.alt_profiles = get_alt_profiles()
+
+        super().__init__(request, self.instance_uri, STANDARD_NAME_PROFILES, "nvs")
+
+    def render(self):
+        snapshot = standard_names.get_standard_names()
+        if snapshot is None:
+            if self.mediatype == "text/html":
+                return templates.TemplateResponse(
+                    "error.html",
+                    {
+                        "request": self.request,
+                        "title": "DB Error",
+                        "status": "500",
+                        "message": "There was an error with accessing the Triplestore",
+                    },
+                )
+            return PlainTextResponse(
+                "There was an error obtaining the Standard Names from the Triplestore",
+                status_code=500,
+            )
+
+        if self.profile == "nvs":
+            if self.mediatype == "text/html":
+                collection = {
+                    **snapshot["collection"],
+                    "concepts": standard_names.get_concepts(snapshot, self.acc_dep_or_concept),
+                }
+
+                self.instance_uri = f"{DATA_URI}/standard_name/"
+
+                return templates.TemplateResponse(
+                    "collection.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "collection": collection,
+                        "profile_token": "nvs",
+                        "alt_profiles": self.alt_profiles,
+                    },
+                )
+            elif self.mediatype in RDF_MEDIATYPES:
+                try:
+                    dump = standard_names.get_nvs_dump(snapshot, self.mediatype)
+                except DumpNotReady:
+                    return dump_not_ready_response()
+                if dump is None:
+                    return PlainTextResponse(
+                        "There was an error obtaining the Concept RDF from the Triplestore",
+                        status_code=500,
+                    )
+                return dump_response(dump, self.request)
+        elif self.profile == "dd":
+            return Response(
+                standard_names.get_serialisation(snapshot, "dd", "application/json"),
+                media_type="application/json",
+            )
+        elif self.profile in ("skos", "vocpub"):
+            return Response(
+                standard_names.get_serialisation(snapshot, self.profile, self.mediatype),
+                media_type=self.mediatype,
+            )
+
+        self.instance_uri = f"{DATA_URI}/standard_name/"
+        alt = super().render()
+        if alt is not None:
+            return alt
+
+
 @api.get("/standard_name/", include_in_schema=False)
 @api.get("/standard_name/{concept_id}", include_in_schema=False)
 @api.get("/standard_name/{concept_id}/", **paths["/standard_name/{concept_id}/"]["get"])
@@ -109,247 +211,156 @@ api.include_router(modapi_endpoints.router)
 def standard_name(request: Request, concept_id: str = None):
     acc_dep_or_concept = concept_id
 
-    if not exists_triple(request.url.path) and request.url.path != "/standard_name/":
-        raise HTTPException(status_code=404)
-
     if acc_dep_or_concept not in ["accepted", "deprecated", "all", None]:
-        # this is a call for a Standard Name Concept
-        return standard_name_concept(request, acc_dep_or_concept)
-
-    class CollectionRenderer(Renderer):
-        def __init__(self):
-            self.instance_uri = f"{DATA_URI}/collection/P07/current/"
-            self.alt_profiles = get_alt_profiles()
-
-            super().__init__(
-                request,
-                self.instance_uri,
-                {"nvs": nvs, "skos": skos, "vocpub": vocpub, "dd": dd},
-                "nvs",
-            )
+        # this is a call for a Standard Name Concept, which must be the label of a P07 concept
+        concept_uri = standard_names.get_concept_uri(acc_dep_or_concept)
+        if not request.url.path.endswith("/") or concept_uri is None:
+            raise HTTPException(status_code=404)
+        return standard_name_concept(request, acc_dep_or_concept, concept_uri)
+
+    return StandardNameRenderer(request, acc_dep_or_concept).render()
+
+
+def standard_name_concept(request: Request, standard_name_concept_id: str, concept_uri: str):
+    # the P07 concept's data is shown under its /standard_name/ URI, in the /standard_name/ collection
+    c = collection_pages.ConceptRenderer(
+        request,
+        instance_uri=f"{standard_names.STANDARD_NAME_URI}{standard_name_concept_id}/",
+        concept_uri=concept_uri,
+        collection_uri=standard_names.STANDARD_NAME_URI,
+    )
+    return c.render()
 
-        def _render_sparql_response_rdf(self, sparql_response):
-            if sparql_response[0]:
-                return Response(
-                    (
-                        '<?xml version="1.0" encoding="UTF-8"?>\n'.encode() + sparql_response[1]
-                        if "xml" in self.mediatype
-                        else sparql_response[1]
-                    ),
-                    headers={"Content-Type": self.mediatype},
-                )
-            else:
-                return PlainTextResponse(
-                    "There was an error obtaining the Concept RDF from the Triplestore",
-                    status_code=500,
-                )
 
-        def _get_collection(self):
-            for collection in cache_return(collections_or_conceptschemes="collections"):
-                if collection["id"]["value"] == "P07":
-                    return collection
-
-        def _get_concepts(self):
-            q = """
-                PREFIX dcterms: <http://purl.org/dc/terms/>
-                PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                SELECT DISTINCT ?c ?id ?pl ?def ?date ?dep
-                WHERE {
-                        <xxx> skos:member ?x .
-                        ?x    						
-                            skos:prefLabel ?pl ;
-                            skos:definition ?def ;
-                            dcterms:date ?date ;
-                        .
-                        BIND (?pl AS ?id)
-                        BIND (CONCAT("/standard_name/", ?pl, "/") AS ?c)
-
-                        acc_dep
-                        OPTIONAL {
-                            ?x <http://www.w3.org/2002/07/owl#deprecated> ?dep .
-                        }
-
-                        FILTER(lang(?pl) = "en" || lang(?pl) = "") 
-                        FILTER(lang(?def) = "en" || lang(?def) = "")
-                }
-                ORDER BY ?pl
-                """.replace("xxx", self.instance_uri).replace(
-                "acc_dep", acc_dep_map.get(acc_dep_or_concept).replace("?c", "?x")
+MAPPINGS_MEDIATYPES = ["text/tab-separated-values", "application/n-triples"]
+
+
+@api.get("/mapping/", **paths["/mapping/"]["get"])
+@api.head("/mapping/", include_in_schema=False)
+@api.post("/mapping/", **paths["/mapping/"]["post"])
+async def mappings_batch(request: Request):
+    mapping_ids = request.query_params.getlist("id")
+    if request.method == "POST":
+        mapping_ids += (await request.body()).decode("utf-8").split()
+    collection_id = request.query_params.get("collection")
+
+    if bool(mapping_ids) == bool(collection_id):
+        return PlainTextResponse(
+            'Mappings must be requested either by "id", one or more Mapping IDs such as I/123, or by "collection", '
+            "the ID of the Collection of their subjects",
+            status_code=400,
+        )
+
+    mapping_uris = None
+    collection_uri = None
+    if mapping_ids:
+        mapping_uris = [mappings.mapping_uri(mapping_id) for mapping_id in mapping_ids]
+        invalid = [mapping_id for mapping_id, uri in zip(mapping_ids, mapping_uris) if uri is None]
+        if invalid:
+            return PlainTextResponse(
+                "These are not Mapping IDs, which must be either I/{id} or E/{id}: " + ", ".join(invalid),
+                status_code=400,
+            )
+        mapping_set_id = str(request.url)
+    else:
+        collection_uri = f"{DATA_URI}/collection/{collection_id}/current/"
+        # the index may need filling from the triplestore, which mustn't block the event loop
+        collections = await run_in_threadpool(cache_return, collections_or_conceptschemes="collections")
+        if collection_uri not in [c["uri"]["value"] for c in collections]:
+            raise HTTPException(status_code=404)
+        mapping_set_id = f"{DATA_URI}/mapping/?collection={collection_id}"
+
+    mediatype = request.query_params.get("_mediatype")
+    if mediatype is None:
+        accepted = [m for m in get_accepts(request.headers.get("Accept", "")) if m in MAPPINGS_MEDIATYPES]
+        mediatype = accepted[0] if accepted else MAPPINGS_MEDIATYPES[0]
+    if mediatype not in MAPPINGS_MEDIATYPES:
+        return PlainTextResponse(
+            "Mappings are available as " + " or ".join(MAPPINGS_MEDIATYPES),
+            status_code=406,
+        )
+
+    try:
+        records = await run_in_threadpool(mappings.fetch_first, mappings.iter_mappings(mapping_uris, collection_uri))
+    except TriplestoreError as exc:
+        logging.error(exc)
+        return PlainTextResponse("There was an error obtaining the Mappings from the Triplestore", status_code=500)
+    if mediatype == "application/n-triples":
+        content = mappings.ntriples(records)
+    else:
+        content = mappings.sssom_tsv(records, mapping_set_id)
+    return StreamingResponse(content, media_type=mediatype)
+
+
+class MappingRenderer(Renderer):
+    def __init__(self, request):
+        self.instance_uri = f"{DATA_URI}/mapping/" + str(request.url).split("/mapping/")[1].split("?")[0]
+
+        super().__init__(request, self.instance_uri, MAPPING_PROFILES, "nvs")
+
+    def render(self):
+        if "/I/" not in self.instance_uri and "/E/" not in self.instance_uri:
+            return PlainTextResponse(
+                'All requests for Mappings must contain either "I" or "E" in the URI',
+                status_code=400,
             )
 
-            sparql_result = sparql_query(q)
-            if sparql_result[0]:
-                return [
-                    {
-                        "systemUri": concept["c"]["value"],
-                        "id": concept["id"]["value"],
-                        "prefLabel": concept["pl"]["value"].replace("_", " "),
-                        "definition": concept["def"]["value"].replace("_", "_ "),
-                        "date": concept["date"]["value"][0:10],
-                        "deprecated": True if concept.get("dep") and concept["dep"]["value"] == "true" else False,
-                    }
-                    for concept in sparql_result[1]
-                ]
+        if self.profile == "nvs":
+            if self.mediatype in RDF_MEDIATYPES or self.mediatype in Renderer.RDF_SERIALIZER_TYPES_MAP:
+                return self._render_nvs_rdf()
             else:
-                return False
-
-        def render(self):
-            if self.profile == "nvs":
-                if self.mediatype == "text/html":
-                    collection = self._get_collection()
-                    collection["concepts"] = self._get_concepts()
-
-                    if not collection["concepts"]:
-                        return templates.TemplateResponse(
-                            "error.html",
-                            {
-                                "request": request,
-                                "title": "DB Error",
-                                "status": "500",
-                                "message": "There was an error with accessing the Triplestore",
-                            },
-                        )
-
-                    self.instance_uri = f"{DATA_URI}/standard_name/"
-
-                    return templates.TemplateResponse(
-                        "collection.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "collection": collection,
-                            "profile_token": "nvs",
-                            "alt_profiles": self.alt_profiles,
-                        },
-                    )
-                elif self.mediatype in RDF_MEDIATYPES:
-                    q = """
-                        PREFIX dc: <http://purl.org/dc/terms/>
-                        PREFIX dce: <http://purl.org/dc/elements/1.1/>
-                        PREFIX grg: <http://www.isotc211.org/schemas/grg/>
-                        PREFIX owl: <http://www.w3.org/2002/07/owl#>
-                        PREFIX pav: <http://purl.org/pav/>
-                        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-                        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                        PREFIX void: <http://rdfs.org/ns/void#>
-                                                
-                        CONSTRUCT {
-                            <DATA_URI/standard_name/> ?p ?o .                           
-                            <DATA_URI/standard_name/> skos:member ?m .                        
-                            ?m ?p2 ?o2 .   
-                        }
-                        WHERE {
-                            {
-                                <DATA_URI/collection/P07/current/> ?p ?o .                          
-                                MINUS { <DATA_URI/collection/P07/current/> skos:member ?o . }
-                            }
-                          
-                            {
-                                <DATA_URI/collection/P07/current/> skos:member ?mx .
-                                ?mx a skos:Concept ;
-                                      skos:prefLabel ?pl ;
-                                .
-                        
-                                FILTER(!isLiteral(?pl) || lang(?pl) = "en" || lang(?pl) = "")  
-                        
-                                ?mx ?p2 ?o2 .
-                                
-                                FILTER ( ?p2 != skos:broaderTransitive )
-                                FILTER ( ?p2 != skos:narrowerTransitive )
-                            }
-                          
-                            BIND (IRI(CONCAT("DATA_URI/standard_name/", STR(?pl), "/")) AS ?m)
-                        }
-                        """.replace("DATA_URI", DATA_URI)
-                    return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile == "dd":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    SELECT DISTINCT ?c ?pl ?b
-                    WHERE {
-                        <xxx> skos:member ?xc .
-                        ?xc skos:prefLabel ?xpl .
-                        
-                        BIND (CONCAT("DATA_URI/standard_name/", ?xpl, "/") AS ?c)
-                        BIND (REPLACE(?xpl, "_", " ") AS ?pl)
-                    }
-                    ORDER BY ?pl                
-                    """.replace("xxx", self.instance_uri).replace("DATA_URI", DATA_URI)
-                r = sparql_query(q)
-                return JSONResponse([{"uri": x["c"]["value"], "prefLabel": x["pl"]["value"]} for x in r[1]])
-            elif self.profile == "skos":
-                q = """
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>                    
-                    CONSTRUCT {
-                        <DATA_URI/standard_name/> 
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            skos:definition ?description ;
-                            skos:member ?c .
-                        ?c skos:prefLabel ?c_pl .
-                    }
-                    WHERE {
-                        <xxx> 
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            <http://purl.org/dc/terms/description> ?description ;
-                            skos:member ?xc .
-                        ?xc skos:prefLabel ?xc_pl .
-                        
-                        BIND (CONCAT("DATA_URI/standard_name/", ?xc_pl, "/") AS ?c)
-                        BIND (REPLACE(?xc_pl, "_", " ") AS ?c_pl)                        
-                    }
-                    ORDER BY ?prefLabel
-                    """.replace("xxx", self.instance_uri).replace("DATA_URI", DATA_URI)
-                return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile == "vocpub":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-                    CONSTRUCT {
-                        <DATA_URI/standard_name/> 
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            skos:definition ?description ;
-                            dcterms:modified ?modified ;
-                            dcterms:creator ?creator ;
-                            dcterms:publisher ?publisher ;   
-                            dcterms:provenance "Made by NERC and maintained within the NERC Vocabulary Server" ;                            
-                            skos:member ?c .
-                        ?c skos:prefLabel ?c_pl .
-                    }
-                    WHERE {
-                        <xxx> 
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;                            
-                            dcterms:description ?description ;
-                            dcterms:date ?date ;
-                            dcterms:creator ?creator ;
-                            dcterms:publisher ?publisher ;                             
-                            skos:member ?xc .
-                        ?xc skos:prefLabel ?xc_pl .
-                        
-                        BIND (CONCAT("DATA_URI/standard_name/", ?xc_pl, "/") AS ?c)
-                        BIND (REPLACE(?xc_pl, "_", " ") AS ?c_pl)
-                        BIND (STRDT(REPLACE(STRBEFORE(?date, "."), " ", "T"), xsd:dateTime) AS ?modified)
-                    }
-                    ORDER BY ?xc                    
-                    """.replace("xxx", self.instance_uri).replace("DATA_URI", DATA_URI)
-                return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-
-            self.instance_uri = f"{DATA_URI}/standard_name/"
-            alt = super().render()
-            if alt is not None:
-                return alt
-
-    return CollectionRenderer().render()
-
-
-def standard_name_concept(request: Request, standard_name_concept_id: str):
-    c = collection_pages.ConceptRenderer(request)
-    return c.render()
+                return self._render_nvs_html()
+
+        # try returning alt profile
+        response = super().render()
+        if response is not None:
+            return response
+
+    def _render_nvs_rdf(self):
+        r = construct_rdf(mappings.get_mapping_construct_query(self.instance_uri), self.mediatype)
+        if not r[0]:
+            return PlainTextResponse(
+                "There was an error obtaining the Mapping RDF from the Triplestore",
+                status_code=500,
+            )
+        return Response(
+            r[1],
+            headers={"Content-Type": self.mediatype},
+        )
+
+    def _render_nvs_html(self):
+        try:
+            mapping = mappings.get_mapping(self.instance_uri)
+        except TriplestoreError:
+            return PlainTextResponse(
+                "There was an error obtaining the Mapping from the Triplestore",
+                status_code=500,
+            )
+        if mapping is None:
+            return PlainTextResponse(
+                "The URI you supplied for the Mapping does not exist",
+                status_code=400,
+            )
+
+        context = {
+            "request": self.request,
+            "uri": self.instance_uri,
+            "systemUri": self.instance_uri.replace(DATA_URI, ""),
+            "subject": mapping["subject"],
+            "subjectSystemUri": mapping["subject"].replace(DATA_URI, ""),
+            "predicate": mapping["predicate"],
+            "predicateSystemUri": mapping["predicate"].replace(DATA_URI, ""),
+            "object": mapping["object"],
+            "objectSystemUri": mapping["object"].replace(DATA_URI, ""),
+            "modified": mapping.get("modified"),
+            "status": mapping.get("status"),
+            "submitter_title": mapping.get("title"),
+            "submitter_name": mapping.get("name"),
+            "submitter_memberof": mapping.get("memberof"),
+            "profile_token": self.profile,
+        }
+
+        return templates.TemplateResponse("mapping.html", context=context)
 
 
 @api.get("/mapping/{int_ext}/{mapping_id}/", **paths["/mapping/{int_ext}/{mapping_id}/"]["get"])
@@ -358,106 +369,7 @@ def mapping(request: Request):
     if not exists_triple(request.url.path):
         raise HTTPException(status_code=404)
 
-    class MappingRenderer(Renderer):
-        def __init__(self):
-            self.instance_uri = f"{DATA_URI}/mapping/" + str(request.url).split("/mapping/")[1].split("?")[0]
-
-            super().__init__(request, self.instance_uri, {"nvs": nvs}, "nvs")
-
-        def render(self):
-            if "/I/" not in self.instance_uri and "/E/" not in self.instance_uri:
-                return PlainTextResponse(
-                    'All requests for Mappings must contain either "I" or "E" in the URI',
-                    status_code=400,
-                )
-
-            if self.profile == "nvs":
-                g = self._get_mapping_rdf()
-                if not g:
-                    return PlainTextResponse(
-                        "There was an error obtaining the Collections RDF from the Triplestore",
-                        status_code=500,
-                    )
-                if len(g) == 0:
-                    return PlainTextResponse(
-                        "The URI you supplied for the Mapping does not exist",
-                        status_code=400,
-                    )
-
-                if self.mediatype in RDF_MEDIATYPES or self.mediatype in Renderer.RDF_SERIALIZER_TYPES_MAP:
-                    return self._render_nvs_rdf(g)
-                else:
-                    return self._render_nvs_html(g)
-
-            # try returning alt profile
-            response = super().render()
-            if response is not None:
-                return response
-
-        def _get_mapping_rdf(self):
-            r = sparql_construct(f"DESCRIBE <{self.instance_uri}>")
-            if r[0]:
-                return Graph().parse(r[1])
-            else:
-                return False
-
-        def _render_nvs_rdf(self, g):
-            g.bind("dc", DC)
-            REG = Namespace("http://purl.org/linked-data/registry#")
-            g.bind("reg", REG)
-            g.bind("org", ORG)
-
-            # handle broken Org URI use
-            broken = URIRef("http://www.w3.org/ns/org#")
-            for s, o in g.subject_objects(predicate=broken):
-                g.remove((s, broken, o))
-                g.add((s, ORG.Organization, o))
-
-            return self._make_rdf_response(g)
-
-        def _render_nvs_html(self, g):
-            mapping = {}
-            for p, o in g.predicate_objects(subject=URIRef(self.instance_uri)):
-                if str(p) == "https://w3id.org/sssom/schema/subject_id":
-                    mapping["subject"] = str(o)
-                elif str(p) == "https://w3id.org/sssom/schema/predicate_id":
-                    mapping["predicate"] = str(o)
-                elif str(p) == "https://w3id.org/sssom/schema/object_id":
-                    mapping["object"] = str(o)
-                elif str(p) == "http://purl.org/dc/elements/1.1/modified":
-                    mapping["modified"] = str(o)
-                elif str(p) == "http://purl.org/linked-data/registry#status":
-                    mapping["status"] = str(o)
-                elif str(p) == "http://purl.org/linked-data/registry#submitter":
-                    for p2, o2 in g.predicate_objects(subject=o):
-                        if str(p2) == "http://purl.org/linked-data/registry#title":
-                            mapping["title"] = str(o2)
-                        elif str(p2) == "http://purl.org/linked-data/registry#name":
-                            mapping["name"] = str(o2)
-                        elif str(p2) == "http://www.w3.org/ns/org#memberOf":
-                            mapping["memberof"] = str(o2)
-
-            context = {
-                "request": request,
-                "uri": self.instance_uri,
-                "systemUri": self.instance_uri.replace(DATA_URI, ""),
-                "subject": mapping["subject"],
-                "subjectSystemUri": mapping["subject"].replace(DATA_URI, ""),
-                "predicate": mapping["predicate"],
-                "predicateSystemUri": mapping["predicate"].replace(DATA_URI, ""),
-                "object": mapping["object"],
-                "objectSystemUri": mapping["object"].replace(DATA_URI, ""),
-                "modified": mapping["modified"],
-                "status": mapping["status"],
-                "submitter_title": mapping.get("title"),
-                "submitter_name": mapping.get("name"),
-                "submitter_memberof": mapping.get("memberof"),
-                "profile_token": self.profile,
-            }
-
-            return templates.TemplateResponse("mapping.html", context=context)
-
-    return MappingRenderer().render()
+    return MappingRenderer(request).render()
 
 
 @api.get("/.well_known/", include_in_schema=False)
@@ -466,6 +378,14 @@ def well_known(request: Request):
     return RedirectResponse(url="/.well_known/void")
 
 
+class WkRenderer(Renderer):
+    def __init__(self, request):
+        super().__init__(request, f"{DATA_URI}/.well_known/void", VOID_PROFILES, "void")
+
+    def render(self):
+        return document_response(self.request, void_document, self.mediatype)
+
+
 @api.get("/.well_known/void", include_in_schema=False)
 @api.head("/.well_known/void", include_in_schema=False)
 def well_known_void(
@@ -473,30 +393,7 @@ def well_known_void(
     _profile: Optional[AnyStr] = None,
     _mediatype: Optional[AnyStr] = "text/turtle",
 ):
-    void_file = api_home_dir / "void.ttl"
-
-    class WkRenderer(Renderer):
-        def __init__(self):
-            super().__init__(
-                request,
-                f"{DATA_URI}/.well_known/void",
-                {"void": void},
-                "void",
-            )
-
-        def render(self):
-            if self.mediatype == "text/turtle":
-                return Response(open(void_file).read(), headers={"Content-Type": "text/turtle"})
-            else:
-                from rdflib import Graph
-
-                g = Graph().parse(void_file, format="turtle")
-                return Response(
-                    content=g.serialize(format=self.mediatype),
-                    headers={"Content-Type": self.mediatype},
-                )
-
-    return WkRenderer().render()
+    return WkRenderer(request).render()
 
 
 @api.get("/cache-clear", include_in_schema=False)
@@ -505,5 +402,11 @@ def cache_clr(request: Request):
     return PlainTextResponse("Cache cleared")
 
 
+@api.get("/cache-stats", include_in_schema=False)
+def cache_stats(request: Request):
+    # only a logged in user sees where the cache is and the worker's pid
+    return JSONResponse({"ords": ords.ords_cache.telemetry(detailed="user" in request.session)})
+
+
 if __name__ == "__main__":
     uvicorn.run(api, port=PORT, host=SYSTEM_URI)
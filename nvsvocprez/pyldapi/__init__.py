@@ -1,5 +1,5 @@
-from .renderer import Renderer
-from .renderer_container import ContainerRenderer
+from .renderer import ProfileRegistry, Renderer
+from .renderer_container import CONTAINER_PROFILES, ContainerRenderer
 from .exceptions import *
 from .data import *
 from .display_property import DisplayProperty
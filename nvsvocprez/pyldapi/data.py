@@ -1,11 +1,15 @@
-MEDIATYPE_NAMES = {
-    "text/html": "HTML",
-    "text/turtle": "Turtle",
-    "application/rdf+xml": "RDF/XML",
-    "application/ld+json": "JSON-LD",
-    "application/json": "JSON",
-    "application/n-triples": "N-triples",
-}
+from types import MappingProxyType
+
+MEDIATYPE_NAMES = MappingProxyType(
+    {
+        "text/html": "HTML",
+        "text/turtle": "Turtle",
+        "application/rdf+xml": "RDF/XML",
+        "application/ld+json": "JSON-LD",
+        "application/json": "JSON",
+        "application/n-triples": "N-triples",
+    }
+)
 RDF_MEDIATYPES = [
     "text/turtle",
     "application/rdf+xml",
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 import logging
 from abc import ABCMeta
+from functools import lru_cache
+from collections.abc import Mapping
+from itertools import chain, count
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
 
-from fastapi.responses import Response, JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, Response, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-
-from rdflib import Graph, Namespace, URIRef, BNode, Literal
-from rdflib.namespace import PROF, RDF, RDFS, XSD
-from rdflib.namespace import DCTERMS
+from rdflib import BNode, Literal, Namespace, URIRef
+from rdflib.namespace import DCTERMS, RDF, RDFS, XSD
 
 from .data import MEDIATYPE_NAMES, RDF_MEDIATYPES
 from .exceptions import ProfilesMediatypesException
@@ -16,10 +19,268 @@ from .profile import Profile
 import connegp
 from pathlib import Path
 from routes import utils
+from routes.rdf_writer import serialise
 
 api_home_dir = Path(__file__).parent.parent
 templates = Jinja2Templates(str(api_home_dir / "view" / "templates"))
 
+# Clients send few distinct Accept, Accept-Profile and Accept-Language headers and _profile values, so each is parsed
+# once and its result kept, by the raw string, in an LRU cache of this many entries
+CONNEG_CACHE_SIZE = 1024
+# the Link headers of a profile set are made once as templates, with this in place of the instance URI
+INSTANCE_URI = "{instance_uri}"
+
+
+@lru_cache(maxsize=CONNEG_CACHE_SIZE)
+def parse_profile_qsa(profiles_string: str) -> Optional[Tuple[str, ...]]:
+    """Parse a _profile or _view QSA into profile tokens and <URI>s in descending preference order, or None if it's
+    invalid."""
+    pqsa = connegp.ProfileQsaParser(profiles_string)
+    if not pqsa.valid:
+        return None
+    return tuple(p["profile"] for p in pqsa.profiles)
+
+
+@lru_cache(maxsize=CONNEG_CACHE_SIZE)
+def parse_accept_profile(accept_profile: str) -> Optional[Tuple[str, ...]]:
+    """Parse an Accept-Profile header into profile URIs in descending weighted order, or None if it's invalid."""
+    try:
+        ap = connegp.AcceptProfileHeaderParser(accept_profile)
+        if not ap.valid:
+            return None
+        return tuple(p["profile"] for p in ap.profiles)
+    except Exception:
+        msg = "You have requested a profile using an Accept-Profile header that is incorrectly formatted."
+        raise ProfilesMediatypesException(msg)
+
+
+@lru_cache(maxsize=CONNEG_CACHE_SIZE)
+def parse_accept(accept: str) -> Tuple[str, ...]:
+    """Parse an Accept header into Media Types in descending weighted order."""
+    try:
+        # Chrome breaking Accept header variable by adding v=b3
+        # Issue https://github.com/RDFLib/pyLDAPI/issues/21
+        mediatypes_string = re.sub("v=(.*);", "", accept)
+
+        # split the header into individual URIs, with weights still attached
+        mediatypes = mediatypes_string.split(",")
+
+        # remove \s
+        mediatypes = [x.strip() for x in mediatypes]
+
+        # split off any weights and sort by them with default weight = 1
+        mediatypes = [
+            (
+                float(x.split(";")[1].replace("q=", "")) if ";q=" in x else 1,
+                x.split(";")[0],
+            )
+            for x in mediatypes
+        ]
+
+        # sort profiles by weight, heaviest first
+        mediatypes.sort(reverse=True)
+
+        # return only the orderd list of mediatypes, not weights
+        return tuple(x[1] for x in mediatypes)
+    except Exception:
+        raise ProfilesMediatypesException(
+            "You have requested a Media Type using an Accept header that is incorrectly formatted."
+        )
+
+
+@lru_cache(maxsize=CONNEG_CACHE_SIZE)
+def parse_accept_language(accept_language: str) -> Tuple[str, ...]:
+    """Parse an Accept-Language header into languages in descending weighted order."""
+    try:
+        # split the header into individual URIs, with weights still attached
+        languages = accept_language.split(",")
+        # remove \s
+        languages = [x.strip() for x in languages]
+
+        # split off any weights and sort by them with default weight = 1
+        languages = [
+            (
+                float(x.split(";")[1].replace("q=", "")) if len(x.split(";")) == 2 else 1,
+                x.split(";")[0],
+            )
+            for x in languages
+        ]
+
+        # sort profiles by weight, heaviest first
+        languages.sort(reverse=True)
+
+        # return only the orderd list of languages, not weights
+        return tuple(x[1] for x in languages)
+    except Exception:
+        raise ProfilesMediatypesException(
+            "You have requested a language using an Accept-Language header that is incorrectly formatted."
+        )
+
+
+def profiles_key(profiles: Dict[str, Profile]) -> Tuple:
+    """The parts of a set of profiles that conneg, the Link headers and the alternates view depend on, as a cache key.
+
+    Returns (Tuple): A (token, uri, mediatypes, default_mediatype, label, comment, languages, default_language) tuple
+    per profile.
+    """
+    return tuple(
+        (
+            token,
+            str(profile.uri),
+            tuple(profile.mediatypes),
+            profile.default_mediatype,
+            str(profile.label),
+            str(profile.comment),
+            tuple(profile.languages) if profile.languages is not None else ("en",),
+            str(profile.default_language),
+        )
+        for token, profile in profiles.items()
+    )
+
+
+@lru_cache(maxsize=256)
+def available_profiles(profiles_key: Tuple) -> Tuple[Dict[str, str], str]:
+    """The {profile URI: token} of a set of profiles, and their Link header profile token entries."""
+    uris = {}
+    individual_links = []
+    link_header_template = '<http://www.w3.org/ns/dx/prof/Profile>; rel="type"; token="{}"; anchor=<{}>, '
+    for token, uri, *_ in profiles_key:
+        uris[uri] = token
+        individual_links.append(link_header_template.format(token, uri))
+    return uris, "".join(individual_links).rstrip(", ")
+
+
+@lru_cache(maxsize=256)
+def profile_links_template(profiles_key: Tuple, default_profile_token: str, default_mediatype: str) -> str:
+    """The Link header entries of a set of profiles, one per profile and Media Type, with INSTANCE_URI in place of the
+    instance URI. The default profile's default_mediatype one is rel="self"."""
+    individual_links = []
+    for token, uri, mediatypes, *_ in profiles_key:
+        # create an individual Link statement per Media Type
+        for mediatype in mediatypes:
+            # set the rel="self" just for this profile & mediatype
+            if mediatype != "_internal":
+                if token == default_profile_token and mediatype == default_mediatype:
+                    rel = "self"
+                else:
+                    rel = "alternate"
+
+                individual_links.append(
+                    '<{}?_profile={}&_mediatype={}>; rel="{}"; type="{}"; profile="{}", '.format(
+                        INSTANCE_URI,
+                        token,
+                        mediatype,
+                        rel,
+                        mediatype,
+                        uri,
+                    )
+                )
+
+    return "".join(individual_links).rstrip(", ")
+
+
+@lru_cache(maxsize=256)
+def alternates_profiles(profiles_key: Tuple) -> MappingProxyType:
+    """The profiles of a set of profiles as the alt.html template lists them, {token: {label, comment, ...}}."""
+    return MappingProxyType(
+        {
+            token: MappingProxyType(
+                {
+                    "label": label,
+                    "comment": comment,
+                    "mediatypes": list(mediatypes),
+                    "default_mediatype": default_mediatype,
+                    "languages": list(languages),
+                    "default_language": default_language,
+                    "uri": uri,
+                }
+            )
+            for token, uri, mediatypes, default_mediatype, label, comment, languages, default_language in profiles_key
+        }
+    )
+
+
+ALTR = Namespace("http://www.w3.org/ns/dx/conneg/altr#")
+PROF = Namespace("http://www.w3.org/ns/dx/prof/")
+# the prefixes the alternates view is written with in Turtle, RDF/XML and JSON-LD
+ALTERNATES_NAMESPACES = {"altr": str(ALTR), "dct": str(DCTERMS), "prof": str(PROF), "rdf": str(RDF), "rdfs": str(RDFS)}
+
+
+@lru_cache(maxsize=256)
+def alternates_triples(profiles_key: Tuple, default_profile_token: str) -> Tuple[Tuple, Tuple]:
+    """The Alt R Data Model, https://www.w3.org/TR/dx-prof-conneg/#altr, of a set of profiles: the profiles with
+    their labels and comments and a Representation per profile and Media Type.
+
+    Returns (Tuple): The (predicate, object) pairs of the instance, and the triples of the profiles and
+    representations, which don't depend on the instance.
+    """
+    instance = []
+    triples = []
+    node_ids = count()
+    for token, uri, mediatypes, default_mediatype, label, comment, *_ in profiles_key:
+        profile = URIRef(uri)
+        triples += [
+            (profile, RDF.type, PROF.Profile),
+            (profile, RDFS.label, Literal(label)),
+            (profile, RDFS.comment, Literal(comment)),
+        ]
+    for token, uri, mediatypes, default_mediatype, *_ in profiles_key:
+        for mediatype in mediatypes:
+            representation = BNode("r{}".format(next(node_ids)))
+            instance.append((ALTR.hasRepresentation, representation))
+            if token == default_profile_token and mediatype == default_mediatype:
+                instance.append((ALTR.hasDefaultRepresentation, representation))
+            triples += [
+                (representation, RDF.type, ALTR.Representation),
+                (representation, DCTERMS.conformsTo, URIRef(uri)),
+                (representation, DCTERMS["format"], Literal(mediatype)),
+                (representation, PROF.hasToken, Literal(token, datatype=XSD.token)),
+            ]
+            if mediatype == default_mediatype:
+                triples.append((representation, ALTR.isProfilesDefault, Literal(True)))
+    return tuple(instance), tuple(triples)
+
+
+def alternates_rdf(profiles_key: Tuple, default_profile_token: str, instance_uri: str, mediatype: str) -> bytes:
+    """The alternates view of an instance in an RDF Media Type, written by routes.rdf_writer."""
+    instance_pairs, triples = alternates_triples(profiles_key, default_profile_token)
+    instance = URIRef(instance_uri)
+    return serialise(chain(((instance, p, o) for p, o in instance_pairs), triples), mediatype, ALTERNATES_NAMESPACES)
+
+
+# the Alternates profile every Renderer has, shared by all of them
+alternates = Profile(
+    uri="http://www.w3.org/ns/dx/conneg/altr",  # the ConnegP URI for Alt Rep Data Model
+    id="alt",
+    label="Alternate Representations",
+    comment="The representation of the resource that lists all other representations (profiles and Media Types)",
+    mediatypes=["text/html", "application/json"] + RDF_MEDIATYPES,
+    default_mediatype="text/html",
+    languages=["en"],
+    default_language="en",
+)
+
+
+class ProfileRegistry(Mapping):
+    """An immutable {token: Profile} map of the given profiles and the Alternates profile, with its conneg cache key.
+
+    Renderers given a registry, rather than a dict of profiles, use it as is, so one made at import time for a page's
+    fixed set of profiles is shared by all its requests.
+    """
+
+    def __init__(self, profiles: Dict[str, Profile]):
+        self._profiles = MappingProxyType({**profiles, "alt": alternates})
+        self.key = profiles_key(self._profiles)
+
+    def __getitem__(self, token):
+        return self._profiles[token]
+
+    def __iter__(self):
+        return iter(self._profiles)
+
+    def __len__(self):
+        return len(self._profiles)
+
 
 class Renderer(object, metaclass=ABCMeta):
     """
@@ -59,23 +320,15 @@ class Renderer(object, metaclass=ABCMeta):
         self.request = request
         self.instance_uri = instance_uri
 
-        # ensure alternates token isn't hogged by user
-        for k, v in profiles.items():
-            if k == "alt":
+        if isinstance(profiles, ProfileRegistry):
+            self.profiles = profiles
+        else:
+            # ensure alternates token isn't hogged by user
+            if "alt" in profiles:
                 self.vf_error = "You must not manually add a profile with token 'alt' as this is auto-created."
 
-        self.profiles = profiles
-        # auto-add in an Alternates profile
-        self.profiles["alt"] = Profile(
-            uri="http://www.w3.org/ns/dx/conneg/altr",  # the ConnegP URI for Alt Rep Data Model
-            id="alt",
-            label="Alternate Representations",
-            comment="The representation of the resource that lists all other representations (profiles and Media Types)",
-            mediatypes=["text/html", "application/json"] + RDF_MEDIATYPES,
-            default_mediatype="text/html",
-            languages=["en"],
-            default_language="en",
-        )
+            # auto-add in an Alternates profile
+            self.profiles = ProfileRegistry(profiles)
         self.profile = None
 
         # ensure that the default profile is actually a given profile
@@ -92,6 +345,7 @@ class Renderer(object, metaclass=ABCMeta):
             )
 
         self.default_profile_token = default_profile_token
+        self.profiles_key = self.profiles.key
 
         # TODO: supply an alternates.html template
         self.alt_template = alternates_template
@@ -103,7 +357,7 @@ class Renderer(object, metaclass=ABCMeta):
 
         self.mediatype_names = MEDIATYPE_NAMES
         if extra_mediatype_names is not None:
-            self.mediatype_names.update(extra_mediatype_names)
+            self.mediatype_names = MappingProxyType({**MEDIATYPE_NAMES, **extra_mediatype_names})
 
         # make headers only if there's no error
         if self.vf_error is None:
@@ -129,20 +383,19 @@ class Renderer(object, metaclass=ABCMeta):
         """
         # try QSAa and, if we have any, return them only
         profiles_string = self.request.query_params.get("_view", self.request.query_params.get("_profile"))
-        # profiles_string = None  # TODO: Change request from Flask to FastAPI
         if profiles_string is not None:
-            pqsa = connegp.ProfileQsaParser(profiles_string)
-            if pqsa.valid:
+            requested = parse_profile_qsa(profiles_string)
+            if requested is not None:
                 profiles = []
-                for profile in pqsa.profiles:
-                    if profile["profile"].startswith("<"):
+                for requested_profile in requested:
+                    if requested_profile.startswith("<"):
                         # convert this valid URI/URN to a token
                         for token, profile in self.profiles.items():
-                            if profile.uri == profile["profile"].strip("<>"):
+                            if profile.uri == requested_profile.strip("<>"):
                                 profiles.append(token)
                     else:
                         # it's already a token so just add it
-                        profiles.append(profile["profile"])
+                        profiles.append(requested_profile)
                 if len(profiles) > 0:
                     return profiles
 
@@ -155,34 +408,20 @@ class Renderer(object, metaclass=ABCMeta):
         :return: List of URIs of accept profiles in descending request order
         :rtype: list
         """
-        if self.request.headers.get("Accept-Profile") is not None:
-            try:
-                ap = connegp.AcceptProfileHeaderParser(self.request.headers.get("Accept-Profile"))
-                if ap.valid:
-                    profiles = []
-                    for p in ap.profiles:
-                        # convert this valid URI/URN to a token
-                        for token, profile in self.profiles.items():
-                            if profile.uri == p["profile"]:
-                                profiles.append(token)
-                    if len(profiles) == 0:
-                        return None
-                    else:
-                        return profiles
-                else:
-                    return None
-            except Exception:
-                msg = "You have requested a profile using an Accept-Profile header that is incorrectly formatted."
-                raise ProfilesMediatypesException(msg)
-        else:
+        accept_profile = self.request.headers.get("Accept-Profile")
+        if accept_profile is None:
+            return None
+        requested = parse_accept_profile(accept_profile)
+        if requested is None:
             return None
+        # convert each valid URI/URN to a token
+        profiles = [token for uri in requested for token, profile in self.profiles.items() if profile.uri == uri]
+        if len(profiles) == 0:
+            return None
+        return profiles
 
     def _get_available_profiles(self):
-        uris = {}
-        for token, profile in self.profiles.items():
-            uris[profile.uri] = token
-
-        return uris
+        return available_profiles(self.profiles_key)[0]
 
     def _get_profile(self) -> str:
         # if we get a profile from QSA, use that
@@ -225,35 +464,7 @@ class Renderer(object, metaclass=ABCMeta):
         """
         if hasattr(self.request, "headers"):
             if self.request.headers.get("Accept") is not None:
-                try:
-                    # Chrome breaking Accept header variable by adding v=b3
-                    # Issue https://github.com/RDFLib/pyLDAPI/issues/21
-                    mediatypes_string = re.sub("v=(.*);", "", self.request.headers["Accept"])
-
-                    # split the header into individual URIs, with weights still attached
-                    mediatypes = mediatypes_string.split(",")
-
-                    # remove \s
-                    mediatypes = [x.strip() for x in mediatypes]
-
-                    # split off any weights and sort by them with default weight = 1
-                    mediatypes = [
-                        (
-                            float(x.split(";")[1].replace("q=", "")) if ";q=" in x else 1,
-                            x.split(";")[0],
-                        )
-                        for x in mediatypes
-                    ]
-
-                    # sort profiles by weight, heaviest first
-                    mediatypes.sort(reverse=True)
-
-                    # return only the orderd list of mediatypes, not weights
-                    return [x[1] for x in mediatypes]
-                except Exception:
-                    raise ProfilesMediatypesException(
-                        "You have requested a Media Type using an Accept header that is incorrectly formatted."
-                    )
+                return list(parse_accept(self.request.headers["Accept"]))
 
         return None
 
@@ -302,30 +513,7 @@ class Renderer(object, metaclass=ABCMeta):
         """
         if hasattr(self.request, "headers"):
             if self.request.headers.get("Accept-Language") is not None:
-                try:
-                    # split the header into individual URIs, with weights still attached
-                    languages = self.request.headers["Accept-Language"].split(",")
-                    # remove \s
-                    languages = [x.strip() for x in languages]
-
-                    # split off any weights and sort by them with default weight = 1
-                    languages = [
-                        (
-                            float(x.split(";")[1].replace("q=", "")) if len(x.split(";")) == 2 else 1,
-                            x.split(";")[0],
-                        )
-                        for x in languages
-                    ]
-
-                    # sort profiles by weight, heaviest first
-                    languages.sort(reverse=True)
-
-                    # return only the orderd list of languages, not weights
-                    return [x[1] for x in languages]
-                except Exception:
-                    raise ProfilesMediatypesException(
-                        "You have requested a language using an Accept-Language header that is incorrectly formatted."
-                    )
+                return list(parse_accept_language(self.request.headers["Accept-Language"]))
 
         return None
 
@@ -354,87 +542,13 @@ class Renderer(object, metaclass=ABCMeta):
         return self.profiles[self.profile].default_language
 
     def _make_header_link_tokens(self):
-        individual_links = []
-        link_header_template = '<http://www.w3.org/ns/dx/prof/Profile>; rel="type"; token="{}"; anchor=<{}>, '
-
-        for token, profile in self.profiles.items():
-            individual_links.append(link_header_template.format(token, profile.uri))
-
-        return "".join(individual_links).rstrip(", ")
+        return available_profiles(self.profiles_key)[1]
 
     def _make_header_link_list_profiles(self):
-        individual_links = []
-        for token, profile in self.profiles.items():
-            # create an individual Link statement per Media Type
-            for mediatype in profile.mediatypes:
-                # set the rel="self" just for this profile & mediatype
-                if mediatype != "_internal":
-                    if (
-                        token == self.default_profile_token
-                        and mediatype == self.profiles[self.profile].default_mediatype
-                    ):
-                        rel = "self"
-                    else:
-                        rel = "alternate"
-
-                    individual_links.append(
-                        '<{}?_profile={}&_mediatype={}>; rel="{}"; type="{}"; profile="{}", '.format(
-                            self.instance_uri,
-                            token,
-                            mediatype,
-                            rel,
-                            mediatype,
-                            profile.uri,
-                        )
-                    )
-
-        # append to, or create, Link header
-        return "".join(individual_links).rstrip(", ")
-
-    def _generate_alt_profiles_rdf(self):
-        # Alt R Data Model as per https://www.w3.org/TR/dx-prof-conneg/#altr
-        g = Graph()
-        ALTR = Namespace("http://www.w3.org/ns/dx/conneg/altr#")
-        g.bind("altr", ALTR)
-        g.bind("dct", DCTERMS)
-        g.bind("prof", PROF)
-
-        instance_uri = URIRef(self.instance_uri)
-
-        # for each Profile, lis it via its URI and give annotations
-        for token, p in self.profiles.items():
-            profile_uri = URIRef(p.uri)
-            g.add((profile_uri, RDF.type, PROF.Profile))
-            g.add((profile_uri, RDFS.label, Literal(p.label, datatype=XSD.string)))
-            g.add((profile_uri, RDFS.comment, Literal(p.comment, datatype=XSD.string)))
-
-        # for each Profile and Media Type, create a Representation
-        for token, p in self.profiles.items():
-            for mt in p.mediatypes:
-                rep = BNode()
-                g.add((rep, RDF.type, ALTR.Representation))
-                g.add((rep, DCTERMS.conformsTo, URIRef(p.uri)))
-                g.add((rep, URIRef(DCTERMS + "format"), Literal(mt)))
-                g.add((rep, PROF.hasToken, Literal(token, datatype=XSD.token)))
-
-                # if this is the default format for the Profile, say so
-                if mt == p.default_mediatype:
-                    g.add(
-                        (
-                            rep,
-                            ALTR.isProfilesDefault,
-                            Literal(True, datatype=XSD.boolean),
-                        )
-                    )
-
-                # link this representation to the instances
-                g.add((instance_uri, ALTR.hasRepresentation, rep))
-
-                # if this is the default Profile and the default Media Type, set it as the instance's default Rep
-                if token == self.default_profile_token and mt == p.default_mediatype:
-                    g.add((instance_uri, ALTR.hasDefaultRepresentation, rep))
-
-        return g
+        template = profile_links_template(
+            self.profiles_key, self.default_profile_token, self.profiles[self.profile].default_mediatype
+        )
+        return template.replace(INSTANCE_URI, self.instance_uri)
 
     def _make_rdf_response(self, graph, mimetype=None, headers=None, delete_graph=True):
         if headers is None:
@@ -465,17 +579,6 @@ class Renderer(object, metaclass=ABCMeta):
         return Response(response_text, media_type=response_mimetype, headers=headers)
 
     def _render_alt_profile_html(self, template_context=None):
-        profiles = {}
-        for token, profile in self.profiles.items():
-            profiles[token] = {
-                "label": str(profile.label),
-                "comment": str(profile.comment),
-                "mediatypes": profile.mediatypes,
-                "default_mediatype": str(profile.default_mediatype),
-                "languages": profile.languages if profile.languages is not None else ["en"],
-                "default_language": str(profile.default_language),
-                "uri": str(profile.uri),
-            }
         if "/collection/" in self.instance_uri:
             system_uri = "/collection/" + self.instance_uri.split("/collection/")[1]
         elif "/scheme/" in self.instance_uri:
@@ -489,7 +592,7 @@ class Renderer(object, metaclass=ABCMeta):
             "uri": self.instance_uri,
             "systemUri": system_uri,
             "default_profile_token": self.default_profile_token,
-            "profiles": profiles,
+            "profiles": alternates_profiles(self.profiles_key),
             "mediatype_names": self.mediatype_names,
             "request": self.request,
             "logged_in_user": utils.get_user_status(self.request),
@@ -499,20 +602,19 @@ class Renderer(object, metaclass=ABCMeta):
             _template_context.update(template_context)
         return templates.TemplateResponse("alt.html", context=_template_context, headers=self.headers)
 
+    def _render_alt_profile_template(self):
+        if self.mediatype == "application/json":
+            profiles = [token for token, *_ in self.profiles_key]
+            content = {"uri": self.instance_uri, "profiles": profiles, "default_profile": self.default_profile_token}
+            return JSONResponse(content, headers=self.headers)
+        content = alternates_rdf(self.profiles_key, self.default_profile_token, self.instance_uri, self.mediatype)
+        return Response(content, media_type=self.mediatype, headers=self.headers)
+
     def _render_alt_profile_rdf(self):
-        g = self._generate_alt_profiles_rdf()
-        return self._make_rdf_response(g)
+        return self._render_alt_profile_template()
 
     def _render_alt_profile_json(self):
-        return JSONResponse(
-            content={
-                "uri": self.instance_uri,
-                "profiles": list(self.profiles.keys()),
-                "default_profile": self.default_profile_token,
-            },
-            media_type="application/json",
-            headers=self.headers,
-        )
+        return self._render_alt_profile_template()
 
     def _render_alt_profile(self):
         """
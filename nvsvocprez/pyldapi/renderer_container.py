@@ -1,41 +1,44 @@
-from .renderer import Renderer
+from types import MappingProxyType
+
+from .renderer import ProfileRegistry, Renderer
 from .profile import Profile
 from .data import RDF_MEDIATYPES
 from config import SYSTEM_URI
 
+contanno = Profile(
+    uri="https://w3id.org/profile/contanno",
+    id="contanno",
+    label="Container Annotations",
+    comment="Describes container annotations only, that is a veiw of a container object's properties"
+    " other than its members.",
+    mediatypes=["text/html"] + RDF_MEDIATYPES,
+    default_mediatype="text/html",
+    languages=["en"],
+    default_language="en",
+)
 
-class ContainerRenderer(Renderer):
-    def __init__(self, request, instance_uri, profiles=None, default_profile_token="mem", **kwargs):
-        contanno = Profile(
-            uri="https://w3id.org/profile/contanno",
-            id="contanno",
-            label="Container Annotations",
-            comment="Describes container annotations only, that is a veiw of a container object's properties"
-            " other than its members.",
-            mediatypes=["text/html"] + RDF_MEDIATYPES,
-            default_mediatype="text/html",
-            languages=["en"],
-            default_language="en",
-        )
+mem = Profile(
+    uri="https://w3id.org/profile/mem",  # the ConnegP URI for Alt Rep Data Model
+    id="mem",
+    label="Members",
+    comment="A very basic data model that lists the members of container objects only, i.e. not their other "
+    "properties",
+    mediatypes=["text/html", "application/json"] + RDF_MEDIATYPES,
+    default_mediatype="text/html",
+    languages=["en"],
+    default_language="en",
+)
+
+# the profiles every container has, which a ProfileRegistry given to ContainerRenderer must include
+CONTAINER_PROFILES = MappingProxyType({"contanno": contanno, "mem": mem})
 
-        mem = Profile(
-            uri="https://w3id.org/profile/mem",  # the ConnegP URI for Alt Rep Data Model
-            id="mem",
-            label="Members",
-            comment="A very basic data model that lists the members of container objects only, i.e. not their other "
-            "properties",
-            mediatypes=["text/html", "application/json"] + RDF_MEDIATYPES,
-            default_mediatype="text/html",
-            languages=["en"],
-            default_language="en",
-        )
 
-        new_profiles = {
-            "contanno": contanno,
-            "mem": mem,
-        }
-        if profiles is not None:
-            new_profiles.update(profiles)
+class ContainerRenderer(Renderer):
+    def __init__(self, request, instance_uri, profiles=None, default_profile_token="mem", **kwargs):
+        if isinstance(profiles, ProfileRegistry):
+            new_profiles = profiles
+        else:
+            new_profiles = {**CONTAINER_PROFILES, **(profiles or {})}
 
         super().__init__(
             request,
@@ -0,0 +1,309 @@
+"""Materialised collection RDF dumps.
+
+The RDF of a whole collection comes from a CONSTRUCT over every member and every member property, which for large
+collections means the triplestore generating hundreds of MB per request. Here that RDF is materialised once per
+collection, profile and mediatype into a gzipped file, with a sidecar recording its checksum and byte sizes, and then
+served from disk, with the checksum as its ETag. A dump is rebuilt when its collection's dcterms:date changes. A dump
+that is missing or stale is materialised in the background, by one worker at a time, and until it is ready requests
+for it are answered with a 503 and a Retry-After.
+
+Dumps can be pre-built for all collections by running this module from the nvsvocprez directory:
+
+~$ python -m routes.collection_dumps
+"""
+
+import contextlib
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+from starlette.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+
+from pyldapi.data import RDF_FILE_EXTS, RDF_MEDIATYPES
+from pyldapi.profile import Profile
+
+from . import page_configs
+from .profiles import nvs
+from .utils import cache_return, etag_matches, get_collection_query, get_ontologies
+
+dumps_dir = Path(page_configs.COLLECTION_DUMPS_DIR)
+
+CHUNK_SIZE = 64 * 1024
+# the seconds a client is asked to wait before asking again for a dump that is being materialised
+RETRY_AFTER = 30
+
+_builder = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dump-build")
+# the sidecars of the dumps this worker is materialising, and of those whose materialisation failed, with the version
+_building = set()
+_failed = set()
+_building_lock = threading.Lock()
+
+
+class DumpNotReady(Exception):
+    """Raised for a dump that is being materialised in the background."""
+
+
+def _dump_paths(collection_id: str, profile_token: str, mediatype: str):
+    """Return the directory holding a collection's dumps and the sidecar path for one profile and mediatype."""
+    collection_dir = dumps_dir / collection_id
+    return collection_dir, collection_dir / f"{profile_token}.{RDF_FILE_EXTS[mediatype]}.json"
+
+
+def _dump_version(modified: str, profile_token: str, mediatype: str) -> str:
+    """A dump is current while its collection's dcterms:date is unchanged."""
+    return hashlib.sha256(f"{modified}\n{profile_token}\n{mediatype}".encode("utf-8")).hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def _dump_lock(sidecar: Path):
+    """Hold an exclusive lock on a dump, shared by the threads and worker processes, while it is materialised."""
+    with open(sidecar.with_suffix(".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_sidecar(sidecar: Path) -> Optional[Dict]:
+    try:
+        with open(sidecar, "r") as sidecar_file:
+            return json.load(sidecar_file)
+    except (OSError, ValueError):
+        return None
+
+
+def materialise_dump(collection_id: str, profile_token: str, mediatype: str, query: str, version: str) -> Dict:
+    """Stream the result of a collection's CONSTRUCT query into a gzipped dump file.
+
+    The triplestore response is written to disk as it arrives, so memory use is bounded by the chunk size rather
+    than by the size of the collection. The dump and its sidecar are moved into place atomically and the dump
+    replaced by this one is removed on the following rebuild, so readers never see a partial file.
+
+    Returns (Dict): The sidecar of the new dump: {file, version, mediatype, sha256, byteSize, compressedByteSize}.
+    """
+    collection_dir, sidecar = _dump_paths(collection_id, profile_token, mediatype)
+    collection_dir.mkdir(parents=True, exist_ok=True)
+    dump_name = f"{profile_token}.{version}.{RDF_FILE_EXTS[mediatype]}.gz"
+
+    checksum = hashlib.sha256()
+    byte_size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=collection_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw_file, gzip.GzipFile(fileobj=raw_file, mode="wb", mtime=0) as dump_file:
+            if "xml" in mediatype:
+                declaration = '<?xml version="1.0" encoding="UTF-8"?>\n'.encode()
+                dump_file.write(declaration)
+                checksum.update(declaration)
+                byte_size += len(declaration)
+            with httpx.stream(
+                "POST",
+                page_configs.SPARQL_ENDPOINT,
+                content=query.encode("utf-8"),
+                headers={"Content-Type": "application/sparql-query", "Accept": mediatype},
+                auth=(page_configs.SPARQL_USERNAME, page_configs.SPARQL_PASSWORD),
+                timeout=600.0,
+            ) as r:
+                if not 200 <= r.status_code < 300:
+                    r.read()
+                    raise httpx.HTTPStatusError(
+                        f"Status Code: {r.status_code}, Error: {r.text}", request=r.request, response=r
+                    )
+                for chunk in r.iter_bytes(CHUNK_SIZE):
+                    dump_file.write(chunk)
+                    checksum.update(chunk)
+                    byte_size += len(chunk)
+        os.replace(tmp_path, collection_dir / dump_name)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    previous = _read_sidecar(sidecar)
+    metadata = {
+        "file": dump_name,
+        "version": version,
+        "mediatype": mediatype,
+        "sha256": checksum.hexdigest(),
+        "byteSize": byte_size,
+        "compressedByteSize": (collection_dir / dump_name).stat().st_size,
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=collection_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as sidecar_file:
+        json.dump(metadata, sidecar_file)
+    os.replace(tmp_path, sidecar)
+
+    # keep the dump that was current until now, as requests may still be reading it, and remove any older ones
+    keep = {dump_name, previous["file"] if previous else None}
+    for old_dump in collection_dir.glob(f"{profile_token}.*.{RDF_FILE_EXTS[mediatype]}.gz"):
+        if old_dump.name not in keep:
+            old_dump.unlink(missing_ok=True)
+
+    logging.info("materialised dump %s/%s (%s bytes)", collection_id, dump_name, byte_size)
+    return metadata
+
+
+def _build_dump(dump_id: str, profile_token: str, mediatype: str, query: str, version: str):
+    """Materialise a dump unless, once the lock on it is held, another worker has already done so."""
+    dump_dir, sidecar = _dump_paths(dump_id, profile_token, mediatype)
+    try:
+        dump_dir.mkdir(parents=True, exist_ok=True)
+        with _dump_lock(sidecar):
+            metadata = _read_sidecar(sidecar)
+            if metadata is None or metadata["version"] != version or not (dump_dir / metadata["file"]).is_file():
+                materialise_dump(dump_id, profile_token, mediatype, query, version)
+    except Exception as exc:
+        logging.error("Failed to materialise the %s dump of %s.\n%s", profile_token, dump_id, exc)
+        with _building_lock:
+            _failed.add((sidecar, version))
+    finally:
+        with _building_lock:
+            _building.discard(sidecar)
+
+
+def get_dump(
+    dump_id: str, profile_token: str, mediatype: str, query: str, modified: str, wait: bool = False
+) -> Optional[Dict]:
+    """Get the current dump of a CONSTRUCT query's result, materialising it in the background if missing or stale.
+
+    Args:
+        dump_id (str): The directory to keep the dump in, e.g. the collection's ID.
+        profile_token (str): The profile the query is for.
+        mediatype (str): The RDF mediatype to dump.
+        query (str): The CONSTRUCT query.
+        modified (str): The modified date of the data, the dump being rebuilt when it changes.
+        wait (bool): Materialise a missing or stale dump in this thread, rather than in the background.
+
+    Returns (Dict): The dump's sidecar, with "path" added, or None if the triplestore could not produce it.
+
+    Raises DumpNotReady if the dump is being materialised in the background.
+    """
+    version = _dump_version(modified, profile_token, mediatype)
+    dump_dir, sidecar = _dump_paths(dump_id, profile_token, mediatype)
+
+    def current() -> Optional[Dict]:
+        metadata = _read_sidecar(sidecar)
+        if metadata is not None and metadata["version"] == version and (dump_dir / metadata["file"]).is_file():
+            return {**metadata, "path": dump_dir / metadata["file"]}
+        return None
+
+    dump = current()
+    if dump is not None:
+        return dump
+
+    with _building_lock:
+        if (sidecar, version) in _failed:
+            # answered once with an error, then tried again
+            _failed.discard((sidecar, version))
+            return None
+        if not wait:
+            if sidecar not in _building:
+                _building.add(sidecar)
+                _builder.submit(_build_dump, dump_id, profile_token, mediatype, query, version)
+            raise DumpNotReady
+
+    _build_dump(dump_id, profile_token, mediatype, query, version)
+    with _building_lock:
+        _failed.discard((sidecar, version))
+    return current()
+
+
+def dump_byte_size(dump_id: str, profile_token: str, mediatype: str) -> Optional[int]:
+    """The uncompressed size of the last dump materialised for a profile and mediatype, or None if there isn't one.
+    No dump is materialised."""
+    metadata = _read_sidecar(_dump_paths(dump_id, profile_token, mediatype)[1])
+    return metadata["byteSize"] if metadata is not None else None
+
+
+def get_collection_dump(
+    collection: Dict, profile: Profile, mediatype: str, ontologies: Dict, wait: bool = False
+) -> Optional[Dict]:
+    """Get the current dump of a collection for a profile and mediatype, see get_dump().
+
+    Returns (Dict): The dump's sidecar, with "path" added, or None if the triplestore could not produce it.
+    """
+    return get_dump(
+        collection["id"]["value"],
+        profile.id,
+        mediatype,
+        get_collection_query(profile, collection["uri"]["value"], ontologies),
+        collection.get("date", {}).get("value", ""),
+        wait,
+    )
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header accepts gzip, naming it, or *, with a q-value other than 0."""
+    qvalues = {}
+    for coding in accept_encoding.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        qvalue = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        if name:
+            qvalues[name.lower()] = qvalue
+    return qvalues.get("gzip", qvalues.get("x-gzip", qvalues.get("*", 0.0))) > 0
+
+
+def dump_not_ready_response() -> Response:
+    """Answer a request for a dump that is being materialised, asking the client to try again shortly."""
+    return PlainTextResponse(
+        "The RDF of this collection is being prepared, please try again shortly",
+        status_code=503,
+        headers={"Retry-After": str(RETRY_AFTER)},
+    )
+
+
+def dump_response(dump: Dict, request, headers: Optional[Dict] = None):
+    """Serve a dump from disk, compressed as stored if the client accepts gzip, else decompressed on the fly, or a
+    304 if the client has it already. Each encoding has its own strong ETag, made from the dump's checksum."""
+    headers = {
+        **(headers or {}),
+        "Vary": "Accept, Accept-Profile, Accept-Encoding",
+    }
+    gzipped = _accepts_gzip(request.headers.get("Accept-Encoding", ""))
+    etag = f'"{dump["sha256"]}-gzip"' if gzipped else f'"{dump["sha256"]}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    headers.update({"Content-Type": dump["mediatype"], "ETag": etag})
+    if gzipped:
+        return FileResponse(
+            dump["path"],
+            media_type=dump["mediatype"],
+            headers={**headers, "Content-Encoding": "gzip"},
+            method=request.method,
+        )
+
+    def decompress():
+        with gzip.open(dump["path"], "rb") as dump_file:
+            while chunk := dump_file.read(CHUNK_SIZE):
+                yield chunk
+
+    headers["Content-Length"] = str(dump["byteSize"])
+    return StreamingResponse(decompress(), media_type=dump["mediatype"], headers=headers)
+
+
+def materialise_collection_dumps():
+    """Bring the nvs profile dumps of every collection, in every RDF mediatype, up to date."""
+    ontologies = get_ontologies()
+    for collection in cache_return(collections_or_conceptschemes="collections"):
+        for mediatype in RDF_MEDIATYPES:
+            get_collection_dump(collection, nvs, mediatype, ontologies, wait=True)
+
+
+if __name__ == "__main__":
+    materialise_collection_dumps()
@@ -7,9 +7,8 @@ from pathlib import Path
 from typing import AnyStr, Literal, Optional, Tuple
 import requests as rq
 from fastapi import APIRouter, HTTPException
-from pyldapi import ContainerRenderer, Renderer, DisplayProperty
+from pyldapi import CONTAINER_PROFILES, ContainerRenderer, ProfileRegistry, Renderer, DisplayProperty
 from pyldapi.renderer import RDF_MEDIATYPES
-from rdflib import Graph
 from rdflib import Literal as RdfLiteral, Namespace
 from rdflib import URIRef
 from rdflib.namespace import DC, DCTERMS, ORG, OWL, RDF, RDFS, SKOS, VOID
@@ -17,22 +16,31 @@ from starlette.requests import Request
 from starlette.responses import PlainTextResponse, Response, RedirectResponse, JSONResponse
 from starlette.templating import Jinja2Templates
 
+from .collection_dumps import DumpNotReady, dump_not_ready_response, dump_response, get_collection_dump
+from .concept_versions import concept_version_response
 from .page_configs import DATA_URI, ORDS_ENDPOINT_URL, SYSTEM_URI, acc_dep_map
 from .profiles import void, nvs, skos, dd, vocpub, dcat, sdo
+from .rdf_writer import serialise
 from .utils import (
     RelatedItem,
     cache_return,
     exists_triple,
     get_alt_profiles,
+    get_collection_member_count,
+    get_collection_page_query,
     get_collection_query,
     get_alt_profile_objects,
     get_ontologies,
     get_external_mappings,
     extract_external_mapping_url,
+    get_container_members,
     get_user_status,
+    construct_rdf,
     sparql_construct,
     sparql_query,
+    TriplestoreError,
 )
+import math
 import re
 from collections import Counter, defaultdict
 
@@ -47,203 +55,178 @@ with open(config_file_location, "r") as config_file:
 
 # NOTE: Logging removed from this file.
 
+# Number of members per page of paged collection RDF, ?_page=N&_pagesize=M
+RDF_PAGE_SIZE_DEFAULT = 1000
+RDF_PAGE_SIZE_MAX = 10000
 
-@router.get("/collection/", **paths["/collection/"]["get"])
-@router.head("/collection/", include_in_schema=False)
-def collections(request: Request):
-    class CollectionsRenderer(ContainerRenderer):
-        def __init__(self):
-            self.instance_uri = SYSTEM_URI
-            self.label = "NVS Vocabularies"
-            self.comment = (
-                "SKOS concept collections held in the NERC Vocabulary Server. A concept collection "
-                "is useful where a group of concepts shares something in common, and it is convenient "
-                "to group them under a common label. In the NVS, concept collections are synonymous "
-                "with controlled vocabularies or code lists. Each collection is associated with its "
-                "governance body. An external website link is displayed when applicable."
+COLLECTIONS_PROFILES = ProfileRegistry({**CONTAINER_PROFILES, "nvs": nvs})
+COLLECTION_PROFILES = ProfileRegistry({"nvs": nvs, "skos": skos, "vocpub": vocpub, "dd": dd})
+CONCEPT_PROFILES = ProfileRegistry({"nvs": nvs, "skos": skos, "vocpub": vocpub, "sdo": sdo})
+
+
+class CollectionsRenderer(ContainerRenderer):
+    def __init__(self, request):
+        self.instance_uri = SYSTEM_URI
+        self.label = "NVS Vocabularies"
+        self.comment = (
+            "SKOS concept collections held in the NERC Vocabulary Server. A concept collection "
+            "is useful where a group of concepts shares something in common, and it is convenient "
+            "to group them under a common label. In the NVS, concept collections are synonymous "
+            "with controlled vocabularies or code lists. Each collection is associated with its "
+            "governance body. An external website link is displayed when applicable."
+        )
+        super().__init__(request, self.instance_uri, COLLECTIONS_PROFILES, "nvs")
+
+    def _render_sparql_response_rdf(self, sparql_response):
+
+        if sparql_response[0]:
+            return Response(
+                sparql_response[1],
+                headers={"Content-Type": self.mediatype},
             )
-            super().__init__(
-                request,
-                self.instance_uri,
-                {"nvs": nvs},
-                "nvs",
+        else:
+            return PlainTextResponse(
+                "There was an error obtaining the Concept RDF from the Triplestore",
+                status_code=500,
             )
 
-        def _render_sparql_response_rdf(self, sparql_response):
-
-            if sparql_response[0]:
-                return Response(
-                    (
-                        '<?xml version="1.0" encoding="UTF-8"?>\n'.encode() + sparql_response[1]
-                        if "xml" in self.mediatype
-                        else sparql_response[1]
-                    ),
-                    headers={"Content-Type": self.mediatype},
-                )
-            else:
-                return PlainTextResponse(
-                    "There was an error obtaining the Concept RDF from the Triplestore",
-                    status_code=500,
-                )
+    def render(self):
+        if self.profile == "nvs":
+            if self.mediatype == "text/html":
+                collections = cache_return(collections_or_conceptschemes="collections")
 
-        def render(self):
-            if self.profile == "nvs":
-                if self.mediatype == "text/html":
-                    collections = cache_return(collections_or_conceptschemes="collections")
+                if self.request.query_params.get("filter"):
 
-                    if request.query_params.get("filter"):
+                    def concat_vocab_fields(vocab):
+                        return (
+                            f"{vocab['id']['value']}"
+                            f"{vocab['prefLabel']['value']}"
+                            f"{vocab['description']['value']}"
+                        )
 
-                        def concat_vocab_fields(vocab):
-                            return (
-                                f"{vocab['id']['value']}"
-                                f"{vocab['prefLabel']['value']}"
-                                f"{vocab['description']['value']}"
-                            )
+                    collections = [
+                        coll
+                        for coll in collections
+                        if self.request.query_params.get("filter") in concat_vocab_fields(coll)
+                    ]
 
-                        collections = [
-                            coll
-                            for coll in collections
-                            if request.query_params.get("filter") in concat_vocab_fields(coll)
-                        ]
+                return templates.TemplateResponse(
+                    "collections.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "label": self.label,
+                        "comment": self.comment,
+                        "collections": collections,
+                        "profile_token": self.profile,
+                        "logged_in_user": get_user_status(self.request),
+                    },
+                )
+            elif self.mediatype in RDF_MEDIATYPES:
 
-                    return templates.TemplateResponse(
-                        "collections.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "label": self.label,
-                            "comment": self.comment,
-                            "collections": collections,
-                            "profile_token": self.profile,
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                elif self.mediatype in RDF_MEDIATYPES:
-
-                    query = """
-                        PREFIX dc: <http://purl.org/dc/terms/>
-                        PREFIX grg: <http://www.isotc211.org/schemas/grg/>
-                        PREFIX owl: <http://www.w3.org/2002/07/owl#>
-                        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-                        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                        CONSTRUCT {
-                            ?cs a skos:Collection ;
-                                dc:alternative ?alternative ;
-                                dc:creator ?creator ;
-                                dc:date ?date ;
-                                dc:description ?description ;
-                                dc:publisher ?publisher ;
-                                dc:title ?title ;
-                                rdfs:comment ?comment ;
-                                owl:versionInfo ?version ;
-                                skos:altLabel ?al ;
-                                skos:narrower ?narrower ;
-                                skos:prefLabel ?pl .
-                            ?cs
-                                grg:RE_RegisterManager ?registermanager ;
-                                grg:RE_RegisterOwner ?registerowner .
-                            ?cs rdfs:seeAlso ?seeAlso .
-                            ?cs dc:conformsTo ?conformsTo .
+                query = """
+                    PREFIX dc: <http://purl.org/dc/terms/>
+                    PREFIX grg: <http://www.isotc211.org/schemas/grg/>
+                    PREFIX owl: <http://www.w3.org/2002/07/owl#>
+                    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+                    CONSTRUCT {
+                        ?cs a skos:Collection ;
+                            dc:alternative ?alternative ;
+                            dc:creator ?creator ;
+                            dc:date ?date ;
+                            dc:description ?description ;
+                            dc:publisher ?publisher ;
+                            dc:title ?title ;
+                            rdfs:comment ?comment ;
+                            owl:versionInfo ?version ;
+                            skos:altLabel ?al ;
+                            skos:narrower ?narrower ;
+                            skos:prefLabel ?pl .
+                        ?cs
+                            grg:RE_RegisterManager ?registermanager ;
+                            grg:RE_RegisterOwner ?registerowner .
+                        ?cs rdfs:seeAlso ?seeAlso .
+                        ?cs dc:conformsTo ?conformsTo .
+                    }
+                    WHERE {
+                        ?cs a skos:Collection ;
+                            dc:alternative ?alternative ;
+                            dc:creator ?creator ;
+                            dc:date ?date ;
+                            dc:description ?description ;
+                            dc:publisher ?publisher ;
+                            dc:title ?title ;
+                            rdfs:comment ?comment ;
+                            owl:versionInfo ?version ;
+                            skos:prefLabel ?pl .
+                        OPTIONAL { ?cs skos:altLabel ?al }
+                        OPTIONAL { ?cs skos:narrower ?narrower }
+                        OPTIONAL {
+                            ?cs skos:prefLabel ?pl .
+                            FILTER(lang(?pl) = "en" || lang(?pl) = "")
                         }
-                        WHERE {
-                            ?cs a skos:Collection ;
-                                dc:alternative ?alternative ;
-                                dc:creator ?creator ;
-                                dc:date ?date ;
-                                dc:description ?description ;
-                                dc:publisher ?publisher ;
-                                dc:title ?title ;
-                                rdfs:comment ?comment ;
-                                owl:versionInfo ?version ;
-                                skos:prefLabel ?pl .
-                            OPTIONAL { ?cs skos:altLabel ?al }
-                            OPTIONAL { ?cs skos:narrower ?narrower }
-                            OPTIONAL {
-                                ?cs skos:prefLabel ?pl .
-                                FILTER(lang(?pl) = "en" || lang(?pl) = "")
-                            }
-                            OPTIONAL {
-                                ?cs grg:RE_RegisterManager ?registermanager .
-                                ?cs grg:RE_RegisterManager ?registerowner .
-                            }
-                            OPTIONAL { ?cs rdfs:seeAlso ?seeAlso }
-                            OPTIONAL { ?cs dc:conformsTo ?conformsTo }
-                        } 
-                        """
-                    return self._render_sparql_response_rdf(sparql_construct(query, self.mediatype))
-            elif self.profile == "mem":
-                collections = []
-                for coll in cache_return(collections_or_conceptschemes="collections"):
-                    collections.append(
-                        {
-                            "uri": coll["uri"]["value"],
-                            "systemUri": coll["systemUri"]["value"],
-                            "label": coll["prefLabel"]["value"],
+                        OPTIONAL {
+                            ?cs grg:RE_RegisterManager ?registermanager .
+                            ?cs grg:RE_RegisterManager ?registerowner .
                         }
-                    )
-
-                if self.mediatype == "text/html":
-                    return templates.TemplateResponse(
-                        "container_mem.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "label": self.label,
-                            "collections": collections,
-                            "profile_token": "nvs",
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                elif self.mediatype == "application/json":
-                    return [{"uri": coll["uri"], "label": coll["prefLabel"]} for coll in collections]
-                else:  # all other available mediatypes are RDF
-                    graph = Graph()
-                    container = URIRef(self.instance_uri)
-                    graph.add((container, RDF.type, RDF.Bag))
-                    graph.add((container, RDFS.label, RdfLiteral(self.label)))
-                    for coll in collections:
-                        graph.add((container, RDFS.member, URIRef(coll["uri"])))
-                        graph.add(
-                            (
-                                URIRef(coll["uri"]),
-                                RDFS.label,
-                                RdfLiteral(collection["label"]),
-                            )
-                        )
-                    return Response(
-                        graph.serialize(format=self.mediatype),
-                        media_type=self.mediatype,
-                    )
-            elif self.profile == "contanno":
-                if self.mediatype == "text/html":
-                    return templates.TemplateResponse(
-                        "container_contanno.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "label": self.label,
-                            "comment": self.comment,
-                            "profile_token": "nvs",
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                graph = Graph()
-                container = URIRef(self.instance_uri)
-                graph.add((container, RDF.type, RDF.Bag))
-                graph.add((container, RDFS.label, RdfLiteral(self.label)))
-                container_message = (
-                    "This object is a container that contains a number of members. See other profiles of this "
-                    "object to see those members."
+                        OPTIONAL { ?cs rdfs:seeAlso ?seeAlso }
+                        OPTIONAL { ?cs dc:conformsTo ?conformsTo }
+                    } 
+                    """
+                return self._render_sparql_response_rdf(construct_rdf(query, self.mediatype))
+        elif self.profile == "mem":
+            container = get_container_members("collections", self.instance_uri, self.label)
+
+            if self.mediatype == "text/html":
+                return templates.TemplateResponse(
+                    "container_mem.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "label": self.label,
+                        "collections": container["members"],
+                        "profile_token": "nvs",
+                        "logged_in_user": get_user_status(self.request),
+                    },
+                )
+            else:  # JSON and all other available mediatypes, which are RDF
+                return Response(container["serialisations"][self.mediatype], media_type=self.mediatype)
+        elif self.profile == "contanno":
+            if self.mediatype == "text/html":
+                return templates.TemplateResponse(
+                    "container_contanno.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "label": self.label,
+                        "comment": self.comment,
+                        "profile_token": "nvs",
+                        "logged_in_user": get_user_status(self.request),
+                    },
                 )
-                container_message += self.comment
-                graph.add((container, RDFS.comment, RdfLiteral(container_message)))
-                return Response(graph.serialize(format=self.mediatype), media_type=self.mediatype)
+            container = URIRef(self.instance_uri)
+            container_message = (
+                "This object is a container that contains a number of members. See other profiles of this "
+                "object to see those members."
+            )
+            container_message += self.comment
+            triples = [
+                (container, RDF.type, RDF.Bag),
+                (container, RDFS.label, RdfLiteral(self.label)),
+                (container, RDFS.comment, RdfLiteral(container_message)),
+            ]
+            return Response(serialise(triples, self.mediatype), media_type=self.mediatype)
 
-            alt = super().render()
-            if alt is not None:
-                return alt
+        alt = super().render()
+        if alt is not None:
+            return alt
 
-    return CollectionsRenderer().render()
+
+@router.get("/collection/", **paths["/collection/"]["get"])
+@router.head("/collection/", include_in_schema=False)
+def collections(request: Request):
+    return CollectionsRenderer(request).render()
 
 
 @router.get("/collection/{collection_id}", include_in_schema=False)
@@ -254,6 +237,269 @@ def collection_no_current(request: Request, collection_id):
     return RedirectResponse(url=f"/collection/{collection_id}/current/")
 
 
+class CollectionRenderer(Renderer):
+    def __init__(self, request, collection_id, acc_dep_or_concept):
+        self.collection_id = collection_id
+        self.acc_dep_or_concept = acc_dep_or_concept
+        self.alt_profiles = get_alt_profiles()
+        self.ontologies = get_ontologies()
+
+        self.instance_uri = f"{DATA_URI}/collection/{collection_id}/current/"
+        profiles = COLLECTION_PROFILES
+        for collection in cache_return(collections_or_conceptschemes="collections"):
+            if collection["id"]["value"] == collection_id:
+                if collection.get("conforms_to"):
+                    profiles = ProfileRegistry(
+                        {
+                            **COLLECTION_PROFILES,
+                            **get_alt_profile_objects(
+                                collection=collection,
+                                alt_profiles=self.alt_profiles,
+                                ontologies=self.ontologies,
+                            ),
+                        }
+                    )
+
+        super().__init__(request, self.instance_uri, profiles, "nvs")
+
+    def _render_sparql_response_rdf(self, sparql_response, headers=None):
+        if sparql_response[0]:
+            return Response(
+                sparql_response[1],
+                headers={**(headers or {}), "Content-Type": self.mediatype},
+            )
+        else:
+            return PlainTextResponse(
+                "There was an error obtaining the Concept RDF from the Triplestore",
+                status_code=500,
+            )
+
+    def _get_collection(self):
+        for collection in cache_return(collections_or_conceptschemes="collections"):
+            if collection["id"]["value"] == self.collection_id:
+                return collection
+
+    def _render_collection_rdf(self, profile):
+        if "_page" in self.request.query_params or "_pagesize" in self.request.query_params:
+            return self._render_collection_page(profile)
+        return self._render_collection_dump(profile)
+
+    def _render_collection_page(self, profile):
+        # one page of the collection's RDF, over its members ordered by URI, linked to the other pages
+        try:
+            page = int(self.request.query_params.get("_page", 1))
+            page_size = int(self.request.query_params.get("_pagesize", RDF_PAGE_SIZE_DEFAULT))
+        except ValueError:
+            page = page_size = 0
+        if page < 1 or not 1 <= page_size <= RDF_PAGE_SIZE_MAX:
+            return PlainTextResponse(
+                f"_page must be a positive integer and _pagesize an integer from 1 to {RDF_PAGE_SIZE_MAX}",
+                status_code=400,
+            )
+
+        acc_dep_term = acc_dep_map.get(self.acc_dep_or_concept).replace("?c", "?m")
+        collection = self._get_collection()
+        date = collection.get("date", {}).get("value") if collection is not None else None
+        try:
+            member_count = get_collection_member_count(self.instance_uri, acc_dep_term, date)
+            if page > max(1, math.ceil(member_count / page_size)):
+                # the memoised count may be behind the triplestore, so a page is only missing if a fresh count agrees
+                member_count = get_collection_member_count(self.instance_uri, acc_dep_term, date, recount=True)
+        except TriplestoreError:
+            return PlainTextResponse(
+                "There was an error obtaining the Collection RDF from the Triplestore",
+                status_code=500,
+            )
+        last_page = max(1, math.ceil(member_count / page_size))
+        if page > last_page:
+            return PlainTextResponse(
+                f"Page {page} does not exist, this collection has {last_page} pages of {page_size} members",
+                status_code=404,
+            )
+
+        def page_link(page_number, rel):
+            return f'<{self.request.url.include_query_params(_page=page_number, _pagesize=page_size)}>; rel="{rel}"'
+
+        links = [page_link(1, "first"), page_link(last_page, "last")]
+        if page > 1:
+            links.append(page_link(page - 1, "prev"))
+        if page < last_page:
+            links.append(page_link(page + 1, "next"))
+
+        query = get_collection_page_query(profile, self.instance_uri, self.ontologies, page, page_size, acc_dep_term)
+        return self._render_sparql_response_rdf(
+            construct_rdf(query, self.mediatype), headers={"Link": ", ".join(links)}
+        )
+
+    def _render_collection_dump(self, profile):
+        # the whole collection's RDF is served from a dump materialised on disk, not a live CONSTRUCT
+        collection = self._get_collection()
+        if collection is None:  # not yet in the index cache, so there's no modified date to version a dump by
+            query = get_collection_query(profile, self.instance_uri, self.ontologies)
+            return self._render_sparql_response_rdf(construct_rdf(query, self.mediatype))
+
+        try:
+            dump = get_collection_dump(collection, profile, self.mediatype, self.ontologies)
+        except DumpNotReady:
+            return dump_not_ready_response()
+        if dump is None:
+            return PlainTextResponse(
+                "There was an error obtaining the Collection RDF from the Triplestore",
+                status_code=500,
+            )
+        return dump_response(dump, self.request)
+
+    def _get_concepts(self):
+        q = """
+            PREFIX dcterms: <http://purl.org/dc/terms/>
+            PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+            SELECT DISTINCT ?c ?systemUri ?id ?pl ?def ?date ?dep
+            WHERE {
+                    <xxx> skos:member ?c .
+                    BIND (STRBEFORE(STRAFTER(STR(?c), "/current/"), "/") AS ?id)
+                    BIND (STRAFTER(STR(?c), ".uk") AS ?systemUri)
+
+                    acc_dep
+                    
+                    OPTIONAL {
+                        ?c <http://www.w3.org/2002/07/owl#deprecated> ?dep .
+                    }
+                    ?c skos:prefLabel ?pl ;
+                         skos:definition ?def ;
+                         dcterms:date ?date .
+
+                    FILTER(lang(?pl) = "en" || lang(?pl) = "") 
+                    FILTER(lang(?def) = "en" || lang(?def) = "")                    
+            }
+            ORDER BY ?pl
+            """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(self.acc_dep_or_concept))
+
+        sparql_result = sparql_query(q)
+        if sparql_result[0]:
+            return [
+                {
+                    "uri": concept["c"]["value"],
+                    "id": concept["id"]["value"],
+                    "systemUri": concept["systemUri"]["value"],
+                    "prefLabel": concept["pl"]["value"],
+                    "definition": concept["def"]["value"],
+                    "date": concept["date"]["value"][0:10],
+                    "deprecated": True if concept.get("dep") and concept["dep"]["value"] == "true" else False,
+                }
+                for concept in sparql_result[1]
+            ]
+        else:
+            return False
+
+    def render(self):
+        current_profile = self.profiles[self.profile]
+        alt_profile_tokens = [alt["token"] for alt in self.alt_profiles.values()]
+
+        if self.profile == "nvs":
+            if self.mediatype == "text/html":
+                collection = self._get_collection()
+                collection["concepts"] = self._get_concepts()
+
+                if len(collection["concepts"]) == 0:
+                    pass
+                elif not collection["concepts"]:
+                    return templates.TemplateResponse(
+                        "error.html",
+                        {
+                            "request": self.request,
+                            "title": "DB Error",
+                            "status": "500",
+                            "message": "There was an error with accessing the Triplestore",
+                        },
+                    )
+                return templates.TemplateResponse(
+                    "collection.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "collection": collection,
+                        "profile_token": self.profile,
+                        "alt_profiles": self.alt_profiles,
+                        "logged_in_user": get_user_status(self.request),
+                    },
+                )
+            elif self.mediatype in RDF_MEDIATYPES:
+                return self._render_collection_rdf(current_profile)
+        elif self.profile == "dd":
+            q = """
+                PREFIX dcterms: <http://purl.org/dc/terms/>
+                PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+                SELECT DISTINCT ?c ?pl
+                WHERE {
+                    <xxx> skos:member ?c .
+                    acc_dep
+                    ?c skos:prefLabel ?pl .
+                }
+                ORDER BY ?pl                
+                """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(self.acc_dep_or_concept))
+            r = sparql_query(q)
+            return JSONResponse([{"uri": x["c"]["value"], "prefLabel": x["pl"]["value"]} for x in r[1]])
+        elif self.profile == "skos":
+            q = """
+                PREFIX skos: <http://www.w3.org/2004/02/skos/core#>                    
+                CONSTRUCT {
+                    <xxx> 
+                        a skos:Collection ;
+                        skos:prefLabel ?prefLabel ;
+                        skos:definition ?description ;
+                        skos:member ?c .
+                    ?c skos:prefLabel ?c_pl .
+                }
+                WHERE {
+                    <xxx> 
+                        a skos:Collection ;
+                        skos:prefLabel ?prefLabel ;
+                        <http://purl.org/dc/terms/description> ?description ;
+                        skos:member ?c .
+                        acc_dep
+                    ?c skos:prefLabel ?c_pl .
+                }
+                ORDER BY ?prefLabel
+                """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(self.acc_dep_or_concept))
+            return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
+        elif self.profile == "vocpub":
+            q = """
+                PREFIX dcterms: <http://purl.org/dc/terms/>
+                PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+                CONSTRUCT {
+                    <xxx>
+                        a skos:Collection ;
+                        skos:prefLabel ?prefLabel ;
+                        skos:definition ?description ;
+                        dcterms:creator ?creator ;
+                        dcterms:publisher ?publisher ;   
+                        dcterms:provenance "Made by NERC and maintained within the NERC Vocabulary Server" ;                            
+                        skos:member ?c .
+                        
+                    ?c skos:prefLabel ?c_pl .
+                }
+                WHERE {
+                    <xxx>
+                        a skos:Collection ;
+                        skos:prefLabel ?prefLabel ;
+                        dcterms:description ?description ;
+                        dcterms:creator ?creator ;
+                        dcterms:publisher ?publisher ;   
+                        skos:member ?c .
+                        acc_dep
+  
+                    ?c skos:prefLabel ?c_pl .
+                }
+                """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(self.acc_dep_or_concept))
+            return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
+        elif self.profile in alt_profile_tokens:
+            return self._render_collection_rdf(current_profile)
+
+        alt = super().render()
+        if alt is not None:
+            return alt
+
+
 @router.get(
     "/collection/{collection_id}/current/",
     **paths["/collection/{collection_id}/current/"]["get"],
@@ -276,229 +522,38 @@ def collection(request: Request, collection_id, acc_dep_or_concept: str = None):
         # this is a call for a Concept
         return concept(request)
 
-    class CollectionRenderer(Renderer):
-        def __init__(self):
-            self.alt_profiles = get_alt_profiles()
-            self.ontologies = get_ontologies()
-
-            self.instance_uri = f"{DATA_URI}/collection/{collection_id}/current/"
-            profiles = {"nvs": nvs, "skos": skos, "vocpub": vocpub, "dd": dd}
-            for collection in cache_return(collections_or_conceptschemes="collections"):
-                if collection["id"]["value"] == collection_id:
-                    if collection.get("conforms_to"):
-                        profiles.update(
-                            get_alt_profile_objects(
-                                collection=collection,
-                                alt_profiles=self.alt_profiles,
-                                ontologies=self.ontologies,
-                            )
-                        )
-
-            super().__init__(
-                request,
-                self.instance_uri,
-                profiles,
-                "nvs",
-            )
-
-        def _render_sparql_response_rdf(self, sparql_response):
-            if sparql_response[0]:
-                return Response(
-                    (
-                        '<?xml version="1.0" encoding="UTF-8"?>\n'.encode() + sparql_response[1]
-                        if "xml" in self.mediatype
-                        else sparql_response[1]
-                    ),
-                    headers={"Content-Type": self.mediatype},
-                )
-            else:
-                return PlainTextResponse(
-                    "There was an error obtaining the Concept RDF from the Triplestore",
-                    status_code=500,
-                )
-
-        def _get_collection(self):
-            for collection in cache_return(collections_or_conceptschemes="collections"):
-                if collection["id"]["value"] == collection_id:
-                    return collection
-
-        def _get_concepts(self):
-            q = """
-                PREFIX dcterms: <http://purl.org/dc/terms/>
-                PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                SELECT DISTINCT ?c ?systemUri ?id ?pl ?def ?date ?dep
-                WHERE {
-                        <xxx> skos:member ?c .
-                        BIND (STRBEFORE(STRAFTER(STR(?c), "/current/"), "/") AS ?id)
-                        BIND (STRAFTER(STR(?c), ".uk") AS ?systemUri)
-
-                        acc_dep
-                        
-                        OPTIONAL {
-                            ?c <http://www.w3.org/2002/07/owl#deprecated> ?dep .
-                        }
-                        ?c skos:prefLabel ?pl ;
-                             skos:definition ?def ;
-                             dcterms:date ?date .
-
-                        FILTER(lang(?pl) = "en" || lang(?pl) = "") 
-                        FILTER(lang(?def) = "en" || lang(?def) = "")                    
-                }
-                ORDER BY ?pl
-                """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(acc_dep_or_concept))
-
-            sparql_result = sparql_query(q)
-            if sparql_result[0]:
-                return [
-                    {
-                        "uri": concept["c"]["value"],
-                        "id": concept["id"]["value"],
-                        "systemUri": concept["systemUri"]["value"],
-                        "prefLabel": concept["pl"]["value"],
-                        "definition": concept["def"]["value"],
-                        "date": concept["date"]["value"][0:10],
-                        "deprecated": True if concept.get("dep") and concept["dep"]["value"] == "true" else False,
-                    }
-                    for concept in sparql_result[1]
-                ]
-            else:
-                return False
-
-        def render(self):
-            current_profile = self.profiles[self.profile]
-            alt_profile_tokens = [alt["token"] for alt in self.alt_profiles.values()]
-
-            if self.profile == "nvs":
-                if self.mediatype == "text/html":
-                    collection = self._get_collection()
-                    collection["concepts"] = self._get_concepts()
-
-                    if len(collection["concepts"]) == 0:
-                        pass
-                    elif not collection["concepts"]:
-                        return templates.TemplateResponse(
-                            "error.html",
-                            {
-                                "request": request,
-                                "title": "DB Error",
-                                "status": "500",
-                                "message": "There was an error with accessing the Triplestore",
-                            },
-                        )
-                    return templates.TemplateResponse(
-                        "collection.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "collection": collection,
-                            "profile_token": self.profile,
-                            "alt_profiles": self.alt_profiles,
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                elif self.mediatype in RDF_MEDIATYPES:
-                    # Get the term for the collection query WHERE clause to filter or accepted or deprecated.
-                    # This will be an empty string if neither condition is true.
-                    acc_dep_term = acc_dep_map.get(acc_dep_or_concept).replace("?c", "?m")
-                    query = get_collection_query(current_profile, self.instance_uri, self.ontologies)
-                    return self._render_sparql_response_rdf(sparql_construct(query, self.mediatype))
-            elif self.profile == "dd":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    SELECT DISTINCT ?c ?pl
-                    WHERE {
-                        <xxx> skos:member ?c .
-                        acc_dep
-                        ?c skos:prefLabel ?pl .
-                    }
-                    ORDER BY ?pl                
-                    """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(acc_dep_or_concept))
-                r = sparql_query(q)
-                return JSONResponse([{"uri": x["c"]["value"], "prefLabel": x["pl"]["value"]} for x in r[1]])
-            elif self.profile == "skos":
-                q = """
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>                    
-                    CONSTRUCT {
-                        <xxx> 
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            skos:definition ?description ;
-                            skos:member ?c .
-                        ?c skos:prefLabel ?c_pl .
-                    }
-                    WHERE {
-                        <xxx> 
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            <http://purl.org/dc/terms/description> ?description ;
-                            skos:member ?c .
-                            acc_dep
-                        ?c skos:prefLabel ?c_pl .
-                    }
-                    ORDER BY ?prefLabel
-                    """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(acc_dep_or_concept))
-                return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile == "vocpub":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    CONSTRUCT {
-                        <xxx>
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            skos:definition ?description ;
-                            dcterms:creator ?creator ;
-                            dcterms:publisher ?publisher ;   
-                            dcterms:provenance "Made by NERC and maintained within the NERC Vocabulary Server" ;                            
-                            skos:member ?c .
-                            
-                        ?c skos:prefLabel ?c_pl .
-                    }
-                    WHERE {
-                        <xxx>
-                            a skos:Collection ;
-                            skos:prefLabel ?prefLabel ;
-                            dcterms:description ?description ;
-                            dcterms:creator ?creator ;
-                            dcterms:publisher ?publisher ;   
-                            skos:member ?c .
-                            acc_dep
-  
-                        ?c skos:prefLabel ?c_pl .
-                    }
-                    """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(acc_dep_or_concept))
-                return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile in alt_profile_tokens:
-                # Get the term for the collection query WHERE clause to filter or accepted or deprecated.
-                # This will be an empty string if neither condition is true.
-                acc_dep_term = acc_dep_map.get(acc_dep_or_concept).replace("?c", "?m")
-                query = get_collection_query(current_profile, self.instance_uri, self.ontologies)
-                return self._render_sparql_response_rdf(sparql_construct(query, self.mediatype))
-
-            alt = super().render()
-            if alt is not None:
-                return alt
-
-    return CollectionRenderer().render()
+    return CollectionRenderer(request, collection_id, acc_dep_or_concept).render()
 
 
 class ConceptRenderer(Renderer):
-    def __init__(self, request):
+    def __init__(
+        self,
+        request,
+        instance_uri: Optional[str] = None,
+        concept_uri: Optional[str] = None,
+        collection_uri: Optional[str] = None,
+    ):
+        """Render a Concept, by default the one the request URL is for.
+
+        Args:
+            request: The request.
+            instance_uri (str): The URI the Concept is shown and described under, if not that of the request URL.
+            concept_uri (str): The URI the Concept's data is held under in the triplestore, if not instance_uri,
+                e.g. the P07 concept of a standard name.
+            collection_uri (str): The URI of the collection the Concept is shown in, if not the /current/ one of
+                instance_uri.
+        """
         self.request = request
-        if "collection" in str(request.url):
+        if instance_uri is not None:
+            self.instance_uri = instance_uri
+        elif "collection" in str(request.url):
             self.instance_uri = f"{DATA_URI}/collection/" + str(request.url).split("/collection/")[1].split("?")[0]
         elif "standard_name" in str(request.url):
             self.instance_uri = (
                 f"{DATA_URI}/standard_name/" + str(request.url).split("/standard_name/")[1].split("?")[0]
             )
 
-        concept_profiles = {
-            "nvs": nvs,
-            "skos": skos,
-            "vocpub": vocpub,
-            "sdo": sdo,
-        }
+        concept_profiles = CONCEPT_PROFILES
 
         self.alt_profiles = get_alt_profiles()
         self.ontologies = get_ontologies()
@@ -510,17 +565,21 @@ class ConceptRenderer(Renderer):
         else:
             self.external_mappings = {}
 
-        collection_uri = self.instance_uri.split("/current/")[0] + "/current/"
+        self.concept_uri = concept_uri or self.instance_uri
+        self.collection_uri = collection_uri or self.instance_uri.split("/current/")[0] + "/current/"
         for collection in cache_return(collections_or_conceptschemes="collections"):
-            if collection["uri"]["value"] == collection_uri:
-                concept_profiles.update(
-                    get_alt_profile_objects(
-                        collection,
-                        self.alt_profiles,
-                        ontologies=self.ontologies,
-                        media_types=["text/html"] + RDF_MEDIATYPES,
-                        default_mediatype="text/html",
-                    )
+            if collection["uri"]["value"] == self.collection_uri:
+                concept_profiles = ProfileRegistry(
+                    {
+                        **CONCEPT_PROFILES,
+                        **get_alt_profile_objects(
+                            collection,
+                            self.alt_profiles,
+                            ontologies=self.ontologies,
+                            media_types=["text/html"] + RDF_MEDIATYPES,
+                            default_mediatype="text/html",
+                        ),
+                    }
                 )
 
         super().__init__(request, self.instance_uri, concept_profiles, "nvs")
@@ -528,11 +587,7 @@ class ConceptRenderer(Renderer):
     def _render_sparql_response_rdf(self, sparql_response):
         if sparql_response[0]:
             return Response(
-                (
-                    '<?xml version="1.0" encoding="UTF-8"?>\n'.encode() + sparql_response[1]
-                    if "xml" in self.mediatype
-                    else sparql_response[1]
-                ),
+                sparql_response[1],
                 headers={"Content-Type": self.mediatype},
             )
         else:
@@ -565,7 +620,7 @@ class ConceptRenderer(Renderer):
             {prefixes}
             SELECT DISTINCT ?p ?o ?o_label ?o_notation ?collection_uri ?collection_systemUri ?collection_label
             WHERE {{
-              BIND (<{self.instance_uri}> AS ?concept)
+              BIND (<{self.concept_uri}> AS ?concept)
               ?concept ?p ?o .
             
               FILTER ( ?p != skos:broaderTransitive )
@@ -579,14 +634,7 @@ class ConceptRenderer(Renderer):
                 FILTER(!isLiteral(?o_label) || lang(?o_label) = "en" || lang(?o_label) = "")
               }}
             
-              BIND(
-                IF(
-                  CONTAINS(STR(?concept), "standard_name"), 
-                    <{DATA_URI}/standard_name/>,
-                    IRI(CONCAT(STRBEFORE(STR(?concept), "/current/"), "/current/"))
-                )
-                AS ?collection_uri
-              )
+              BIND (<{self.collection_uri}> AS ?collection_uri)
               BIND (REPLACE(STR(?collection_uri), "{DATA_URI}", "") AS ?collection_systemUri)
               OPTIONAL {{?collection_uri skos:prefLabel ?x }}
               BIND (COALESCE(?x, "Climate and Forecast Standard Names") AS ?collection_label)
@@ -600,7 +648,7 @@ class ConceptRenderer(Renderer):
             PREFIX reg: <http://purl.org/linked-data/registry#>
 
             SELECT ?murl ?p ?obj WHERE {{
-                BIND (<{self.instance_uri}> AS ?concept)
+                BIND (<{self.concept_uri}> AS ?concept)
                 ?murl sssom:subject_id ?concept .
 
                 ?murl reg:status reg:statusDeprecated .
@@ -636,7 +684,7 @@ class ConceptRenderer(Renderer):
             PREFIX reg: <http://purl.org/linked-data/registry#>
             {prefixes}
             SELECT ?murl ?p ?obj WHERE {{
-                BIND (<{self.instance_uri}> AS ?concept)
+                BIND (<{self.concept_uri}> AS ?concept)
                 ?murl sssom:subject_id ?concept .
 
                 ?murl reg:status reg:statusValid .
@@ -768,10 +816,9 @@ class ConceptRenderer(Renderer):
         def make_predicate_label_from_uri(uri):
             return uri.split("#")[-1].split("/")[-1]
 
-        alt_profiles = get_alt_profiles()
         profile_url = None
 
-        for ap in alt_profiles.values():
+        for ap in self.alt_profiles.values():
             if ap["token"] == self.profile:
                 profile_url = ap["url"]
                 context["profile"] = ap
@@ -883,7 +930,7 @@ class ConceptRenderer(Renderer):
             PREFIX owl: <http://www.w3.org/2002/07/owl#>
             SELECT DISTINCT ?p ?o ?o_label ?o_notation ?collection_uri ?collection_systemUri ?collection_label
             WHERE {{
-              BIND (<{self.instance_uri}> AS ?concept)
+              BIND (<{self.concept_uri}> AS ?concept)
               ?concept ?p ?o .
 
               FILTER ( ?p != skos:broaderTransitive )
@@ -900,14 +947,7 @@ class ConceptRenderer(Renderer):
                 FILTER(!isLiteral(?o_label) || lang(?o_label) = "en" || lang(?o_label) = "")
               }}
 
-              BIND(
-                IF(
-                  CONTAINS(STR(?concept), "standard_name"),
-                    <{DATA_URI}/standard_name/>,
-                    IRI(CONCAT(STRBEFORE(STR(?concept), "/current/"), "/current/"))
-                )
-                AS ?collection_uri
-              )
+              BIND (<{self.collection_uri}> AS ?collection_uri)
               BIND (REPLACE(STR(?collection_uri), "{DATA_URI}", "") AS ?collection_systemUri)
               OPTIONAL {{?collection_uri skos:prefLabel ?x }}
               BIND (COALESCE(?x, "Climate and Forecast Standard Names") AS ?collection_label)
@@ -1073,7 +1113,7 @@ class ConceptRenderer(Renderer):
             PREFIX reg: <http://purl.org/linked-data/registry#>
 
             SELECT ?murl ?p ?obj WHERE {{
-                BIND (<{self.instance_uri}> AS ?concept)
+                BIND (<{self.concept_uri}> AS ?concept)
                 ?murl sssom:subject_id ?concept .
 
                 ?murl reg:status reg:statusDeprecated .
@@ -1105,7 +1145,7 @@ class ConceptRenderer(Renderer):
             deprecated_m_filter = deprecated_m_filter + f"FILTER (!(?p = {m[1]} && ?o = <{m[0]}>)) "
 
         filter_out_where_deprecated_mappings = f"""
-            <{self.instance_uri}> ?p ?o .
+            <{self.concept_uri}> ?p ?o .
             {deprecated_m_filter}
         """
 
@@ -1126,7 +1166,7 @@ class ConceptRenderer(Renderer):
 
             }}
             WHERE {{
-                <{self.instance_uri}> ?p ?o .           
+                <{self.concept_uri}> ?p ?o .           
                           
 
                 #FILTER (!(?p = owl#sameAs && ?o = <http://environment.data.gov.au/def/object/copper>))                
@@ -1138,7 +1178,7 @@ class ConceptRenderer(Renderer):
             }}
         """
 
-        return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
+        return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
 
     def _render_skos_rdf(self):
         q = """
@@ -1148,15 +1188,15 @@ class ConceptRenderer(Renderer):
               ?s ?p2 <xxx> .  
             }
             WHERE {
-              <xxx> ?p ?o .
-              ?s ?p2 <xxx> .
+              <yyy> ?p ?o .
+              ?s ?p2 <yyy> .
 
               # include only SKOS properties
               FILTER (STRSTARTS(STR(?p), "http://www.w3.org/2004/02/skos/core#"))
               FILTER (STRSTARTS(STR(?p2), "http://www.w3.org/2004/02/skos/core#"))
             }
-            """.replace("xxx", self.instance_uri)
-        return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
+            """.replace("yyy", self.concept_uri).replace("xxx", self.instance_uri)
+        return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
 
     def _render_vocpub_rdf(self):
         q = """
@@ -1171,13 +1211,13 @@ class ConceptRenderer(Renderer):
               ?s ?p2 <xxx> .  
             }
             WHERE {
-              <xxx> ?p ?o .
-              ?s ?p2 <xxx> .
+              <yyy> ?p ?o .
+              ?s ?p2 <yyy> .
 
               FILTER (!STRSTARTS(STR(?p2), "http://www.w3.org/1999/02/22-rdf-syntax-ns#"))
             }
-            """.replace("xxx", self.instance_uri)
-        return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
+            """.replace("yyy", self.concept_uri).replace("xxx", self.instance_uri)
+        return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
 
     def _render_sdo_rdf(self):
         q = """
@@ -1198,13 +1238,13 @@ class ConceptRenderer(Renderer):
               .
             }
             WHERE {
-              <xxx> rdf:type ?type;
+              <yyy> rdf:type ?type;
                 skos:definition ?description ;
                 dce:identifier ?identifier;
                 skos:prefLabel ?label ;
             }            
-            """.replace("xxx", self.instance_uri)
-        return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
+            """.replace("yyy", self.concept_uri).replace("xxx", self.instance_uri)
+        return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
 
     def _render_profile_rdf(self):
         exclude_filters = ""
@@ -1231,7 +1271,7 @@ class ConceptRenderer(Renderer):
               <{self.instance_uri}> ?p ?o .
             }}
             WHERE {{
-              <{self.instance_uri}> ?p ?o .
+              <{self.concept_uri}> ?p ?o .
               FILTER ( ?p != skos:broaderTransitive )
               FILTER ( ?p != skos:narrowerTransitive )
               FILTER ( ?p != skos:broader )
@@ -1242,7 +1282,7 @@ class ConceptRenderer(Renderer):
               {exclude_filters}
             }}
         """
-        return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
+        return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
 
     def render(self):
         alt_profile_tokens = [alt["token"] for alt in self.alt_profiles.values()]
@@ -1278,7 +1318,7 @@ def concept(request: Request):
 )
 @router.head("/collection/{collection_id}/current/{concept_id}/{vnum}/", include_in_schema=False)
 def concept_with_version(request: Request, collection_id, concept_id, vnum: int):
-    return concept(request)
+    return concept_version_response(request, ConceptRenderer(request))
 
 
 @router.get("/collection/{collection_id}/current/{acc_dep_or_concept}", include_in_schema=False)
@@ -0,0 +1,74 @@
+"""Long-lived caching of concept versions, /collection/{collection_id}/current/{concept_id}/{vnum}/.
+
+A version of a concept never changes once it is published, so each of its representations, per profile and
+mediatype, is rendered once into an on-disk cache shared by the worker processes. It is then served from there
+with a strong ETag. Its RDF and JSON are also Cache-Control: immutable, so neither clients nor the triplestore see
+repeat requests for them. Its HTML shows whether a user is logged in and is made with the page templates, so clients
+revalidate it each time, which is answered with a 304 while it is unchanged, and it is rendered again if they change.
+"""
+
+import hashlib
+from pathlib import Path
+
+import diskcache
+from fastapi import HTTPException
+from pyldapi import Renderer
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import page_configs
+from .utils import etag_matches, exists_triple
+
+concept_versions_cache = diskcache.Cache(
+    page_configs.CONCEPT_VERSIONS_CACHE_DIR, size_limit=page_configs.CONCEPT_VERSIONS_CACHE_SIZE
+)
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+HTML_CACHE_CONTROL = "private, no-cache"
+
+
+def _templates_version() -> str:
+    """A hash of the page templates, which the HTML is rendered with."""
+    templates = sorted((Path(__file__).parent.parent / "view" / "templates").rglob("*.html"))
+    return hashlib.sha256(b"".join(path.read_bytes() for path in templates)).hexdigest()[:16]
+
+
+# the HTML is keyed on the templates, so a deploy changing them doesn't serve it stale
+TEMPLATES_VERSION = _templates_version()
+# headers of a rendered response that aren't stored with it
+UNCACHED_HEADERS = {"content-length", "set-cookie"}
+
+
+def concept_version_response(request: Request, renderer: Renderer) -> Response:
+    """Serve a concept version in the profile and mediatype negotiated by its renderer, rendering it on first request.
+
+    A version that doesn't exist, e.g. one not yet published, is a 404, and only successful responses for versions
+    that exist are cached. HTML pages are rendered each time while a user is logged in, as they show who that is.
+    """
+    html = "html" in renderer.mediatype
+    for_user = html and "user" in request.session
+
+    key = f"{renderer.instance_uri} {renderer.profile} {renderer.mediatype}"
+    if html:
+        key += f" {TEMPLATES_VERSION}"
+    cached = None if for_user else concept_versions_cache.get(key)
+    if cached is None:
+        if not exists_triple(request.url.path):
+            raise HTTPException(status_code=404)
+        response = renderer.render()
+        if for_user or response is None or response.status_code != 200 or not hasattr(response, "body"):
+            return response
+        headers = {name: value for name, value in response.headers.items() if name not in UNCACHED_HEADERS}
+        headers.setdefault("vary", "Accept, Accept-Profile")
+        headers["etag"] = f'"{hashlib.sha256(key.encode("utf-8") + response.body).hexdigest()}"'
+        headers["cache-control"] = HTML_CACHE_CONTROL if html else CACHE_CONTROL
+        cached = {"body": response.body, "headers": headers}
+        concept_versions_cache.set(key, cached)
+
+    headers = cached["headers"]
+    if etag_matches(request, headers["etag"]):
+        return Response(
+            status_code=304,
+            headers={name: headers[name] for name in ("etag", "cache-control", "vary")},
+        )
+    return Response(cached["body"], headers=headers)
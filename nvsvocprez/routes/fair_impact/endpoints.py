@@ -9,13 +9,13 @@ import json
 from datetime import datetime
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 from fastapi import APIRouter
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from starlette.requests import Request
-from starlette.responses import JSONResponse
 
-import httpx
+from typing import Optional
 
-from ..utils import sparql_query
+from ..collection_dumps import dump_byte_size
+from ..utils import cache_return, cache_version, date_time_literal, sparql_query
 
 router = APIRouter()
 
@@ -23,8 +23,6 @@ config_file_location = Path(__file__).parent.parent.parent / "api_doc_config.jso
 with open(config_file_location, "r") as config_file:
     paths = json.load(config_file)["paths"]
 
-timeout = 60
-
 host = os.getenv("SYSTEM_URI", "https://vocab.nerc.ac.uk")
 
 hydra_pagination_context = {
@@ -104,6 +102,9 @@ distributions_config = [
 artefacts_default_params = "acronym, accessRights, contactPoint, creator, description, identifier, keyword, title"
 artefacts_protected_params = {"@id", "acronym", "@type"}
 
+# the index cache fields every artefact is made from, a collection or scheme without one of them isn't an artefact
+artefact_index_fields = ["uri", "prefLabel", "title", "date", "versionInfo", "creator", "publisher", "description"]
+
 distributions_default_params = "all"
 distributions_protected_params = {"distributionId", "@id", "@type"}
 
@@ -120,23 +121,10 @@ resouces_concepts_protected_params = {"@id"}
 @router.get("/artefacts", **paths["/artefacts"]["get"])
 @router.head("/artefacts", include_in_schema=False)
 def artefacts(request: Request, do_filter="yes", do_pagination="yes"):
-    # Collections
-    with httpx.Client(follow_redirects=True) as client:
-        response = client.get(f"{host}/collection?_mediatype=application/ld+json&_profile=nvs", timeout=timeout)
-
-    data = response.json()
-    member_collection_items = get_collection_member_items(data)
-
-    # Schemes
-    with httpx.Client(follow_redirects=True) as client:
-        response = client.get(f"{host}/scheme?_mediatype=application/ld+json&_profile=nvs", timeout=timeout)
-
-    data = response.json()
-    member_scheme_items = get_scheme_member_items(data)
-
     json_ld = {
         "@context": {**artefacts_context, **hydra_pagination_context},
-        "member": member_collection_items + member_scheme_items,
+        # copied, as the filter below changes them
+        "member": [dict(member) for member in get_artefact_members()],
     }
 
     if do_filter is not None:
@@ -176,60 +164,39 @@ def artefacts(request: Request, do_filter="yes", do_pagination="yes"):
             **json_header,
         }
 
-    return JSONResponse(content=json_ld, status_code=200)
+    return ORJSONResponse(content=json_ld, status_code=200)
 
 
 @router.get("/artefacts/{artefactID}", **paths["/artefacts/{artefactID}"]["get"])
 @router.head("/artefacts/{artefactID}", include_in_schema=False)
 def artefactId(request: Request, artefactID: str, do_filter="yes"):
 
-    response = artefacts(request, do_filter, do_pagination=None)
-
-    body = response.body
-    data = json.loads(body.decode("utf-8"))
+    member = get_artefact(artefactID)
 
-    member_item = [item for item in data["member"] if item.get("acronym") == artefactID]
+    if member is None:
+        return artefact_not_found(artefactID)
 
-    if not member_item:
-        return JSONResponse(content={"error": f"artefactID {artefactID} not found"}, status_code=200)
-
-    json_ld = {}
-    json_type = {"@type": "collection"}
-    json_ld = {"@context": artefacts_context, **json_type}
-    json_ld.update(member_item[0])
+    member = dict(member)
+    if do_filter is not None:
+        display_param = request.query_params.get("display", artefacts_default_params)
+        filter_params_in_member_artefacts({"member": [member]}, display_param, artefacts_protected_params)
 
-    if "@context" in json_ld and "Collection" in json_ld["@context"]:
-        del json_ld["@context"]["Collection"]
+    context = {key: value for key, value in artefacts_context.items() if key != "Collection"}
+    json_ld = {"@context": context, "@type": "collection", **member}
 
-    return JSONResponse(content=json_ld, status_code=200)
+    return ORJSONResponse(content=json_ld, status_code=200)
 
 
 @router.get("/artefacts/{artefactID}/distributions", **paths["/artefacts/{artefactID}/distributions"]["get"])
 @router.head("/artefacts/{artefactID}/distributions", include_in_schema=False)
 def distributions(request: Request, artefactID: str, do_filter=None, do_pagination="yes"):
 
-    response = artefactId(request, artefactID, do_filter)
+    data = get_artefact(artefactID)
 
-    if error := errorResponse(response):
-        return JSONResponse(content={"error": error}, status_code=200)
+    if data is None:
+        return artefact_not_found(artefactID)
 
-    body = response.body
-    data = json.loads(body.decode("utf-8"))
-
-    distributions_json_ld = [
-        {
-            **{"title": data["title"], "description": data["description"], "modified": data["modified"]},
-            **item,
-            **distributions_meta,
-        }
-        for item in distributions_config
-    ]
-
-    for item in distributions_json_ld:
-        item["downloadURL"] = f"{data['identifier']}?_profile=nvs&_mediatype={item['mediaType']}"
-        item["@id"] = f"{host}/artefacts/{artefactID.upper()}/distributions/{item['distributionId']}"
-        item["byteSize"] = get_response_bytesize(item["downloadURL"])
-        del item["mediaType"]
+    distributions_json_ld = [make_distribution(artefactID, data, item) for item in distributions_config]
 
     member_items = {"member": distributions_json_ld}
 
@@ -272,7 +239,7 @@ def distributions(request: Request, artefactID: str, do_filter=None, do_paginati
         json_ld = paged_json_ld
         json_ld["@context"]["Collection"] = "hydra:Collection"
 
-    return JSONResponse(content=json_ld, status_code=200)
+    return ORJSONResponse(content=json_ld, status_code=200)
 
 
 @router.get(
@@ -282,25 +249,25 @@ def distributions(request: Request, artefactID: str, do_filter=None, do_paginati
 @router.head("/artefacts/{artefactID}/distributions/{distributionID}", include_in_schema=False)
 def distributionsId(request: Request, artefactID: str, distributionID: int):
 
-    response = distributions(request, artefactID)
-
-    if error := errorResponse(response):
-        return JSONResponse(content={"error": error}, status_code=200)
+    data = get_artefact(artefactID)
 
-    valid_ids = list(range(1, len(distributions_config) + 1))
+    if data is None:
+        return artefact_not_found(artefactID)
 
-    if distributionID not in valid_ids:
-        return JSONResponse(content={"error": f"distributionID {distributionID} not found"}, status_code=200)
+    config = next((item for item in distributions_config if item["distributionId"] == distributionID), None)
 
-    body = response.body
-    data = json.loads(body.decode("utf-8"))
+    if config is None:
+        return ORJSONResponse(content={"error": f"distributionID {distributionID} not found"}, status_code=200)
 
-    distribution_item = next(item for item in data["member"] if item["distributionId"] == distributionID)
+    distribution_item = make_distribution(artefactID, data, config)
+    # filtered by display, as it is in the distributions listing
+    display_param = request.query_params.get("display", distributions_default_params)
+    filter_params_in_member_artefacts({"member": [distribution_item]}, display_param, distributions_protected_params)
 
     json_ld = {"@context": distributions_context}
     json_ld.update(distribution_item)
 
-    return JSONResponse(content=json_ld, status_code=200)
+    return ORJSONResponse(content=json_ld, status_code=200)
 
 
 @router.get(
@@ -343,7 +310,7 @@ def metadata(request: Request):
     query_param = request.query_params.get("q")
 
     if query_param is None:
-        return JSONResponse(content={"error": "query parameter 'q' not found"}, status_code=200)
+        return ORJSONResponse(content={"error": "query parameter 'q' not found"}, status_code=200)
 
     # if query_param is None:
     #     new_url = str(request.url.include_query_params(q="all"))
@@ -490,7 +457,7 @@ def metadata(request: Request):
         pgn = pagination(1, 1, 1, 0, None, None, 1, str(request.url))
         sparql_result = {"@context": context, **pgn, "member": [], **json_header}
 
-    return JSONResponse(content=sparql_result, status_code=200)
+    return ORJSONResponse(content=sparql_result, status_code=200)
 
 
 @router.get(
@@ -503,7 +470,7 @@ def content(request: Request):
     query_param = request.query_params.get("q")
 
     if query_param is None:
-        return JSONResponse(content={"error": "query parameter 'q' not found"}, status_code=200)
+        return ORJSONResponse(content={"error": "query parameter 'q' not found"}, status_code=200)
 
     # if query_param is None:
     #     new_url = str(request.url.include_query_params(q="all"))
@@ -683,17 +650,15 @@ def content(request: Request):
             **json_header,
         }
 
-    return JSONResponse(content=sparql_result, status_code=200)
+    return ORJSONResponse(content=sparql_result, status_code=200)
 
 
 @router.get("/artefacts/{artefactID}/resources/concepts", **paths["/artefacts/{artefactID}/resources/concepts"]["get"])
 @router.head("/artefacts/{artefactID}/resources/concepts", include_in_schema=False)
 def concepts_in_collection(request: Request, artefactID: str):
 
-    response = artefactId(request, artefactID)
-
-    if error := errorResponse(response):
-        return JSONResponse(content={"error": error}, status_code=200)
+    if get_artefact(artefactID) is None:
+        return artefact_not_found(artefactID)
 
     q_count = """
         PREFIX dcterms: <http://purl.org/dc/terms/> 
@@ -765,13 +730,27 @@ def concepts_in_collection(request: Request, artefactID: str):
         sparql_result = {"@context": {**artefacts_context, **hydra_pagination_context}, **pgn, **member, **json_header}
         sparql_result["@context"]["Collection"] = "hydra:Collection"
 
-    return JSONResponse(content=sparql_result, status_code=200)
+    return ORJSONResponse(content=sparql_result, status_code=200)
 
 
-def errorResponse(r: JSONResponse):
-    body = r.body
-    data = json.loads(body.decode("utf-8"))
-    return data.get("error", None)
+def artefact_not_found(artefactID: str) -> ORJSONResponse:
+    return ORJSONResponse(content={"error": f"artefactID {artefactID} not found"}, status_code=200)
+
+
+def make_distribution(artefactID: str, artefact: dict, config: dict) -> dict:
+    """The distribution of an artefact member in one of distributions_config."""
+    item = {
+        **{"title": artefact["title"], "description": artefact["description"], "modified": artefact["modified"]},
+        **config,
+        **distributions_meta,
+    }
+    item["downloadURL"] = f"{artefact['identifier']}?_profile=nvs&_mediatype={item['mediaType']}"
+    item["@id"] = f"{host}/artefacts/{artefactID.upper()}/distributions/{item['distributionId']}"
+    # the size of the collection's nvs profile dump, as recorded when it was materialised; schemes have no dumps
+    if "/collection/" in artefact["identifier"]:
+        item["byteSize"] = dump_byte_size(artefact["acronym"], "nvs", item["mediaType"])
+    del item["mediaType"]
+    return item
 
 
 def extract_collection_acronym(uri):
@@ -791,23 +770,29 @@ def parse_date(date_str):
         return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S.%f")
 
 
-def get_collection_member_items(data: dict):
+def _index_items(index: list) -> list:
+    # the values of the index cache records that have every field an artefact is made from
+    items = ({field: binding["value"] for field, binding in record.items()} for record in index)
+    return [item for item in items if all(field in item for field in artefact_index_fields)]
+
+
+def get_collection_member_items(collections: list):
     member_items = []
 
-    for item in data.get("@graph", []):
-        uri = item.get("@id")
+    for item in _index_items(collections):
+        uri = item["uri"]
 
         status = "production"
-        if "DEPRECATED" in item.get("skos:prefLabel", "") or "DEPRECATED" in item.get("dc:title", ""):
+        if "DEPRECATED" in item["prefLabel"] or "DEPRECATED" in item["title"]:
             status = "deprecated"
 
-        date_str = item.get("dc:date")
+        date_str = item["date"]
         date_obj = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S.%f")
 
         bibliographic_citation = (
             f"[British Oceanographic Data Centre, year {date_obj.year}, "
-            f"{item.get('dc:title')}, version {item.get('owl:versionInfo')}, "
-            f"{item.get('dc:publisher')}, "
+            f"{item['title']}, version {item['versionInfo']}, "
+            f"{item['publisher']}, "
             f"{uri} accessed on {date.today()}"
             f"]"
         )
@@ -817,19 +802,19 @@ def get_collection_member_items(data: dict):
                 "acronym": extract_collection_acronym(uri),
                 "accessRights": "public",
                 "URI": uri,
-                "creator": [item.get("dc:creator")],
+                "creator": [item["creator"]],
                 "identifier": uri,
                 "status": status,
                 "language": ["http://lexvo.org/id/iso639-1/en"],
-                "rightsHolder": item.get("dc:creator"),
+                "rightsHolder": item["creator"],
                 "license": "https://creativecommons.org/licenses/by/4.0/",
-                "title": item.get("skos:prefLabel"),
-                "description": item.get("dc:description"),
+                "title": item["prefLabel"],
+                "description": item["description"],
                 "modified": date_str,
                 "landingPage": uri,
                 "bibliographicCitation": bibliographic_citation,
                 "contactPoint": ["vocab.services@bodc.ac.uk"],
-                "publisher": [item.get("dc:publisher")],
+                "publisher": [item["publisher"]],
                 "createdWith": ["https://github.com/RDFLib/VocPrez"],
                 "includedInDataCatalog": [host],
                 "@id": uri.replace("collection", "artefacts").replace("/current/", ""),
@@ -855,17 +840,17 @@ def get_collection_member_items(data: dict):
     return member_items
 
 
-def get_scheme_member_items(data: dict):
+def get_scheme_member_items(schemes: list):
     member_items = []
 
-    for item in data.get("@graph", []):
-        uri = item.get("@id")
-        date_obj = parse_date(item.get("dc:date"))
+    for item in _index_items(schemes):
+        uri = item["uri"]
+        date_obj = parse_date(item["date"])
 
         bibliographic_citation = (
             f"[British Oceanographic Data Centre, year {date_obj.year}, "
-            f"{item.get('dc:title')}, version {item.get('owl:versionInfo')}, "
-            f"{item.get('dc:publisher')}, "
+            f"{item['title']}, version {item['versionInfo']}, "
+            f"{item['publisher']}, "
             f"{uri} accessed on {date.today()}"
             f"]"
         )
@@ -875,18 +860,18 @@ def get_scheme_member_items(data: dict):
                 "acronym": extract_scheme_acronym(uri),
                 "accessRights": "public",
                 "URI": uri,
-                "creator": [item.get("dc:creator")],
+                "creator": [item["creator"]],
                 "identifier": uri,
                 "status": "production",
                 "language": ["http://lexvo.org/id/iso639-1/en"],
-                "rightsHolder": item.get("dc:creator"),
-                "title": item.get("skos:prefLabel"),
-                "description": item.get("dc:description"),
-                "modified": item.get("dc:date"),
+                "rightsHolder": item["creator"],
+                "title": item["prefLabel"],
+                "description": item["description"],
+                "modified": {"@type": "xsd:dateTime", "@value": str(date_time_literal(item["date"]))},
                 "landingPage": uri,
                 "bibliographicCitation": bibliographic_citation,
                 "contactPoint": ["vocab.services@bodc.ac.uk"],
-                "publisher": [item.get("dc:publisher")],
+                "publisher": [item["publisher"]],
                 "createdWith": ["https://github.com/RDFLib/VocPrez"],
                 "includedInDataCatalog": [host],
                 "@id": uri.replace("scheme", "artefacts").replace("/current/", ""),
@@ -912,11 +897,38 @@ def get_scheme_member_items(data: dict):
     return member_items
 
 
-def get_response_bytesize(url):
-    with httpx.Client() as client:
-        response = client.get(url)
-        response.raise_for_status()
-        return len(response.content)
+# {(collections index version, schemes index version, day): {"members": [member], "by_acronym": {acronym: member}}},
+# holding only the current one
+_artefacts = {}
+
+
+def _get_artefacts() -> dict:
+    key = (cache_version("collections"), cache_version("conceptschemes"), date.today())
+    artefacts = _artefacts.get(key)
+    if artefacts is None:
+        members = get_collection_member_items(cache_return(collections_or_conceptschemes="collections"))
+        members += get_scheme_member_items(cache_return(collections_or_conceptschemes="conceptschemes"))
+        by_acronym = {}
+        for member in members:
+            by_acronym.setdefault(member["acronym"], member)
+        # a build for a newer key, in another thread, may clear this one out of _artefacts at any time
+        artefacts = {"members": members, "by_acronym": by_acronym}
+        _artefacts.clear()
+        _artefacts[key] = artefacts
+    return artefacts
+
+
+def get_artefact_members() -> list:
+    """The artefact members of the collections and the schemes, made from the index caches once per fill of them,
+    and once a day, as their citations give the day they're accessed on. They're shared, so must be copied to be
+    changed."""
+    return _get_artefacts()["members"]
+
+
+def get_artefact(artefactID: str) -> Optional[dict]:
+    """The artefact member with an acronym, such as P01, or None if there isn't one. It's shared, as those of
+    get_artefact_members() are."""
+    return _get_artefacts()["by_acronym"].get(artefactID)
 
 
 def filter_params_in_member_artefacts(json_data: dict, fields_to_display: str, protected_params: str) -> str:
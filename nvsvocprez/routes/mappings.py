@@ -0,0 +1,241 @@
+"""Query and serialise SSSOM mapping statements, /mapping/{int_ext}/{mapping_id}/, in bulk.
+
+Mappings are read with one SELECT of flat fields per mapping, in order of mapping URI. Large sets are paged by
+keyset, each page starting after the last mapping of the one before, so the triplestore never re-reads or re-sorts
+the pages already given, and a batch of any size is streamed out a page at a time, in bounded memory.
+"""
+
+import itertools
+import logging
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .page_configs import DATA_URI
+from .utils import TriplestoreError, binding_to_term, sparql_query
+
+PAGE_SIZE = 10000
+# mapping URIs are looked up in batches of this many, each batch being one query
+IDS_PER_QUERY = 1000
+
+MAPPING_FIELDS = ["subject", "predicate", "object", "modified", "status", "submitter", "title", "name", "memberof"]
+MAPPING_PREDICATES = {
+    "subject": "https://w3id.org/sssom/schema/subject_id",
+    "predicate": "https://w3id.org/sssom/schema/predicate_id",
+    "object": "https://w3id.org/sssom/schema/object_id",
+    "modified": "http://purl.org/dc/elements/1.1/modified",
+    "status": "http://purl.org/linked-data/registry#status",
+    "submitter": "http://purl.org/linked-data/registry#submitter",
+}
+SUBMITTER_PREDICATES = {
+    "title": "http://purl.org/linked-data/registry#title",
+    "name": "http://purl.org/linked-data/registry#name",
+    "memberof": "http://www.w3.org/ns/org#memberOf",
+}
+
+# what ends a response whose mappings couldn't all be got from the triplestore, after it had started
+INCOMPLETE = "there was an error querying the triplestore, so these mappings are incomplete"
+
+SSSOM_COLUMNS = [
+    "record_id",
+    "subject_id",
+    "predicate_id",
+    "object_id",
+    "mapping_justification",
+    "mapping_date",
+    "author_label",
+    "other",
+]
+
+
+def mapping_uri(mapping_id: str) -> Optional[str]:
+    """The URI of a mapping given as I/{id} or E/{id}, its system URI or its URI, or None if it isn't one."""
+    match = re.fullmatch(r"(?:.*/mapping)?/?([IE])/([^/?#\s]+)/?", mapping_id.strip())
+    if match is None:
+        return None
+    return f"{DATA_URI}/mapping/{match.group(1)}/{match.group(2)}/"
+
+
+def get_mapping_query(where: str = "", limit: Optional[int] = None, after: Optional[str] = None) -> str:
+    """A SELECT of the fields of each mapping ?m matched by the given graph pattern, ordered by mapping URI, and
+    optionally only of the mappings after a given mapping URI.
+
+    Returns (str): The query, its rows having the variables ?m and MAPPING_FIELDS.
+    """
+    q = f"""
+        PREFIX dc: <http://purl.org/dc/elements/1.1/>
+        PREFIX org: <http://www.w3.org/ns/org#>
+        PREFIX reg: <http://purl.org/linked-data/registry#>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        PREFIX sssom: <https://w3id.org/sssom/schema/>
+        SELECT ?m {" ".join("?" + field for field in MAPPING_FIELDS)}
+        WHERE {{
+            {where}
+            {f"FILTER (STR(?m) > STR(<{after}>))" if after is not None else ""}
+            ?m sssom:subject_id ?subject ;
+               sssom:predicate_id ?predicate ;
+               sssom:object_id ?object .
+            OPTIONAL {{ ?m dc:modified ?modified }}
+            OPTIONAL {{ ?m reg:status ?status }}
+            OPTIONAL {{
+                ?m reg:submitter ?submitter .
+                OPTIONAL {{ ?submitter reg:title ?title }}
+                OPTIONAL {{ ?submitter reg:name ?name }}
+                OPTIONAL {{ ?submitter org:memberOf ?memberof }}
+            }}
+        }}
+        ORDER BY ?m
+        """
+    if limit is not None:
+        q += f"LIMIT {limit}\n"
+    return q
+
+
+def _query_rows(q: str) -> List[Dict]:
+    r = sparql_query(q)
+    if not r[0]:
+        raise TriplestoreError(f"The mappings query failed. Status Code: {r[1]} , Error: {r[2]}")
+    return r[1]
+
+
+def _iter_rows(mapping_uris: Optional[List[str]] = None, collection_uri: Optional[str] = None) -> Iterator[Dict]:
+    if mapping_uris is not None:
+        uris = sorted(set(mapping_uris))
+        for start in range(0, len(uris), IDS_PER_QUERY):
+            values = " ".join(f"<{uri}>" for uri in uris[start : start + IDS_PER_QUERY])
+            yield from _query_rows(get_mapping_query(f"VALUES ?m {{ {values} }}"))
+    else:
+        after = None
+        while True:
+            rows = _query_rows(get_mapping_query(f"<{collection_uri}> skos:member ?subject .", PAGE_SIZE, after))
+            if len(rows) < PAGE_SIZE:
+                yield from rows
+                break
+            # the rows of the page's last mapping may run on into the next page, so they're left for it to give whole,
+            # unless that mapping fills the page
+            last = rows[-1]["m"]["value"]
+            complete = [row for row in rows if row["m"]["value"] != last]
+            yield from complete or rows
+            after = complete[-1]["m"]["value"] if complete else last
+
+
+def iter_mappings(mapping_uris: Optional[List[str]] = None, collection_uri: Optional[str] = None) -> Iterator[Dict]:
+    """Get the mappings with the given URIs, or those whose subject is a member of the given collection.
+
+    Rows are ordered by mapping, so the rows of one mapping, one per combination of its submitter's fields, are
+    merged as they arrive.
+
+    Returns (Iterator[Dict]): A {"uri": binding, field: binding} record per mapping, for the fields in MAPPING_FIELDS
+    that it has.
+    """
+    record = None
+    for row in _iter_rows(mapping_uris, collection_uri):
+        if record is None or row["m"]["value"] != record["uri"]["value"]:
+            if record is not None:
+                yield record
+            record = {"uri": row["m"]}
+        for field in MAPPING_FIELDS:
+            if field in row and field not in record:
+                record[field] = row[field]
+    if record is not None:
+        yield record
+
+
+def fetch_first(records: Iterator[Dict]) -> Iterator[Dict]:
+    """Fetch the first of an iterator of records now, so that an error querying the triplestore for the first page is
+    raised before a response streaming them has started.
+
+    Returns (Iterator[Dict]): All the records.
+    """
+    first = next(records, None)
+    return records if first is None else itertools.chain([first], records)
+
+
+def _tsv_value(value: str) -> str:
+    return re.sub(r"[\t\r\n]+", " ", value)
+
+
+def sssom_tsv(records: Iterable[Dict], mapping_set_id: str) -> Iterator[str]:
+    """Write mapping records as an SSSOM TSV mapping set, a line at a time."""
+    yield f"#mapping_set_id: {mapping_set_id}\n"
+    yield "#curie_map:\n"
+    yield "#  semapv: https://w3id.org/semapv/vocab/\n"
+    yield "\t".join(SSSOM_COLUMNS) + "\n"
+    try:
+        for record in records:
+            value = {field: binding["value"] for field, binding in record.items()}
+            author = " ".join(value[field] for field in ("title", "name") if field in value)
+            yield "\t".join(
+                _tsv_value(v)
+                for v in [
+                    value["uri"],
+                    value["subject"],
+                    value["predicate"],
+                    value["object"],
+                    "semapv:ManualMappingCuration",
+                    value.get("modified", "")[0:10],
+                    author,
+                    f"status={value['status']}" if "status" in value else "",
+                ]
+            ) + "\n"
+    except TriplestoreError as exc:
+        # the response has started by now, so the output is cut short with a line saying so
+        logging.error(exc)
+        yield f"#error: {INCOMPLETE}\n"
+
+
+def ntriples(records: Iterable[Dict]) -> Iterator[str]:
+    """Write mapping records as N-Triples, a mapping at a time."""
+    try:
+        for record in records:
+            m = binding_to_term(record["uri"]).n3()
+            lines = [
+                f"{m} <{predicate}> {binding_to_term(record[field]).n3()} .\n"
+                for field, predicate in MAPPING_PREDICATES.items()
+                if field in record
+            ]
+            if "submitter" in record:
+                submitter = binding_to_term(record["submitter"]).n3()
+                lines += [
+                    f"{submitter} <{predicate}> {binding_to_term(record[field]).n3()} .\n"
+                    for field, predicate in SUBMITTER_PREDICATES.items()
+                    if field in record
+                ]
+            yield "".join(lines)
+    except TriplestoreError as exc:
+        logging.error(exc)
+        yield f"# error: {INCOMPLETE}\n"
+
+
+def get_mapping(uri: str) -> Optional[Dict]:
+    """Get the fields of a single mapping.
+
+    Returns (Dict): {field: value} for the fields in MAPPING_FIELDS that it has, or None if there is no such mapping.
+    """
+    for record in iter_mappings([uri]):
+        return {field: binding["value"] for field, binding in record.items() if field != "uri"}
+    return None
+
+
+def get_mapping_construct_query(uri: str) -> str:
+    """A CONSTRUCT of the triples of a mapping and of its submitter and blank nodes, as DESCRIBE gives.
+
+    Some mappings were loaded with the namespace http://www.w3.org/ns/org# used as a predicate, which is rewritten
+    to org:Organization here, so the triplestore's RDF can be returned as is.
+    """
+    return """
+        PREFIX org: <http://www.w3.org/ns/org#>
+        PREFIX reg: <http://purl.org/linked-data/registry#>
+        CONSTRUCT {
+            <xxx> ?p ?o .
+            ?o ?p2 ?o2 .
+        }
+        WHERE {
+            <xxx> ?p_ ?o .
+            BIND (IF(?p_ = <http://www.w3.org/ns/org#>, org:Organization, ?p_) AS ?p)
+            OPTIONAL {
+                ?o ?p2_ ?o2 .
+                FILTER (isBlank(?o) || ?p_ = reg:submitter)
+                BIND (IF(?p2_ = <http://www.w3.org/ns/org#>, org:Organization, ?p2_) AS ?p2)
+            }
+        }
+        """.replace("xxx", uri)
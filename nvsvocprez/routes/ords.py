@@ -0,0 +1,205 @@
+"""The client of the BODC ORDS endpoint, from which the ontologies, alternate profiles and external mappings come.
+
+Requests to ORDS go through one pooled session, with bounded connect and read timeouts, so a slow ORDS can't hold a
+request thread for long. What a function memoised with memoize() gets from ORDS is kept in ords_cache, which the
+workers share: once it is ORDS_REFRESH_AFTER seconds old it is fetched again in the background, while the last good
+value is served, and it is served while ORDS is slow or down, for up to ORDS_CACHE_EXPIRE seconds. An empty result,
+or the {} served when ORDS can't be reached, is only kept for ORDS_EMPTY_EXPIRE seconds. Lookups that many requests
+will make, such as the external mappings of every collection, can be prefetched in bulk ahead of them.
+"""
+
+import functools
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import diskcache
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import page_configs
+
+
+class InstrumentedCache(diskcache.Cache):
+    """A diskcache Cache that counts, in this process, the hits and misses recorded in its counters and the entries it
+    expires and evicts, and can report the entries and bytes it holds for each tag.
+
+    It is made with cull_limit=0, so diskcache doesn't cull on writes and entries are only removed by cull(), which
+    writers call after storing a value.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, cull_limit=0, **kwargs)
+        self.counters = Counter()
+
+    def cull(self, retry=False):
+        """Remove the expired entries, then evict entries by the eviction policy until the cache is under its size
+        limit, counting both. Returns the number of entries removed."""
+        expired = self.expire(retry=retry)
+        evicted = super().cull(retry=retry)
+        self.counters["expirations"] += expired
+        self.counters["evictions"] += evicted
+        return expired + evicted
+
+    def tag_sizes(self) -> Dict[Optional[str], Dict[str, int]]:
+        """The number of entries, and the bytes of their keys and values, for each tag.
+
+        Returns (Dict): {tag: {"count": int, "bytes": int}}.
+        """
+        rows = self._sql(
+            "SELECT tag, COUNT(*), SUM(LENGTH(key) + COALESCE(LENGTH(value), 0) + size) FROM Cache GROUP BY tag"
+        ).fetchall()
+        return {tag: {"count": count, "bytes": size} for tag, count, size in rows}
+
+    def telemetry(self, detailed=False) -> Dict:
+        """The size and counters of the cache, the counters being those of this worker since it started, and, if
+        detailed, its settings, which give away where it is on disk and the worker's pid."""
+        telemetry = {
+            "volume": self.volume(),
+            "count": len(self),
+            "counters": {
+                name: self.counters[name] for name in ("in_process_hits", "hits", "misses", "expirations", "evictions")
+            },
+        }
+        if detailed:
+            telemetry.update(
+                directory=self.directory,
+                pid=os.getpid(),
+                size_limit=self.size_limit,
+                eviction_policy=self.eviction_policy,
+                tags=self.tag_sizes(),
+            )
+        return telemetry
+
+
+# Shared cache across worker processes
+ords_cache = InstrumentedCache(
+    page_configs.ORDS_CACHE_DIR,
+    size_limit=page_configs.ORDS_CACHE_SIZE,
+    eviction_policy=page_configs.ORDS_CACHE_EVICTION_POLICY,
+)
+
+# a refresh of an entry by one worker stops the others starting one for this many seconds, or until it finishes
+REFRESH_LEASE = 300
+
+session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_maxsize=page_configs.ORDS_POOL_SIZE,
+    # connection failures and gateway errors are retried, but not a read that timed out, which would be slow again
+    max_retries=Retry(total=2, read=0, backoff_factor=0.2, status_forcelist=(502, 503, 504)),
+)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+_refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ords-refresh")
+
+# what fetching from ORDS raises if ORDS is down, slow or answers with something other than its JSON
+ORDS_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
+
+def _log_failure(future):
+    # what runs in the background has no caller to raise to
+    if not future.cancelled() and future.exception() is not None:
+        exc = future.exception()
+        logging.error("A background ORDS task failed.", exc_info=(type(exc), exc, exc.__traceback__))
+
+
+def _submit(executor: ThreadPoolExecutor, func, *args):
+    future = executor.submit(func, *args)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def fetch_items(path: str) -> List[Dict]:
+    """Get the items of an ORDS resource, such as ontology or collection-external-mappings/P01.
+
+    Raises one of ORDS_ERRORS if ORDS can't be reached, times out or gives an error.
+    """
+    r = session.get(
+        f"{page_configs.ORDS_ENDPOINT_URL}/{path}",
+        timeout=(page_configs.ORDS_CONNECT_TIMEOUT, page_configs.ORDS_READ_TIMEOUT),
+    )
+    r.raise_for_status()
+    return r.json()["items"]
+
+
+def memoize(func):
+    """Memoise a function of ORDS in ords_cache, refreshing what it returned in the background once it is
+    ORDS_REFRESH_AFTER seconds old.
+
+    If the function raises one of ORDS_ERRORS the error is logged and its last good result returned, or {} if it
+    has never had one. A result is cached for ORDS_CACHE_EXPIRE seconds. An empty one, or the {} returned for an
+    error, is only cached for ORDS_EMPTY_EXPIRE seconds, and only if there isn't a good one, so ORDS is asked again
+    soon rather than being taken to have nothing.
+    """
+
+    def cache_key(*args):
+        return (f"{func.__module__}.{func.__qualname__}",) + args
+
+    def store(key, value):
+        if value:
+            ords_cache.set(key, (time.time(), value), expire=page_configs.ORDS_CACHE_EXPIRE, tag="ords")
+        else:
+            # an empty result, or the {} for an error, doesn't replace a good one
+            ords_cache.add(key, (time.time(), value), expire=page_configs.ORDS_EMPTY_EXPIRE, tag="ords")
+        ords_cache.cull()
+
+    def call(key, args):
+        value = func(*args)
+        store(key, value)
+        return value
+
+    def refresh(key, args):
+        try:
+            call(key, args)
+        except ORDS_ERRORS as exc:
+            logging.error(
+                "Failed to refresh %s%s from ORDS, the last good value is kept.\n%s", func.__name__, args, exc
+            )
+        finally:
+            ords_cache.delete(key + ("refreshing",))
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = cache_key(*args)
+        entry = ords_cache.get(key)
+        ords_cache.counters["misses" if entry is None else "hits"] += 1
+        if entry is None:
+            try:
+                return call(key, args)
+            except ORDS_ERRORS as exc:
+                logging.error("Failed to retrieve %s%s from ORDS.\n%s", func.__name__, args, exc)
+                store(key, {})
+                return {}  # Return blank dict to avoid internal server error.
+
+        fetched, value = entry
+        if time.time() - fetched > page_configs.ORDS_REFRESH_AFTER:
+            if ords_cache.add(key + ("refreshing",), True, expire=REFRESH_LEASE):
+                _submit(_refresher, refresh, key, args)
+        return value
+
+    def prefetch(arguments: Iterable[Tuple]):
+        """Fetch, ORDS_PREFETCH_WORKERS at a time, what the function returns for each tuple of arguments that isn't
+        in ords_cache or is due a refresh, and cache it. Arguments another worker is already refreshing are skipped."""
+        with ThreadPoolExecutor(page_configs.ORDS_PREFETCH_WORKERS, thread_name_prefix="ords-prefetch") as pool:
+            for args in arguments:
+                key = cache_key(*args)
+                entry = ords_cache.get(key)
+                if entry is not None and time.time() - entry[0] <= page_configs.ORDS_REFRESH_AFTER:
+                    continue
+                if ords_cache.add(key + ("refreshing",), True, expire=REFRESH_LEASE):
+                    _submit(pool, refresh, key, args)
+
+    wrapper.__cache_key__ = cache_key
+    wrapper.prefetch = prefetch
+    return wrapper
+
+
+def in_background(func, *args):
+    """Run a function on the thread ORDS lookups are refreshed on, such as a prefetch() that requests shouldn't wait
+    for. Any exception it raises is logged."""
+    return _submit(_refresher, func, *args)
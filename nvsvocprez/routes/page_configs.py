@@ -14,6 +14,35 @@ SPARQL_PASSWORD = os.getenv("SPARQL_PASSWORD", "")
 SYSTEM_URI = os.getenv("SYSTEM_URI", "http://localhost:5007")
 DATA_URI = os.getenv("DATA_URI", "http://vocab.nerc.ac.uk")
 ORDS_ENDPOINT_URL = os.getenv("ORDS_ENDPOINT_URL")  # BODC ORDS URL.
+# Where materialised collection RDF dumps are written.
+COLLECTION_DUMPS_DIR = os.getenv("COLLECTION_DUMPS_DIR", os.path.join(os.path.dirname(__file__), "cache", "dumps"))
+# Where rendered versions of concepts, which never change, are kept, and the most bytes kept there.
+CONCEPT_VERSIONS_CACHE_DIR = os.getenv("CONCEPT_VERSIONS_CACHE_DIR", os.path.expanduser("~/concept_versions_cache"))
+CONCEPT_VERSIONS_CACHE_SIZE = int(os.getenv("CONCEPT_VERSIONS_CACHE_SIZE", 1024 * 1024 * 1024))
+# Where CONSTRUCT results and their serialisations are kept, the most bytes kept there and for how many seconds. They
+# are keyed on the fill of the index caches, so this only bounds how long those of an older fill stay on disk.
+CONSTRUCT_CACHE_DIR = os.getenv("CONSTRUCT_CACHE_DIR", os.path.expanduser("~/construct_cache"))
+CONSTRUCT_CACHE_SIZE = int(os.getenv("CONSTRUCT_CACHE_SIZE", 512 * 1024 * 1024))
+CONSTRUCT_CACHE_EXPIRE = int(os.getenv("CONSTRUCT_CACHE_EXPIRE", 24 * 60 * 60))
+# Where what ORDS returns is kept, shared by the workers, the most bytes kept there and how entries are evicted to keep
+# under it, one of diskcache's eviction policies.
+ORDS_CACHE_DIR = os.getenv("ORDS_CACHE_DIR", os.path.expanduser("~/ords_cache"))
+ORDS_CACHE_SIZE = int(os.getenv("ORDS_CACHE_SIZE", 256 * 1024 * 1024))
+ORDS_CACHE_EVICTION_POLICY = os.getenv("ORDS_CACHE_EVICTION_POLICY", "least-recently-stored")
+# For how many seconds an ORDS lookup is held in process, in front of the ORDS diskcache shared by the workers.
+ORDS_L1_TTL = int(os.getenv("ORDS_L1_TTL", 60))
+# The most connections kept open to ORDS, the seconds a request to it may take to connect and to read, and the age
+# in seconds at which what it returned is fetched again in the background.
+ORDS_POOL_SIZE = int(os.getenv("ORDS_POOL_SIZE", 10))
+ORDS_CONNECT_TIMEOUT = float(os.getenv("ORDS_CONNECT_TIMEOUT", 3.05))
+ORDS_READ_TIMEOUT = float(os.getenv("ORDS_READ_TIMEOUT", 10))
+ORDS_REFRESH_AFTER = int(os.getenv("ORDS_REFRESH_AFTER", 24 * 60 * 60))
+# The seconds after which what ORDS returned leaves its cache, if it hasn't been fetched again, and the seconds an empty
+# result, or the {} served when ORDS can't be reached, is kept.
+ORDS_CACHE_EXPIRE = int(os.getenv("ORDS_CACHE_EXPIRE", 30 * 24 * 60 * 60))
+ORDS_EMPTY_EXPIRE = int(os.getenv("ORDS_EMPTY_EXPIRE", 5 * 60))
+# How many ORDS lookups a bulk prefetch makes at once.
+ORDS_PREFETCH_WORKERS = int(os.getenv("ORDS_PREFETCH_WORKERS", 8))
 
 acc_dep_map = {
     "accepted": '?c <http://www.w3.org/2002/07/owl#deprecated> "false" .',
@@ -0,0 +1,56 @@
+"""Static RDF documents, such as the VoID description and the dataset's DCAT and schema.org records, served as is.
+
+Each document is read and parsed once, when the app starts, and serialised into every RDF mediatype. The bytes of
+each serialisation are kept with their ETag and length, so a request for one is answered without touching the disk
+or rdflib.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict
+
+from pyldapi.data import RDF_MEDIATYPES
+from rdflib import Graph
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .utils import etag_matches
+
+
+def load_document(path: Path, instance_uri: str) -> Dict[str, Dict]:
+    """Read a Turtle document and serialise it into every RDF mediatype, with xxx replaced by the instance URI.
+
+    Relative URIs, such as <> for the document itself, are resolved against the instance URI, as a client would
+    resolve them against the URI it got the document from. The Turtle is kept as written rather than re-serialised.
+
+    Returns (Dict[str, Dict]): {mediatype: {"body": bytes, "etag": str, "length": str}}.
+    """
+    turtle = path.read_text().replace("xxx", instance_uri)
+    g = Graph().parse(data=turtle, format="turtle", publicID=instance_uri)
+
+    document = {}
+    for mediatype in RDF_MEDIATYPES:
+        body = (turtle if mediatype == "text/turtle" else g.serialize(format=mediatype)).encode("utf-8")
+        document[mediatype] = {
+            "body": body,
+            "etag": f'"{hashlib.sha256(body).hexdigest()}"',
+            "length": str(len(body)),
+        }
+    return document
+
+
+def document_response(request: Request, document: Dict[str, Dict], mediatype: str) -> Response:
+    """Serve a document loaded by load_document() in an RDF mediatype, or Turtle if it isn't one of them."""
+    if mediatype not in document:
+        mediatype = "text/turtle"
+    serialisation = document[mediatype]
+    if etag_matches(request, serialisation["etag"]):
+        return Response(status_code=304, headers={"ETag": serialisation["etag"]})
+    return Response(
+        serialisation["body"],
+        headers={
+            "Content-Type": mediatype,
+            "Content-Length": serialisation["length"],
+            "ETag": serialisation["etag"],
+        },
+    )
@@ -0,0 +1,248 @@
+"""Write triples made from SPARQL SELECT results as RDF, without building an rdflib Graph.
+
+The triples, of rdflib terms, are written out as they are iterated over, a subject at a time, so the time and memory
+it takes is linear in, and small next to, the number of triples. Consecutive triples with the same subject are
+written together, so they should be ordered by subject to get the most compact output. A triple given twice is
+written twice, which is harmless as RDF graphs are sets of triples.
+
+JSON-LD is written expanded, or, given a context of prefixes, compacted against it as the triplestore compacts the
+JSON-LD of a CONSTRUCT against the query's PREFIXes. The compacted document is built whole, a node object per
+subject in the order subjects are first seen, and encoded with orjson.
+"""
+
+import json
+import re
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import orjson
+from rdflib import BNode, Literal, URIRef
+from rdflib.namespace import RDF, XSD
+
+Triple = Tuple[URIRef, URIRef, object]
+
+# the namespaces given Turtle and RDF/XML prefixes if no others are
+NAMESPACES = {
+    "dcterms": "http://purl.org/dc/terms/",
+    "owl": "http://www.w3.org/2002/07/owl#",
+    "rdf": str(RDF),
+    "rdfs": "http://www.w3.org/2000/01/rdf-schema#",
+    "skos": "http://www.w3.org/2004/02/skos/core#",
+    "xsd": str(XSD),
+}
+
+# a conservative PN_LOCAL, so a prefixed name is only used where it is certainly valid Turtle
+_LOCAL_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+# the local name an RDF/XML property element is named by, the longest NCName that ends its IRI
+_XML_LOCAL_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_.-]*$")
+
+
+def _iri(iri: str) -> str:
+    return "<{}>".format(re.sub(r'[\x00-\x20<>"{}|^`\\]', lambda m: "\\u{:04X}".format(ord(m.group())), iri))
+
+
+def _string(value: str) -> str:
+    return '"{}"'.format(value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _bnode(bnode: BNode) -> str:
+    return "_:" + re.sub(r"[^A-Za-z0-9_]", "_", str(bnode))
+
+
+def _term(term, iri=_iri) -> str:
+    """A term as N-Triples, or as Turtle if given the function to write its IRIs with."""
+    if isinstance(term, BNode):
+        return _bnode(term)
+    if isinstance(term, Literal):
+        if term.language:
+            return "{}@{}".format(_string(str(term)), term.language)
+        if term.datatype is not None and term.datatype != XSD.string:
+            return "{}^^{}".format(_string(str(term)), iri(str(term.datatype)))
+        return _string(str(term))
+    return iri(str(term))
+
+
+def _by_subject(triples: Iterable[Triple]):
+    return groupby(triples, key=lambda triple: triple[0])
+
+
+def write_ntriples(triples: Iterable[Triple]) -> Iterator[bytes]:
+    for s, p, o in triples:
+        yield "{} {} {} .\n".format(_term(s), _term(p), _term(o)).encode("utf-8")
+
+
+def write_turtle(triples: Iterable[Triple], namespaces: Dict[str, str]) -> Iterator[bytes]:
+    def iri(value: str) -> str:
+        for prefix, namespace in namespaces.items():
+            if value.startswith(namespace) and _LOCAL_NAME.fullmatch(value[len(namespace) :]):
+                return "{}:{}".format(prefix, value[len(namespace) :])
+        return _iri(value)
+
+    yield "".join("@prefix {}: {} .\n".format(prefix, _iri(ns)) for prefix, ns in namespaces.items()).encode("utf-8")
+    for s, subject_triples in _by_subject(triples):
+        predicates = []
+        for p, predicate_triples in groupby(subject_triples, key=lambda triple: triple[1]):
+            objects = ", ".join(_term(o, iri) for _, _, o in predicate_triples)
+            predicates.append("{} {}".format("a" if p == RDF.type else _term(p, iri), objects))
+        yield "\n{}\n    {} .\n".format(_term(s, iri), " ;\n    ".join(predicates)).encode("utf-8")
+
+
+def _jsonld_node(s, subject_triples) -> Dict:
+    node = {"@id": _bnode(s) if isinstance(s, BNode) else str(s)}
+    for _, p, o in subject_triples:
+        if p == RDF.type and not isinstance(o, Literal):
+            node.setdefault("@type", []).append(_bnode(o) if isinstance(o, BNode) else str(o))
+            continue
+        if isinstance(o, BNode):
+            value = {"@id": _bnode(o)}
+        elif isinstance(o, Literal):
+            value = {"@value": str(o)}
+            if o.language:
+                value["@language"] = o.language
+            elif o.datatype is not None and o.datatype != XSD.string:
+                value["@type"] = str(o.datatype)
+        else:
+            value = {"@id": str(o)}
+        node.setdefault(str(p), []).append(value)
+    return node
+
+
+def write_jsonld(triples: Iterable[Triple]) -> Iterator[bytes]:
+    """Write expanded JSON-LD, a node object per run of triples with the same subject."""
+    separator = "[\n"
+    for s, subject_triples in _by_subject(triples):
+        yield (separator + json.dumps(_jsonld_node(s, subject_triples), ensure_ascii=False, indent=2)).encode("utf-8")
+        separator = ",\n"
+    yield ("[]\n" if separator == "[\n" else "\n]\n").encode("utf-8")
+
+
+def _compactor(context: Dict[str, str]):
+    # in reverse order a namespace comes before those it extends, so the most specific prefix is used
+    prefixes = sorted(((ns, prefix) for prefix, ns in context.items() if not prefix.startswith("@")), reverse=True)
+    compacted = {}
+
+    def compact(iri: str) -> str:
+        if iri not in compacted:
+            compacted[iri] = iri
+            for namespace, prefix in prefixes:
+                local = iri[len(namespace) :]
+                if iri.startswith(namespace) and local and not local.startswith("//"):
+                    compacted[iri] = "{}:{}".format(prefix, local)
+                    break
+        return compacted[iri]
+
+    return compact
+
+
+def compact_jsonld(triples: Iterable[Triple], context: Dict[str, str]) -> Dict:
+    """Make a compacted JSON-LD document, {"@context", "@graph"}, of triples: properties, types and datatypes become
+    prefixed names, a property with one value has it unwrapped, and plain literals become strings."""
+    compact_iri = _compactor(context)
+    nodes = {}
+    for s, p, o in triples:
+        subject = _bnode(s) if isinstance(s, BNode) else str(s)
+        node = nodes.get(subject)
+        if node is None:
+            node = nodes[subject] = {"@id": subject}
+
+        if p == RDF.type and not isinstance(o, Literal):
+            key, value = "@type", _bnode(o) if isinstance(o, BNode) else compact_iri(str(o))
+        else:
+            key = compact_iri(str(p))
+            if isinstance(o, BNode):
+                value = {"@id": _bnode(o)}
+            elif isinstance(o, Literal):
+                if o.language:
+                    value = {"@language": o.language, "@value": str(o)}
+                elif o.datatype is not None and o.datatype != XSD.string:
+                    value = {"@type": compact_iri(str(o.datatype)), "@value": str(o)}
+                else:
+                    value = str(o)
+            else:
+                value = {"@id": str(o)}
+
+        if key not in node:
+            node[key] = value
+        elif isinstance(node[key], list):
+            node[key].append(value)
+        else:
+            node[key] = [node[key], value]
+
+    return {"@context": dict(context), "@graph": list(nodes.values())}
+
+
+def write_compact_jsonld(triples: Iterable[Triple], context: Dict[str, str]) -> Iterator[bytes]:
+    """Write JSON-LD compacted against a context of prefixes, see compact_jsonld()."""
+    yield orjson.dumps(compact_jsonld(triples, context))
+
+
+def write_rdfxml(triples: Iterable[Triple], namespaces: Dict[str, str]) -> Iterator[bytes]:
+    """Write RDF/XML, an rdf:Description per run of triples with the same subject. A property not in one of the
+    namespaces declares its namespace on its element."""
+    prefixes = {namespace: prefix for prefix, namespace in namespaces.items()}
+    prefixes[str(RDF)] = "rdf"
+
+    def property_element(p: URIRef):
+        local = _XML_LOCAL_NAME.search(str(p))
+        if local is None:
+            raise ValueError("The property {} can't be written as RDF/XML".format(p))
+        namespace = str(p)[: local.start()]
+        if namespace in prefixes:
+            return "{}:{}".format(prefixes[namespace], local.group()), ""
+        return "ns0:{}".format(local.group()), " xmlns:ns0={}".format(quoteattr(namespace))
+
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n<rdf:RDF'
+        + "".join("\n   xmlns:{}={}".format(prefix, quoteattr(ns)) for ns, prefix in sorted(prefixes.items()))
+        + "\n>\n"
+    ).encode("utf-8")
+    for s, subject_triples in _by_subject(triples):
+        about = 'rdf:nodeID="{}"'.format(_bnode(s)[2:]) if isinstance(s, BNode) else "rdf:about=" + quoteattr(str(s))
+        lines = ["  <rdf:Description {}>".format(about)]
+        for _, p, o in subject_triples:
+            name, declaration = property_element(p)
+            if isinstance(o, BNode):
+                lines.append('    <{}{} rdf:nodeID="{}"/>'.format(name, declaration, _bnode(o)[2:]))
+            elif isinstance(o, Literal):
+                if o.language:
+                    attribute = " xml:lang={}".format(quoteattr(o.language))
+                elif o.datatype is not None and o.datatype != XSD.string:
+                    attribute = " rdf:datatype={}".format(quoteattr(str(o.datatype)))
+                else:
+                    attribute = ""
+                lines.append("    <{0}{1}{2}>{3}</{0}>".format(name, declaration, attribute, escape(str(o))))
+            else:
+                lines.append("    <{}{} rdf:resource={}/>".format(name, declaration, quoteattr(str(o))))
+        lines.append("  </rdf:Description>\n")
+        yield "\n".join(lines).encode("utf-8")
+    yield b"</rdf:RDF>\n"
+
+
+def write_rdf(
+    triples: Iterable[Triple],
+    mediatype: str,
+    namespaces: Optional[Dict[str, str]] = None,
+    context: Optional[Dict[str, str]] = None,
+) -> Iterator[bytes]:
+    """Write triples in an RDF mediatype, Turtle if it isn't one of application/n-triples, application/ld+json or
+    application/rdf+xml, with the given {prefix: namespace}, or NAMESPACES, for Turtle and RDF/XML. JSON-LD is
+    compacted against the {prefix: namespace} context if one is given, and expanded otherwise."""
+    namespaces = NAMESPACES if namespaces is None else namespaces
+    if mediatype == "application/n-triples":
+        return write_ntriples(triples)
+    if mediatype == "application/ld+json":
+        return write_jsonld(triples) if context is None else write_compact_jsonld(triples, context)
+    if mediatype == "application/rdf+xml":
+        return write_rdfxml(triples, namespaces)
+    return write_turtle(triples, namespaces)
+
+
+def serialise(
+    triples: Iterable[Triple],
+    mediatype: str,
+    namespaces: Optional[Dict[str, str]] = None,
+    context: Optional[Dict[str, str]] = None,
+) -> bytes:
+    """Write triples in an RDF mediatype, see write_rdf(), all at once."""
+    return b"".join(write_rdf(triples, mediatype, namespaces, context))
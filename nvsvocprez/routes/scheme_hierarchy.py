@@ -0,0 +1,248 @@
+"""Index, cache and render the membership and concept hierarchies of Concept Schemes.
+
+Which concepts are in a scheme, and how they are related by skos:broader/skos:narrower, is worked out once per
+scheme version into an in-process index. The HTML concept tree, the dd JSON and the RDF profiles all read it, so
+requests only need the triplestore for the literals of the scheme and its concepts.
+"""
+
+from typing import Dict, List, Optional
+
+from .page_configs import DATA_URI
+from .utils import sparql_query
+
+# a concept is in a scheme if it says it is in or is a top concept of it, or the scheme says it has it as top concept
+MEMBER_PATH = "skos:inScheme|skos:topConceptOf|^skos:hasTopConcept"
+
+# {scheme_uri: (scheme_date, index)}
+_index_cache = {}
+# {(scheme_uri, acc_dep): (scheme_date, hierarchy)}
+_hierarchy_cache = {}
+
+
+def _cached(cache: Dict, key, scheme_date: Optional[str]):
+    cached = cache.get(key)
+    if cached is not None and scheme_date is not None and cached[0] == scheme_date:
+        return cached[1]
+    return None
+
+
+def make_scheme_index(member_rows: List[Dict], broader_rows: List[Dict]) -> Dict:
+    """Index SPARQL result rows of ?c ?pl ?deprecated ?top and of ?c ?broader as the membership and hierarchy of a
+    scheme.
+
+    Returns (Dict): {
+        "members": {concept: {"labels": [prefLabel], "deprecated": "true"|"false"|None, "top": bool}},
+        "broader": {concept: [concepts]},
+    }, with English prefLabels listed before untagged ones and broader concepts sorted by URI.
+    """
+    members = {}
+    labels = {}
+    for row in member_rows:
+        concept = row["c"]["value"]
+        member = members.setdefault(concept, {"labels": [], "deprecated": None, "top": False})
+        if row.get("pl") is not None:
+            labels.setdefault(concept, {})[row["pl"]["value"]] = row["pl"].get("xml:lang") == "en"
+        if row.get("deprecated") is not None:
+            member["deprecated"] = row["deprecated"]["value"]
+        if row.get("top") is not None:
+            member["top"] = True
+    for concept, concept_labels in labels.items():
+        members[concept]["labels"] = sorted(concept_labels, key=lambda label: (not concept_labels[label], label))
+
+    broader = {}
+    for row in broader_rows:
+        concept, parent = row["c"]["value"], row["broader"]["value"]
+        if concept in members and parent in members:
+            broader.setdefault(concept, set()).add(parent)
+    broader = {concept: sorted(parents) for concept, parents in broader.items()}
+
+    return {"members": members, "broader": broader}
+
+
+def get_scheme_index(scheme_uri: str, scheme_date: Optional[str]) -> Optional[Dict]:
+    """Get the membership and hierarchy index of a Concept Scheme, cached until the scheme's dcterms:date changes.
+
+    Returns (Dict): The index, see make_scheme_index(), or None if there was an error querying the triplestore.
+    """
+    index = _cached(_index_cache, scheme_uri, scheme_date)
+    if index is not None:
+        return index
+
+    members_q = """
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        SELECT DISTINCT ?c ?pl ?deprecated ?top
+        WHERE {
+          ?c member_path <xxx> .
+          OPTIONAL {
+            ?c skos:prefLabel ?pl .
+            FILTER(lang(?pl) = "en" || lang(?pl) = "")
+          }
+          OPTIONAL { ?c owl:deprecated ?deprecated . }
+          OPTIONAL {
+            ?c skos:topConceptOf|^skos:hasTopConcept <xxx> .
+            BIND (true AS ?top)
+          }
+        }
+        """.replace("xxx", scheme_uri).replace("member_path", MEMBER_PATH)
+    broader_q = """
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        SELECT DISTINCT ?c ?broader
+        WHERE {
+          ?c member_path <xxx> ;
+             skos:broader|^skos:narrower ?broader .
+          ?broader member_path <xxx> .
+        }
+        """.replace("xxx", scheme_uri).replace("member_path", MEMBER_PATH)
+    member_rows = sparql_query(members_q)
+    if not member_rows[0]:
+        return None
+    broader_rows = sparql_query(broader_q)
+    if not broader_rows[0]:
+        return None
+
+    index = make_scheme_index(member_rows[1], broader_rows[1])
+    _index_cache[scheme_uri] = (scheme_date, index)
+    return index
+
+
+def accepts(member: Dict, acc_dep: Optional[str]) -> bool:
+    """Whether an indexed concept is included for the given accepted/deprecated status, see acc_dep_map."""
+    if acc_dep == "accepted":
+        return member["deprecated"] == "false"
+    if acc_dep == "deprecated":
+        return member["deprecated"] == "true"
+    return True
+
+
+def make_hierarchy(index: Dict, acc_dep: Optional[str] = None) -> Dict:
+    """Make the concept tree of a scheme from its index, for the concepts with a prefLabel and the given status.
+
+    The tree is walked depth first with an explicit stack, so deep hierarchies don't hit the recursion limit.
+    A concept with several broader concepts is listed under each of them. Links that would nest a concept within
+    itself are dropped, so the tree is acyclic, and concepts only reachable through a cycle are made top concepts.
+
+    Returns (Dict): {"labels": {concept: prefLabel}, "narrower": {concept: [concepts]}, "top": [concepts]}, with
+    concepts sorted by URI.
+    """
+    labels = {
+        concept: member["labels"][0]
+        for concept, member in index["members"].items()
+        if member["labels"] and accepts(member, acc_dep)
+    }
+    narrower = {}
+    top = []
+    for concept in sorted(labels):
+        # a broader concept that isn't itself listed, e.g. filtered out as deprecated, can't be shown
+        parents = [parent for parent in index["broader"].get(concept, ()) if parent in labels]
+        for parent in parents:
+            narrower.setdefault(parent, []).append(concept)
+        if not parents:
+            top.append(concept)
+
+    acyclic = {}
+    visited = set()
+    on_path = set()
+
+    def walk(root):
+        visited.add(root)
+        on_path.add(root)
+        stack = [(root, iter(narrower.get(root, ())))]
+        while stack:
+            concept, pending = stack[-1]
+            child = next(pending, None)
+            if child is None:
+                stack.pop()
+                on_path.discard(concept)
+            elif child not in on_path:
+                acyclic.setdefault(concept, []).append(child)
+                if child not in visited:
+                    visited.add(child)
+                    on_path.add(child)
+                    stack.append((child, iter(narrower.get(child, ()))))
+
+    for concept in top:
+        walk(concept)
+    for concept in sorted(labels):
+        if concept not in visited:
+            top.append(concept)
+            walk(concept)
+
+    return {"labels": labels, "narrower": acyclic, "top": top}
+
+
+def get_hierarchy(scheme_uri: str, acc_dep: Optional[str], scheme_date: Optional[str]) -> Optional[Dict]:
+    """Get the concept tree of a Concept Scheme, cached until the scheme's dcterms:date changes.
+
+    Returns (Dict): The tree, see make_hierarchy(), or None if there was an error querying the triplestore.
+    """
+    key = (scheme_uri, acc_dep)
+    hierarchy = _cached(_hierarchy_cache, key, scheme_date)
+    if hierarchy is not None:
+        return hierarchy
+
+    index = get_scheme_index(scheme_uri, scheme_date)
+    if index is None:
+        return None
+
+    hierarchy = make_hierarchy(index, acc_dep)
+    _hierarchy_cache[key] = (scheme_date, hierarchy)
+    return hierarchy
+
+
+def make_concept_hierarchy_html(hierarchy: Dict, children_url: str) -> str:
+    """Render the top concepts of a hierarchy as the root of the concept tree on the scheme page.
+
+    Only the top level is rendered. Each concept with narrower concepts gets an empty nested list that the page
+    fills from children_url, see get_narrower(), when it is expanded.
+    """
+    parts = [f'<ul class="concept-hierarchy" data-children="{children_url}">']
+    for concept in hierarchy["top"]:
+        href = concept.replace(DATA_URI, "")
+        label = hierarchy["labels"][concept].replace("<", "&lt;")
+        if hierarchy["narrower"].get(concept):
+            parts.append(
+                f'<li><span class="caret" data-concept="{concept}"><a href="{href}">{label}</a></span>'
+                '<ul class="nested"></ul></li>'
+            )
+        else:
+            parts.append(f'<li><a href="{href}">{label}</a></li>')
+    parts.append("</ul>")
+    return "".join(parts)
+
+
+def get_narrower(hierarchy: Dict, concept: Optional[str] = None, depth: int = 1) -> List[Dict]:
+    """List the concepts below a concept of a hierarchy, or below the scheme if no concept is given.
+
+    Args:
+        hierarchy (Dict): A hierarchy from get_hierarchy().
+        concept (str): The URI of the concept whose narrower concepts to list.
+        depth (int): The number of levels to list, 0 or less for all.
+
+    Returns (List[Dict]): A {uri, systemUri, prefLabel, broader, narrowerCount} record for each concept, broader
+    being the concept it is listed below. Narrower concepts of a concept reached more than once are listed once.
+    """
+    concepts = []
+    expanded = set()
+    level = [concept]
+    levels = 0
+    while level and (depth <= 0 or levels < depth):
+        next_level = []
+        for parent in level:
+            if parent in expanded:
+                continue
+            expanded.add(parent)
+            for child in hierarchy["top"] if parent is None else hierarchy["narrower"].get(parent, ()):
+                concepts.append(
+                    {
+                        "uri": child,
+                        "systemUri": child.replace(DATA_URI, ""),
+                        "prefLabel": hierarchy["labels"][child],
+                        "broader": parent,
+                        "narrowerCount": len(hierarchy["narrower"].get(child, ())),
+                    }
+                )
+                next_level.append(child)
+        level = next_level
+        levels += 1
+    return concepts
@@ -2,26 +2,38 @@
 
 import json
 from pathlib import Path
-from typing import AnyStr, Literal, Optional
+from typing import AnyStr, Dict, Iterator, Literal, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException
-from pyldapi import ContainerRenderer, Renderer
+from pyldapi import CONTAINER_PROFILES, ContainerRenderer, ProfileRegistry, Renderer
 from pyldapi.renderer import RDF_MEDIATYPES
-from rdflib import Graph
 from rdflib import Literal as RdfLiteral
 from rdflib import URIRef
-from rdflib.namespace import RDF, RDFS
+from rdflib.namespace import DCTERMS, RDF, RDFS, SKOS
 from starlette.requests import Request
-from starlette.responses import PlainTextResponse, Response, RedirectResponse, JSONResponse
+from starlette.responses import PlainTextResponse, Response, RedirectResponse, JSONResponse, StreamingResponse
 from starlette.templating import Jinja2Templates
 
-from .page_configs import DATA_URI, SYSTEM_URI, acc_dep_map
+from .page_configs import DATA_URI, SYSTEM_URI
 from .profiles import dd, nvs, skos, vocpub
+from .rdf_writer import serialise, write_rdf
+from .scheme_hierarchy import (
+    MEMBER_PATH,
+    accepts,
+    get_hierarchy,
+    get_narrower,
+    get_scheme_index,
+    make_concept_hierarchy_html,
+)
 from .utils import (
+    binding_to_term,
     cache_return,
+    construct_rdf,
+    date_time_literal,
+    english_literals,
     exists_triple,
+    get_container_members,
     get_user_status,
-    sparql_construct,
     sparql_query,
 )
 
@@ -33,6 +45,41 @@ config_file_location = Path(__file__).parent.parent / "api_doc_config.json"
 with open(config_file_location, "r") as config_file:
     paths = json.load(config_file)["paths"]
 
+CONCEPTSCHEMES_PROFILES = ProfileRegistry({**CONTAINER_PROFILES, "nvs": nvs})
+SCHEME_PROFILES = ProfileRegistry({"nvs": nvs, "skos": skos, "vocpub": vocpub, "dd": dd})
+
+
+# registered ahead of the {acc_dep} routes, whose paths would also match this one
+@router.get("/scheme/{scheme_id}/current/children/", include_in_schema=False)
+@router.head("/scheme/{scheme_id}/current/children/", include_in_schema=False)
+def scheme_children(
+    request: Request,
+    scheme_id,
+    concept: Optional[str] = None,
+    acc_dep: Literal["accepted", "deprecated", "all", None] = None,
+    depth: int = 1,
+):
+    """The concepts below a concept of a scheme, or the scheme's top concepts, for the lazily loaded concept tree
+    on the scheme page. depth is the number of levels to return, 0 for all."""
+    scheme = next(
+        (s for s in cache_return(collections_or_conceptschemes="conceptschemes") if s["id"]["value"] == scheme_id),
+        None,
+    )
+    if scheme is None:
+        raise HTTPException(status_code=404)
+
+    date = scheme["date"]["value"] if scheme.get("date") else None
+    hierarchy = get_hierarchy(f"{DATA_URI}/scheme/{scheme_id}/current/", acc_dep, date)
+    if hierarchy is None:
+        return PlainTextResponse(
+            "There was an error obtaining the Concept hierarchy from the Triplestore",
+            status_code=500,
+        )
+    if concept is not None and concept not in hierarchy["labels"]:
+        raise HTTPException(status_code=404)
+
+    return JSONResponse(get_narrower(hierarchy, concept, depth))
+
 
 @router.get("/scheme/{scheme_id}/current/{acc_dep}", include_in_schema=False)
 @router.head("/scheme/{scheme_id}/current/{acc_dep}", include_in_schema=False)
@@ -40,181 +87,157 @@ def scheme_concept_noslash(request: Request, scheme_id, acc_dep):
     return RedirectResponse(url=f"/scheme/{scheme_id}/current/{acc_dep}/")
 
 
-@router.get("/scheme/", **paths["/scheme/"]["get"])
-@router.head("/scheme/", include_in_schema=False)
-def conceptschemes(request: Request):
-    class ConceptSchemeRenderer(ContainerRenderer):
-        def __init__(self):
-            self.instance_uri = SYSTEM_URI
-            self.label = "NVS Thesauri"
-            self.comment = (
-                "SKOS concept schemes managed by the NERC Vocabulary Server. A concept scheme can be "
-                "viewed as an aggregation of one or more SKOS concepts. Semantic relationships (links) "
-                "between those concepts may also be viewed as part of a concept scheme. A concept scheme "
-                "is therefore useful for containing the concepts registered in multiple concept "
-                "collections that relate to each other as a single semantic unit, such as a thesaurus."
+class ConceptSchemeRenderer(ContainerRenderer):
+    def __init__(self, request):
+        self.instance_uri = SYSTEM_URI
+        self.label = "NVS Thesauri"
+        self.comment = (
+            "SKOS concept schemes managed by the NERC Vocabulary Server. A concept scheme can be "
+            "viewed as an aggregation of one or more SKOS concepts. Semantic relationships (links) "
+            "between those concepts may also be viewed as part of a concept scheme. A concept scheme "
+            "is therefore useful for containing the concepts registered in multiple concept "
+            "collections that relate to each other as a single semantic unit, such as a thesaurus."
+        )
+        super().__init__(request, self.instance_uri, CONCEPTSCHEMES_PROFILES, "nvs")
+
+    def _render_sparql_response_rdf(self, sparql_response):
+        if sparql_response[0]:
+            return Response(
+                sparql_response[1],
+                headers={"Content-Type": self.mediatype},
             )
-            super().__init__(
-                request,
-                self.instance_uri,
-                {"nvs": nvs},
-                "nvs",
+        else:
+            return PlainTextResponse(
+                "There was an error obtaining the Concept RDF from the Triplestore",
+                status_code=500,
             )
 
-        def _render_sparql_response_rdf(self, sparql_response):
-            if sparql_response[0]:
-                return Response(
-                    (
-                        '<?xml version="1.0" encoding="UTF-8"?>\n'.encode() + sparql_response[1]
-                        if "xml" in self.mediatype
-                        else sparql_response[1]
-                    ),
-                    headers={"Content-Type": self.mediatype},
-                )
-            else:
-                return PlainTextResponse(
-                    "There was an error obtaining the Concept RDF from the Triplestore",
-                    status_code=500,
-                )
+    def render(self):
+        if self.profile == "nvs":
+            if self.mediatype == "text/html":
+                conceptschemes = cache_return(collections_or_conceptschemes="conceptschemes")
 
-        def render(self):
-            if self.profile == "nvs":
-                if self.mediatype == "text/html":
-                    conceptschemes = cache_return(collections_or_conceptschemes="conceptschemes")
+                if self.request.query_params.get("filter"):
 
-                    if request.query_params.get("filter"):
+                    def concat_vocab_fields(vocab):
+                        return (
+                            f"{vocab['id']['value']}"
+                            f"{vocab['prefLabel']['value']}"
+                            f"{vocab['description']['value']}"
+                        )
 
-                        def concat_vocab_fields(vocab):
-                            return (
-                                f"{vocab['id']['value']}"
-                                f"{vocab['prefLabel']['value']}"
-                                f"{vocab['description']['value']}"
-                            )
+                    conceptschemes = [
+                        x for x in conceptschemes if self.request.query_params.get("filter") in concat_vocab_fields(x)
+                    ]
 
-                        conceptschemes = [
-                            x for x in conceptschemes if request.query_params.get("filter") in concat_vocab_fields(x)
-                        ]
+                return templates.TemplateResponse(
+                    "conceptschemes.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "label": self.label,
+                        "comment": self.comment,
+                        "conceptschemes": conceptschemes,
+                        "profile_token": "nvs",
+                        "logged_in_user": get_user_status(self.request),
+                    },
+                )
+            elif self.mediatype in RDF_MEDIATYPES:
+                q = """
+                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+                    PREFIX dc: <http://purl.org/dc/terms/>
+                    PREFIX owl: <http://www.w3.org/2002/07/owl#>
+                    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
+                    
+                    CONSTRUCT {
+                        ?cs a skos:ConceptScheme ;
+                            dc:alternative ?alt ;
+                            dc:creator ?creator ;
+                            dc:date ?modified ;
+                            dc:publisher ?publisher ;
+                            dc:title ?title ;
+                            owl:versionInfo ?version ;
+                            skos:hasTopConcept ?tc ;
+                            skos:altLabel ?al ;
+                            dc:description ?description ;
+                            skos:prefLabel ?pl .
+                    }
+                    WHERE {
+                        ?cs a skos:ConceptScheme ;
+                            dc:alternative ?alt ;
+                            dc:creator ?creator ;
+                            dc:date ?m ;
+                            dc:publisher ?publisher ;
+                            dc:title ?title ;
+                            owl:versionInfo ?version ;
+                        .
+                        BIND (STRDT(REPLACE(STRBEFORE(?m, "."), " ", "T"), xsd:dateTime) AS ?modified)
 
-                    return templates.TemplateResponse(
-                        "conceptschemes.html",
+                        OPTIONAL {?cs skos:hasTopConcept ?tc .}
+                        OPTIONAL { ?cs skos:altLabel ?al . }
                         {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "label": self.label,
-                            "comment": self.comment,
-                            "conceptschemes": conceptschemes,
-                            "profile_token": "nvs",
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                elif self.mediatype in RDF_MEDIATYPES:
-                    q = """
-                        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                        PREFIX dc: <http://purl.org/dc/terms/>
-                        PREFIX owl: <http://www.w3.org/2002/07/owl#>
-                        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-                        
-                        CONSTRUCT {
-                            ?cs a skos:ConceptScheme ;
-                                dc:alternative ?alt ;
-                                dc:creator ?creator ;
-                                dc:date ?modified ;
-                                dc:publisher ?publisher ;
-                                dc:title ?title ;
-                                owl:versionInfo ?version ;
-                                skos:hasTopConcept ?tc ;
-                                skos:altLabel ?al ;
-                                dc:description ?description ;
-                                skos:prefLabel ?pl .
-                        }
-                        WHERE {
-                            ?cs a skos:ConceptScheme ;
-                                dc:alternative ?alt ;
-                                dc:creator ?creator ;
-                                dc:date ?m ;
-                                dc:publisher ?publisher ;
-                                dc:title ?title ;
-                                owl:versionInfo ?version ;
-                            .
-                            BIND (STRDT(REPLACE(STRBEFORE(?m, "."), " ", "T"), xsd:dateTime) AS ?modified)
-
-                            OPTIONAL {?cs skos:hasTopConcept ?tc .}
-                            OPTIONAL { ?cs skos:altLabel ?al . }
-                            {
-                                ?cs dc:description ?description .
-                                FILTER(lang(?description) = "en" || lang(?description) = "")
-                            }
-                            {
-                                ?cs skos:prefLabel ?pl .
-                                FILTER(lang(?title) = "en" || lang(?pl) = "")
-                            }
+                            ?cs dc:description ?description .
+                            FILTER(lang(?description) = "en" || lang(?description) = "")
                         }
-                        """
-                    return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile == "mem":
-                collections = []
-                for c in cache_return(collections_or_conceptschemes="conceptschemes"):
-                    collections.append(
                         {
-                            "uri": c["uri"]["value"],
-                            "systemUri": c["systemUri"]["value"],
-                            "label": c["prefLabel"]["value"],
+                            ?cs skos:prefLabel ?pl .
+                            FILTER(lang(?title) = "en" || lang(?pl) = "")
                         }
-                    )
+                    }
+                    """
+                return self._render_sparql_response_rdf(construct_rdf(q, self.mediatype))
+        elif self.profile == "mem":
+            container = get_container_members("conceptschemes", self.instance_uri, self.label)
+
+            if self.mediatype == "text/html":
+                return templates.TemplateResponse(
+                    "container_mem.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "label": self.label,
+                        "collections": container["members"],
+                        "profile_token": "nvs",
+                        "logged_in_user": get_user_status(self.request),
+                    },
+                )
+            else:  # JSON and all other available mediatypes, which are RDF
+                return Response(container["serialisations"][self.mediatype], media_type=self.mediatype)
+        elif self.profile == "contanno":
+            if self.mediatype == "text/html":
+                return templates.TemplateResponse(
+                    "container_contanno.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "label": self.label,
+                        "comment": self.comment,
+                        "profile_token": "nvs",
+                        "logged_in_user": get_user_status(self.request),
+                    },
+                )
+            else:  # all other available mediatypes are RDF
+                container = URIRef(self.instance_uri)
+                c = (
+                    "This object is a container that contains a number of members. See other profiles of this "
+                    "object to see those members."
+                )
+                c += self.comment
+                triples = [
+                    (container, RDF.type, RDF.Bag),
+                    (container, RDFS.label, RdfLiteral(self.label)),
+                    (container, RDFS.comment, RdfLiteral(c)),
+                ]
+                return Response(serialise(triples, self.mediatype), media_type=self.mediatype)
+        alt = super().render()
+        if alt is not None:
+            return alt
 
-                if self.mediatype == "text/html":
-                    return templates.TemplateResponse(
-                        "container_mem.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "label": self.label,
-                            "collections": collections,
-                            "profile_token": "nvs",
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                elif self.mediatype == "application/json":
-                    return [{"uri": c["uri"], "label": c["prefLabel"]} for c in collections]
-                else:  # all other available mediatypes are RDF
-                    g = Graph()
-                    container = URIRef(self.instance_uri)
-                    g.add((container, RDF.type, RDF.Bag))
-                    g.add((container, RDFS.label, RdfLiteral(self.label)))
-                    for c in collections:
-                        g.add((container, RDFS.member, URIRef(c["uri"])))
-                        g.add((URIRef(c["uri"]), RDFS.label, RdfLiteral(c["label"])))
-                    return Response(g.serialize(format=self.mediatype), media_type=self.mediatype)
-            elif self.profile == "contanno":
-                if self.mediatype == "text/html":
-                    return templates.TemplateResponse(
-                        "container_contanno.html",
-                        {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "label": self.label,
-                            "comment": self.comment,
-                            "profile_token": "nvs",
-                            "logged_in_user": get_user_status(request),
-                        },
-                    )
-                else:  # all other available mediatypes are RDF
-                    g = Graph()
-                    container = URIRef(self.instance_uri)
-                    g.add((container, RDF.type, RDF.Bag))
-                    g.add((container, RDFS.label, RdfLiteral(self.label)))
-                    c = (
-                        "This object is a container that contains a number of members. See other profiles of this "
-                        "object to see those members."
-                    )
-                    c += self.comment
-                    g.add((container, RDFS.comment, RdfLiteral(c)))
-                    return Response(g.serialize(format=self.mediatype), media_type=self.mediatype)
-            alt = super().render()
-            if alt is not None:
-                return alt
 
-    return ConceptSchemeRenderer().render()
+@router.get("/scheme/", **paths["/scheme/"]["get"])
+@router.head("/scheme/", include_in_schema=False)
+def conceptschemes(request: Request):
+    return ConceptSchemeRenderer(request).render()
 
 
 # NOTE: May not be needed, but included here for clarity
@@ -233,396 +256,240 @@ def scheme_no_current(request: Request, scheme_id):
     return RedirectResponse(url=f"/scheme/{scheme_id}/current/")
 
 
-@router.get("/scheme/{scheme_id}/current/", **paths["/scheme/{scheme_id}/current/"]["get"])
-@router.get("/scheme/{scheme_id}/current/{acc_dep}/", include_in_schema=False)
-@router.head("/scheme/{scheme_id}/current/", include_in_schema=False)
-@router.head("/scheme/{scheme_id}/current/{acc_dep}/", include_in_schema=False)
-def scheme(
-    request: Request,
-    scheme_id,
-    acc_dep: Literal["accepted", "deprecated", "all", None] = None,
-):
-    if not exists_triple(request.url.path):
-        raise HTTPException(status_code=404)
-
-    class SchemeRenderer(Renderer):
-        def __init__(self):
-            self.instance_uri = f"{DATA_URI}/scheme/{scheme_id}/current/"
-
-            super().__init__(
-                request,
-                self.instance_uri,
-                {"nvs": nvs, "skos": skos, "vocpub": vocpub, "dd": dd},
-                "nvs",
+# the skos and vocpub profiles have always published concept definitions with this misspelt predicate
+SKOS_DEFINTION = URIRef("http://www.w3.org/2004/02/skos/core#defintion")
+
+
+def _get_scheme_literals(scheme_uri: str) -> Optional[Tuple[Dict, Dict]]:
+    """Get the properties of a scheme and the prefLabels, definitions and dates of its concepts.
+
+    Returns (Tuple[Dict, Dict]): ({predicate: [objects]}, {concept: {predicate: [objects]}}), or None if there was an
+    error querying the triplestore.
+    """
+    q = """
+        PREFIX dcterms: <http://purl.org/dc/terms/>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        SELECT ?c ?p ?o
+        WHERE {
+          {
+            <xxx> ?p ?o .
+            BIND (<xxx> AS ?c)
+          }
+          UNION
+          {
+            ?c member_path <xxx> ;
+               ?p ?o .
+            VALUES ?p { skos:prefLabel skos:definition dcterms:date }
+          }
+        }
+        """.replace("xxx", scheme_uri).replace("member_path", MEMBER_PATH)
+    r = sparql_query(q)
+    if not r[0]:
+        return None
+
+    scheme_literals = {}
+    concept_literals = {}
+    for row in r[1]:
+        concept = row["c"]["value"]
+        properties = scheme_literals if concept == scheme_uri else concept_literals.setdefault(concept, {})
+        properties.setdefault(URIRef(row["p"]["value"]), []).append(binding_to_term(row["o"]))
+    return scheme_literals, concept_literals
+
+
+def _scheme_triples(
+    profile_token: str, scheme_uri: str, index: Dict, literals: Tuple[Dict, Dict], acc_dep: Optional[str]
+) -> Iterator[Tuple]:
+    """Make the triples of a scheme for the nvs, skos or vocpub profile from its index and literals.
+
+    Only the concepts with the literals their profile requires are included and, for skos and vocpub, nothing is if
+    the scheme lacks those it requires.
+    """
+    scheme_literals, concept_literals = literals
+    scheme = URIRef(scheme_uri)
+
+    def broader(c, concept):
+        for parent in index["broader"].get(concept, ()):
+            yield c, SKOS.broader, URIRef(parent)
+            yield URIRef(parent), SKOS.narrower, c
+
+    if profile_token == "nvs":
+        for p, objects in scheme_literals.items():
+            for o in objects:
+                yield scheme, p, o
+
+        for concept, member in index["members"].items():
+            properties = concept_literals.get(concept, {})
+            labels = english_literals(properties.get(SKOS.prefLabel, []))
+            definitions = properties.get(SKOS.definition, [])
+            dates = properties.get(DCTERMS.date, [])
+            if not (accepts(member, acc_dep) and labels and definitions and dates):
+                continue
+            c = URIRef(concept)
+            yield c, SKOS.inScheme, scheme
+            yield c, RDF.type, SKOS.Concept
+            for label in labels:
+                yield c, SKOS.prefLabel, label
+            for definition in definitions:
+                yield c, SKOS.definition, definition
+            for date in dates:
+                yield c, DCTERMS.date, date_time_literal(date)
+            yield from broader(c, concept)
+        return
+
+    labels = english_literals(scheme_literals.get(SKOS.prefLabel, []))
+    descriptions = english_literals(scheme_literals.get(DCTERMS.description, []))
+    top_concepts = [URIRef(concept) for concept, member in index["members"].items() if member["top"]]
+    publishers = scheme_literals.get(DCTERMS.publisher, [])
+    dates = scheme_literals.get(DCTERMS.date, [])
+    if not (labels and descriptions and top_concepts) or (profile_token == "vocpub" and not (publishers and dates)):
+        return
+
+    yield scheme, RDF.type, SKOS.ConceptScheme
+    for label in labels:
+        yield scheme, SKOS.prefLabel, label
+    for description in descriptions:
+        yield scheme, SKOS_DEFINTION, description
+    for top_concept in top_concepts:
+        yield scheme, SKOS.hasTopConcept, top_concept
+        yield top_concept, SKOS.topConceptOf, scheme
+    if profile_token == "vocpub":
+        for publisher in publishers:
+            yield scheme, DCTERMS.publisher, publisher
+        for date in dates:
+            yield scheme, DCTERMS.modified, date_time_literal(date)
+        yield scheme, DCTERMS.provenance, RdfLiteral("Made by NERC and maintained within the NERC Vocabulary Server")
+
+    for concept in index["members"]:
+        properties = concept_literals.get(concept, {})
+        labels = english_literals(properties.get(SKOS.prefLabel, []))
+        definitions = english_literals(properties.get(SKOS.definition, []))
+        if not (labels and definitions):
+            continue
+        c = URIRef(concept)
+        yield c, RDF.type, SKOS.Concept
+        yield c, SKOS.inScheme, scheme
+        for label in labels:
+            yield c, SKOS.prefLabel, label
+        for definition in definitions:
+            yield c, SKOS_DEFINTION, definition
+        yield from broader(c, concept)
+
+
+class SchemeRenderer(Renderer):
+    def __init__(self, request, scheme_id, acc_dep):
+        self.scheme_id = scheme_id
+        self.acc_dep = acc_dep
+        self.instance_uri = f"{DATA_URI}/scheme/{scheme_id}/current/"
+
+        super().__init__(request, self.instance_uri, SCHEME_PROFILES, "nvs")
+
+    def _render_sparql_response_rdf(self, sparql_response):
+        if sparql_response[0]:
+            return Response(
+                sparql_response[1],
+                headers={"Content-Type": self.mediatype},
+            )
+        else:
+            return PlainTextResponse(
+                "There was an error obtaining the Concept RDF from the Triplestore",
+                status_code=500,
             )
 
-        def _render_sparql_response_rdf(self, sparql_response):
-            if sparql_response[0]:
-                return Response(
-                    (
-                        '<?xml version="1.0" encoding="UTF-8"?>\n'.encode() + sparql_response[1]
-                        if "xml" in self.mediatype
-                        else sparql_response[1]
-                    ),
-                    headers={"Content-Type": self.mediatype},
-                )
-            else:
-                return PlainTextResponse(
-                    "There was an error obtaining the Concept RDF from the Triplestore",
-                    status_code=500,
-                )
-
-        def _get_scheme(self):
-            for scheme in cache_return(collections_or_conceptschemes="conceptschemes"):
-                if scheme["id"]["value"] == scheme_id:
-                    return scheme
-
-        def _get_concept_hierarchy(self):
-            def make_hierarchical_dicts(data):
-                children_parents = []
-                labels = {}
-
-                for d in data:
-                    child = d["c"]["value"]
-                    parent = d["broader"]["value"] if d.get("broader") is not None else None
-                    children_parents.append((child, parent))
-                    labels[child] = d["pl"]["value"].replace("<", "&lt;")
-
-                children_parents.sort(key=lambda x: x[0])
-                has_parent = set()
-                all_items = {}
-                for child, parent in children_parents:
-                    if parent not in all_items:
-                        all_items[parent] = {}
-                    if child not in all_items:
-                        all_items[child] = {}
-                    all_items[parent][child] = all_items[child]
-                    has_parent.add(child)
-
-                hierarchy = {}
-                for key, value in all_items.items():
-                    if key not in has_parent:
-                        hierarchy[key] = value
-                return hierarchy, labels
-
-            def make_nested_ul(hierarchy, labels):
-                html = ""
-                for k, v in hierarchy.items():
-                    if v:
-                        html += (
-                            f'<li><span class="caret"><a href="{k.replace(DATA_URI, "")}">{labels[k]}</a></span>'
-                            if k is not None
-                            else "None"
-                        )
-                        html += '<ul class="nested">'
-                        html += make_nested_ul(v, labels)
-                        html += "</ul>"
-                    else:
-                        html += f'<li><a href="{k.replace(DATA_URI, "")}">{labels[k]}</a>' if k is not None else "None"
-                    html += "</li>"
-                return html
-
-            q = """
-                PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                SELECT DISTINCT ?c ?pl ?broader
-                WHERE {
-                  { 
-                    ?c skos:inScheme <xxx>  .
-                  }
-                  UNION
-                  { ?c skos:topConceptOf <xxx>  . }
-                  UNION
-                  { <xxx>  skos:hasTopConcept ?c . }
-                
-                  ?c skos:prefLabel ?pl .
-                  BIND (STRAFTER(STR(?c), ".uk") AS ?systemUri)
-                  
-                  acc_dep
-                  OPTIONAL { 
-                    ?c skos:broader ?broader .
-                    { ?broader skos:inScheme <xxx>  . }
-                    UNION
-                    { ?broader skos:topConceptOf <xxx>  . }
-                    UNION
-                    { <xxx>  skos:hasTopConcept ?broader . }
-                  }
-                  FILTER(lang(?pl) = "en" || lang(?pl) = "")                                    
-                }
-                ORDER BY ?pl
-                """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(acc_dep))
-            try:
-                r = sparql_query(q)
-
-                if not r[0]:
-                    return None
-                else:
-                    hier = make_hierarchical_dicts(r[1])
-                    hier[1][None] = None
-                    return '<ul class="concept-hierarchy">' + make_nested_ul(hier[0], hier[1])[23:-5]
-            except RecursionError as e:
-                # make a flat list of concepts
-                q = """
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    SELECT DISTINCT ?c ?pl
-                    WHERE {{
-                        ?c skos:inScheme <{vocab_uri}> .              
-                        ?c skos:prefLabel ?pl .
-                        FILTER(lang(?pl) = "en" || lang(?pl) = "") 
-                    }}
-                    ORDER BY ?pl
-                    """.format(vocab_uri=self.instance_uri)
-
-                concepts = [(concept["systemUri"]["value"], concept["pl"]["value"]) for concept in sparql_query(q)]
-
-                concepts_html = "<br />".join(['<a href="{}">{}</a>'.format(c[0], c[1]) for c in concepts])
-                return """<p><strong><em>This concept hierarchy cannot be displayed</em></strong><p>
-                            <p>The flat list of all this Scheme's Concepts is:</p>
-                            <p>{}</p>
-                        """.format(concepts_html)
-
-        def render(self):
-            if self.profile == "nvs":
-                if self.mediatype == "text/html":
-                    scheme = self._get_scheme()
-                    scheme["concept_hierarchy"] = self._get_concept_hierarchy()
-
-                    if not scheme["concept_hierarchy"]:
-                        return templates.TemplateResponse(
-                            "error.html",
-                            {
-                                "request": request,
-                                "title": "DB Error",
-                                "status": "500",
-                                "message": "There was an error with accessing the Triplestore",
-                            },
-                        )
-
+    def _get_scheme(self):
+        for scheme in cache_return(collections_or_conceptschemes="conceptschemes"):
+            if scheme["id"]["value"] == self.scheme_id:
+                return scheme
+
+    def _get_scheme_date(self):
+        # the full dcterms:date, not the day of "modified", so an edit made the same day gets a new version
+        scheme = self._get_scheme()
+        return scheme["date"]["value"] if scheme is not None and scheme.get("date") else None
+
+    def _render_scheme_rdf(self):
+        index = get_scheme_index(self.instance_uri, self._get_scheme_date())
+        literals = _get_scheme_literals(self.instance_uri) if index is not None else None
+        if literals is None:
+            return PlainTextResponse(
+                "There was an error obtaining the Concept RDF from the Triplestore",
+                status_code=500,
+            )
+        triples = _scheme_triples(self.profile, self.instance_uri, index, literals, self.acc_dep)
+        return StreamingResponse(write_rdf(triples, self.mediatype), media_type=self.mediatype)
+
+    def _get_concept_hierarchy(self):
+        hierarchy = get_hierarchy(self.instance_uri, self.acc_dep, self._get_scheme_date())
+        if hierarchy is None:
+            return None
+        children_url = f"/scheme/{self.scheme_id}/current/children/" + (
+            f"?acc_dep={self.acc_dep}" if self.acc_dep else ""
+        )
+        return make_concept_hierarchy_html(hierarchy, children_url)
+
+    def render(self):
+        if self.profile == "nvs":
+            if self.mediatype == "text/html":
+                scheme = self._get_scheme()
+                scheme["concept_hierarchy"] = self._get_concept_hierarchy()
+
+                if not scheme["concept_hierarchy"]:
                     return templates.TemplateResponse(
-                        "scheme.html",
+                        "error.html",
                         {
-                            "request": request,
-                            "uri": self.instance_uri,
-                            "scheme": scheme,
-                            "profile_token": "nvs",
-                            "logged_in_user": get_user_status(request),
+                            "request": self.request,
+                            "title": "DB Error",
+                            "status": "500",
+                            "message": "There was an error with accessing the Triplestore",
                         },
                     )
-                elif self.mediatype in RDF_MEDIATYPES:
-                    q = """
-                        PREFIX dcterms: <http://purl.org/dc/terms/>
-                        PREFIX owl: <http://www.w3.org/2002/07/owl#>
-                        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                        PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-                        
-                        CONSTRUCT {
-                            <xxx> ?p ?o .
-                            
-                            ?c skos:inScheme <xxx> .
-                            
-                            ?c a skos:Concept ;
-                                 skos:prefLabel ?pl ;
-                                 skos:definition ?def ;
-                                 dcterms:date ?date ;
-                                 skos:broader ?broader                                  
-                            .
-                            
-                            ?broader skos:narrower ?c .
-                        }
-                        WHERE {
-                            <xxx> ?p ?o .
-                            
-                            {
-                                ?c skos:inScheme <xxx> .
-                            }
-                            {
-                                ?c a skos:Concept ;
-                                     skos:prefLabel ?pl ;
-                                     skos:definition ?def ;
-                                     dcterms:date ?xdate ;
-                                .
-                                
-                                BIND (STRDT(REPLACE(STRBEFORE(?xdate, "."), " ", "T"), xsd:dateTime) AS ?date)
-                                
-                                FILTER(lang(?pl) = "en" || lang(?pl) = "") 
-                            }
-                                
-                            acc_dep
-                            
-                            OPTIONAL {
-                                {
-                                    ?c skos:broader ?broader .
-                                    ?broader skos:inScheme <xxx> .
-                                }
-                                UNION 
-                                {
-                                    ?broader skos:narrower ?c .
-                                    ?broader skos:inScheme <xxx> .
-                                }
-                            }                            
-                        }
-                        ORDER BY ?pl
-                        """.replace("xxx", self.instance_uri).replace("acc_dep", acc_dep_map.get(acc_dep))
-                    return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile == "dd":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    SELECT DISTINCT ?c ?pl ?b
-                    WHERE {
-                        ?c skos:inScheme <xxx> ;
-                           skos:prefLabel ?pl .
 
-                        OPTIONAL {
-                            ?b skos:inScheme <xxx> .
-                            ?c skos:broader ?b .
-                        }
-                        
-                        FILTER(lang(?pl) = "en" || lang(?pl) = "")
-                    }
-                    ORDER BY ?pl                
-                    """.replace("xxx", self.instance_uri)
-                r = sparql_query(q)
-                return JSONResponse(
-                    [
-                        (
-                            {
-                                "uri": x["c"]["value"],
-                                "prefLabel": x["pl"]["value"],
-                                "broader": x["b"]["value"],
-                            }
-                            if x.get("b") is not None
-                            else {"uri": x["c"]["value"], "prefLabel": x["pl"]["value"]}
-                        )
-                        for x in r[1]
-                    ]
+                return templates.TemplateResponse(
+                    "scheme.html",
+                    {
+                        "request": self.request,
+                        "uri": self.instance_uri,
+                        "scheme": scheme,
+                        "profile_token": "nvs",
+                        "logged_in_user": get_user_status(self.request),
+                    },
                 )
-            elif self.profile == "skos":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    CONSTRUCT {
-                        <xxx>
-                          a skos:ConceptScheme ;
-                          skos:prefLabel ?pl ;
-                          skos:defintion ?def ;  
-                          skos:hasTopConcept ?tc ;
-                        .
-                        ?c a skos:Concept ;
-                           skos:prefLabel ?c_pl ;
-                           skos:defintion ?c_def ; 
-                           skos:broader ?broader ;
-                           skos:inScheme <xxx> ;
-                        .
-                        
-                        ?tc skos:topConceptOf <xxx> .  
-                        ?broader skos:narrower ?c .                        
-                    }
-                    WHERE {
-                        <xxx>
-                          skos:prefLabel ?pl ;
-                          dcterms:description ?def ;  
-                          skos:hasTopConcept ?tc ;
-                        .
-                    
-                        { ?c skos:inScheme <xxx> }
-                        UNION
-                        { ?c skos:topConceptOf <xxx> }
-                        UNION
-                        { <xxx>  skos:hasTopConcept ?c }
-                    
-                        ?c 
-                            skos:prefLabel ?c_pl ;
-                            skos:definition ?c_def ;
-                        .
-                    
-                        BIND (STRAFTER(STR(?c), ".uk") AS ?systemUri)
-                        
-                        OPTIONAL { 
-                            ?c skos:broader ?broader .
-                            { ?broader skos:inScheme <xxx>  . }
-                            UNION
-                            { ?broader skos:topConceptOf <xxx>  . }
-                            UNION
-                            { <xxx>  skos:hasTopConcept ?broader . }
-                        }
-                        FILTER(lang(?pl) = "en" || lang(?pl) = "")
-                        FILTER(lang(?def) = "en" || lang(?def) = "")
-                        FILTER(lang(?c_pl) = "en" || lang(?c_pl) = "")
-                        FILTER(lang(?c_def) = "en" || lang(?c_def) = "")
-                    }
-                    ORDER BY ?pl
-                    """.replace("xxx", self.instance_uri)
-                return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
-            elif self.profile == "vocpub":
-                q = """
-                    PREFIX dcterms: <http://purl.org/dc/terms/>
-                    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-                    PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
-                    
-                    CONSTRUCT {
-                        <xxx>
-                          a skos:ConceptScheme ;
-                          skos:prefLabel ?pl ;
-                          skos:defintion ?def ;  
-                          skos:hasTopConcept ?tc ;
-                          dcterms:creator ?creator ;
-                          dcterms:publisher ?publisher ;
-                          dcterms:modified ?modified ;
-                          dcterms:provenance "Made by NERC and maintained within the NERC Vocabulary Server" ; 
-                        .                        
-                        
-                        ?c a skos:Concept ;
-                           skos:prefLabel ?c_pl ;
-                           skos:defintion ?c_def ; 
-                           skos:broader ?broader ;
-                           skos:inScheme <xxx> ;
-                        .
-
-                        ?tc skos:topConceptOf <xxx> .  
-                        ?broader skos:narrower ?c .                        
-                    }
-                    WHERE {
-                        <xxx>
-                          skos:prefLabel ?pl ;
-                          dcterms:description ?def ;  
-                          skos:hasTopConcept ?tc ;
-                          dcterms:publisher ?publisher ;
-                          dcterms:date ?m ;                                                    
-                        .
-                        BIND (STRDT(REPLACE(STRBEFORE(?m, "."), " ", "T"), xsd:dateTime) AS ?modified)
-                        
-                        { ?c skos:inScheme <xxx> }
-                        UNION
-                        { ?c skos:topConceptOf <xxx> }
-                        UNION
-                        { <xxx>  skos:hasTopConcept ?c }
-
-                        ?c 
-                            skos:prefLabel ?c_pl ;
-                            skos:definition ?c_def ;
-                        .
+            elif self.mediatype in RDF_MEDIATYPES:
+                return self._render_scheme_rdf()
+        elif self.profile == "dd":
+            index = get_scheme_index(self.instance_uri, self._get_scheme_date())
+            if index is None:
+                return PlainTextResponse(
+                    "There was an error obtaining the Concepts from the Triplestore",
+                    status_code=500,
+                )
+            concepts = [
+                (
+                    {"uri": concept, "prefLabel": label, "broader": parent}
+                    if parent is not None
+                    else {"uri": concept, "prefLabel": label}
+                )
+                for concept, member in index["members"].items()
+                for label in member["labels"]
+                for parent in index["broader"].get(concept) or [None]
+            ]
+            return JSONResponse(sorted(concepts, key=lambda x: x["prefLabel"]))
+        elif self.profile in ("skos", "vocpub"):
+            return self._render_scheme_rdf()
 
-                        BIND (STRAFTER(STR(?c), ".uk") AS ?systemUri)
+        alt = super().render()
+        if alt is not None:
+            return alt
 
-                        OPTIONAL { 
-                            ?c skos:broader ?broader .
-                            { ?broader skos:inScheme <xxx>  . }
-                            UNION
-                            { ?broader skos:topConceptOf <xxx>  . }
-                            UNION
-                            { <xxx>  skos:hasTopConcept ?broader . }
-                        }
-                        FILTER(lang(?pl) = "en" || lang(?pl) = "")
-                        FILTER(lang(?def) = "en" || lang(?def) = "")
-                        FILTER(lang(?c_pl) = "en" || lang(?c_pl) = "")
-                        FILTER(lang(?c_def) = "en" || lang(?c_def) = "")
-                    }
-                    ORDER BY ?pl
-                    """.replace("xxx", self.instance_uri)
-                return self._render_sparql_response_rdf(sparql_construct(q, self.mediatype))
 
-            alt = super().render()
-            if alt is not None:
-                return alt
+@router.get("/scheme/{scheme_id}/current/", **paths["/scheme/{scheme_id}/current/"]["get"])
+@router.get("/scheme/{scheme_id}/current/{acc_dep}/", include_in_schema=False)
+@router.head("/scheme/{scheme_id}/current/", include_in_schema=False)
+@router.head("/scheme/{scheme_id}/current/{acc_dep}/", include_in_schema=False)
+def scheme(
+    request: Request,
+    scheme_id,
+    acc_dep: Literal["accepted", "deprecated", "all", None] = None,
+):
+    if not exists_triple(request.url.path):
+        raise HTTPException(status_code=404)
 
-    return SchemeRenderer().render()
+    return SchemeRenderer(request, scheme_id, acc_dep).render()
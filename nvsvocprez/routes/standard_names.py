@@ -0,0 +1,236 @@
+"""The Climate and Forecast standard names, served under /standard_name/ from the P07 collection.
+
+The standard name view rewrites every P07 member to a /standard_name/{prefLabel}/ URI. Rather than have the
+triplestore do that rewriting for each request, the member table and the collection's own properties are fetched
+once per P07 version into an in-process snapshot, and every profile and mediatype of /standard_name/ is made from it.
+The nvs profile RDF, which carries every property of every member, is materialised to disk as a collection dump.
+"""
+
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from rdflib import URIRef
+from rdflib import Literal as RdfLiteral
+from rdflib.namespace import DCTERMS, RDF, SKOS
+
+from .collection_dumps import get_dump
+from .page_configs import DATA_URI
+from .rdf_writer import serialise
+from .utils import binding_to_term, cache_return, date_time_literal, sparql_query
+
+P07_URI = f"{DATA_URI}/collection/P07/current/"
+STANDARD_NAME_URI = f"{DATA_URI}/standard_name/"
+
+# {P07 dcterms:date: snapshot}, holding only the current version
+_snapshots = {}
+
+
+def _get_p07() -> Optional[Dict]:
+    for collection in cache_return(collections_or_conceptschemes="collections"):
+        if collection["uri"]["value"] == P07_URI:
+            return collection
+
+
+def get_standard_names() -> Optional[Dict]:
+    """Get the snapshot of the standard names for the current version of P07, building it if P07 has changed.
+
+    Returns (Dict): {
+        "version": The P07 dcterms:date,
+        "collection": The P07 record from the collections index cache,
+        "properties": {predicate: [objects]} of P07 itself, other than skos:member,
+        "members": [{concept, uri, systemUri, id, prefLabel, definition, date, deprecated}] ordered by prefLabel,
+        "concepts_by_label": {standard name: P07 concept URI},
+        "serialisations": {(profile token, mediatype): bytes}, filled as they're requested,
+    }, or None if P07 is not in the index or there was an error querying the triplestore.
+    """
+    collection = _get_p07()
+    if collection is None:
+        return None
+    version = collection.get("date", {}).get("value", "")
+    if version in _snapshots:
+        return _snapshots[version]
+
+    properties_q = """
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        SELECT ?p ?o
+        WHERE {
+            <xxx> ?p ?o .
+            FILTER (?p != skos:member)
+        }
+        """.replace("xxx", P07_URI)
+    members_q = """
+        PREFIX dcterms: <http://purl.org/dc/terms/>
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        SELECT DISTINCT ?x ?pl ?def ?date ?dep
+        WHERE {
+            <xxx> skos:member ?x .
+            ?x skos:prefLabel ?pl .
+            FILTER(lang(?pl) = "en" || lang(?pl) = "")
+            OPTIONAL {
+                ?x skos:definition ?def .
+                FILTER(lang(?def) = "en" || lang(?def) = "")
+            }
+            OPTIONAL { ?x dcterms:date ?date . }
+            OPTIONAL { ?x owl:deprecated ?dep . }
+        }
+        ORDER BY ?pl
+        """.replace("xxx", P07_URI)
+    properties_r = sparql_query(properties_q)
+    if not properties_r[0]:
+        return None
+    members_r = sparql_query(members_q)
+    if not members_r[0]:
+        return None
+
+    properties = {}
+    for row in properties_r[1]:
+        properties.setdefault(URIRef(row["p"]["value"]), []).append(binding_to_term(row["o"]))
+
+    members = {}
+    for row in members_r[1]:
+        label = row["pl"]["value"]
+        if (row["x"]["value"], label) in members:
+            continue
+        members[(row["x"]["value"], label)] = {
+            "concept": row["x"]["value"],
+            "uri": f"{STANDARD_NAME_URI}{label}/",
+            "systemUri": f"/standard_name/{label}/",
+            "id": label,
+            "prefLabel": label.replace("_", " "),
+            "definition": row["def"]["value"].replace("_", "_ ") if row.get("def") is not None else None,
+            "date": row["date"]["value"] if row.get("date") is not None else None,
+            "deprecated": row["dep"]["value"] if row.get("dep") is not None else None,
+        }
+
+    snapshot = {
+        "version": version,
+        "collection": collection,
+        "properties": properties,
+        "members": list(members.values()),
+        "concepts_by_label": {member["id"]: member["concept"] for member in members.values()},
+        "serialisations": {},
+    }
+    _snapshots.clear()
+    _snapshots[version] = snapshot
+    return snapshot
+
+
+def get_concept_uri(standard_name: str) -> Optional[str]:
+    """Get the URI of the P07 concept of a standard name, e.g. air_temperature, from the current snapshot.
+
+    Returns (str): The concept URI, or None if there is no such standard name or the snapshot couldn't be built.
+    """
+    snapshot = get_standard_names()
+    if snapshot is None:
+        return None
+    return snapshot["concepts_by_label"].get(standard_name)
+
+
+def get_concepts(snapshot: Dict, acc_dep: Optional[str]) -> List[Dict]:
+    """The standard names with a definition and date, and of the given status, for the collection page."""
+    status = {"accepted": "false", "deprecated": "true"}.get(acc_dep)
+    return [
+        {
+            "systemUri": member["systemUri"],
+            "id": member["id"],
+            "prefLabel": member["prefLabel"],
+            "definition": member["definition"],
+            "date": member["date"][0:10],
+            "deprecated": member["deprecated"] == "true",
+        }
+        for member in snapshot["members"]
+        if member["definition"] is not None
+        and member["date"] is not None
+        and (status is None or member["deprecated"] == status)
+    ]
+
+
+def _make_triples(snapshot: Dict, profile_token: str) -> Iterator[Tuple]:
+    """Make the triples of the skos or vocpub profile RDF of the standard names. There are none if P07 lacks a
+    property the profile requires."""
+    properties = snapshot["properties"]
+    standard_name = URIRef(STANDARD_NAME_URI)
+
+    labels = properties.get(SKOS.prefLabel, [])
+    descriptions = properties.get(DCTERMS.description, [])
+    dates = properties.get(DCTERMS.date, [])
+    creators = properties.get(DCTERMS.creator, [])
+    publishers = properties.get(DCTERMS.publisher, [])
+    if not (labels and descriptions) or (profile_token == "vocpub" and not (dates and creators and publishers)):
+        return
+
+    yield standard_name, RDF.type, SKOS.Collection
+    for label in labels:
+        yield standard_name, SKOS.prefLabel, label
+    for description in descriptions:
+        yield standard_name, SKOS.definition, description
+    if profile_token == "vocpub":
+        for date in dates:
+            yield standard_name, DCTERMS.modified, date_time_literal(date)
+        for creator in creators:
+            yield standard_name, DCTERMS.creator, creator
+        for publisher in publishers:
+            yield standard_name, DCTERMS.publisher, publisher
+        yield standard_name, DCTERMS.provenance, RdfLiteral(
+            "Made by NERC and maintained within the NERC Vocabulary Server"
+        )
+
+    for member in snapshot["members"]:
+        yield standard_name, SKOS.member, URIRef(member["uri"])
+    for member in snapshot["members"]:
+        yield URIRef(member["uri"]), SKOS.prefLabel, RdfLiteral(member["prefLabel"])
+
+
+def get_serialisation(snapshot: Dict, profile_token: str, mediatype: str) -> bytes:
+    """Get the dd JSON, or the skos or vocpub RDF in a mediatype, of the standard names, made once per snapshot."""
+    key = (profile_token, mediatype)
+    if key not in snapshot["serialisations"]:
+        if profile_token == "dd":
+            members = sorted(snapshot["members"], key=lambda member: member["prefLabel"])
+            content = json.dumps([{"uri": m["uri"], "prefLabel": m["prefLabel"]} for m in members]).encode("utf-8")
+        else:
+            content = serialise(_make_triples(snapshot, profile_token), mediatype)
+        snapshot["serialisations"][key] = content
+    return snapshot["serialisations"][key]
+
+
+def get_nvs_dump(snapshot: Dict, mediatype: str) -> Optional[Dict]:
+    """Get the dump of the nvs profile RDF of the standard names, every P07 member with all its properties.
+
+    Returns (Dict): The dump's sidecar, see collection_dumps.get_dump(), or None if it could not be produced.
+
+    Raises collection_dumps.DumpNotReady if the dump is being materialised in the background.
+    """
+    q = """
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+
+        CONSTRUCT {
+            <DATA_URI/standard_name/> ?p ?o .
+            <DATA_URI/standard_name/> skos:member ?m .
+            ?m ?p2 ?o2 .
+        }
+        WHERE {
+            {
+                <DATA_URI/collection/P07/current/> ?p ?o .
+                MINUS { <DATA_URI/collection/P07/current/> skos:member ?o . }
+            }
+
+            {
+                <DATA_URI/collection/P07/current/> skos:member ?mx .
+                ?mx a skos:Concept ;
+                      skos:prefLabel ?pl ;
+                .
+
+                FILTER(!isLiteral(?pl) || lang(?pl) = "en" || lang(?pl) = "")
+
+                ?mx ?p2 ?o2 .
+
+                FILTER ( ?p2 != skos:broaderTransitive )
+                FILTER ( ?p2 != skos:narrowerTransitive )
+            }
+
+            BIND (IRI(CONCAT("DATA_URI/standard_name/", STR(?pl), "/")) AS ?m)
+        }
+        """.replace("DATA_URI", DATA_URI)
+    return get_dump("standard_name", "nvs", mediatype, q, snapshot["version"])
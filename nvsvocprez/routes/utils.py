@@ -5,22 +5,31 @@ import logging
 logging.basicConfig(level=logging.INFO)
 from typing import Dict, List, Literal
 import httpx
+import json
 from . import page_configs
 import pickle
 from pathlib import Path
-import requests
 from pyldapi.data import RDF_MEDIATYPES
 import re
 from pyldapi.profile import Profile
 from utilities import config
 from bs4 import BeautifulSoup
+from . import ords
+from .rdf_writer import serialise
+from rdflib import BNode, Graph, URIRef, Literal as RdfLiteral
+from rdflib.namespace import RDF, RDFS, XSD
 import sys
-import os
+import functools
+import hashlib
+import time
 import diskcache
 
 api_home_dir = Path(__file__).parent
-collections_pickle = Path(api_home_dir / "cache" / "collections.pickle")
-conceptschemes_pickle = Path(api_home_dir / "cache" / "conceptschemes.pickle")
+# The version of the fields the index caches hold. It is in the names of their pickles, so pickles written with other
+# fields are refilled rather than read. Bump it whenever cache_fill()'s queries change what they select.
+INDEX_CACHE_FORMAT = 2
+collections_pickle = Path(api_home_dir / "cache" / f"collections.{INDEX_CACHE_FORMAT}.pickle")
+conceptschemes_pickle = Path(api_home_dir / "cache" / f"conceptschemes.{INDEX_CACHE_FORMAT}.pickle")
 
 
 class TriplestoreError(Exception):
@@ -29,9 +38,53 @@ class TriplestoreError(Exception):
 
 config_ = config.verify_env_file()
 
-# Shared cache across worker processes
-cache_dir = os.path.expanduser("~/ords_cache")
-ords_cache = diskcache.Cache(cache_dir, size_limit=12 * 1024 * 1024)
+construct_cache = diskcache.Cache(page_configs.CONSTRUCT_CACHE_DIR, size_limit=page_configs.CONSTRUCT_CACHE_SIZE)
+
+
+def memoize_in_process(ttl: int):
+    """Hold the results of a function memoised with ords.memoize() in process for ttl seconds, under the same keys.
+
+    The shared diskcache costs a SQLite read and an unpickle per call, so lookups made several times per request are
+    answered from a dict instead, while the disk tier is still shared by the workers and outlives them. The results
+    are shared between callers, who must not change them.
+    """
+
+    def decorator(func):
+        held = {}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = func.__cache_key__(*args, **kwargs)
+            now = time.monotonic()
+            entry = held.get(key)
+            if entry is None or entry[0] <= now:
+                entry = held[key] = (now + ttl, func(*args, **kwargs))
+            else:
+                ords.ords_cache.counters["in_process_hits"] += 1
+            return entry[1]
+
+        wrapper.cache_clear = held.clear
+        return wrapper
+
+    return decorator
+
+
+# the rdflib format each RDF mediatype, and the others commonly asked for in their place, is serialised in
+RDF_FORMATS = {
+    "text/turtle": "turtle",
+    "text/n3": "n3",
+    "application/n-triples": "nt",
+    "application/ld+json": "json-ld",
+    "application/rdf+xml": "xml",
+    "application/rdf": "xml",
+    "application/rdf xml": "xml",
+    "application/json": "json-ld",
+    "application/ld json": "json-ld",
+    "text/ttl": "turtle",
+    "text/ntriples": "nt",
+    "text/n-triples": "nt",
+    "text/plain": "nt",
+}
 
 
 def get_user_status(request, login_status=config_.get("LOGIN_ENABLE")):
@@ -68,8 +121,81 @@ def sparql_construct(query: str, rdf_mediatype="text/turtle"):
         return False, r.status_code, r.text
 
 
+_PREFIX = re.compile(r"PREFIX\s+([A-Za-z][\w.-]*)?:\s*<([^>]*)>", re.IGNORECASE)
+
+
+def query_prefixes(query: str) -> Dict[str, str]:
+    """The {prefix: namespace} of the PREFIX declarations of a SPARQL query."""
+    return {prefix: namespace for prefix, namespace in _PREFIX.findall(query) if prefix}
+
+
+def construct_rdf(query: str, rdf_mediatype="text/turtle"):
+    """Run a CONSTRUCT or DESCRIBE query and get its result in an RDF mediatype, as sparql_construct() does.
+
+    The result is fetched once, as N-Triples, and kept in construct_cache. Every other mediatype is made from the
+    N-Triples and kept alongside them, so a resource asked for in several costs one query. JSON-LD is compacted
+    against the query's PREFIXes, as the triplestore does, by rdf_writer; the rest are serialised with rdflib, using
+    the same prefixes.
+
+    Entries are keyed on the current fill of the index caches, see cache_version(), so they are of the same data as
+    the index and an edit is seen once the index is refilled. Those of older fills are no longer read, and leave the
+    cache after CONSTRUCT_CACHE_EXPIRE seconds.
+
+    Returns: (True, bytes) or, if the triplestore gave an error, (False, status code, text).
+    """
+    version = f"{cache_version('collections')}-{cache_version('conceptschemes')}"
+    key = f"{version} {hashlib.sha256(query.encode('utf-8')).hexdigest()}"
+    rdf_format = RDF_FORMATS.get(rdf_mediatype, "turtle")
+    serialisation = construct_cache.get(f"{key} {rdf_format}")
+    if serialisation is not None:
+        return True, serialisation
+
+    ntriples = construct_cache.get(f"{key} nt")
+    if ntriples is None:
+        r = sparql_construct(query, "application/n-triples")
+        if not r[0]:
+            return r
+        ntriples = r[1]
+        construct_cache.set(f"{key} nt", ntriples, expire=page_configs.CONSTRUCT_CACHE_EXPIRE)
+    if rdf_format == "nt":
+        return True, ntriples
+
+    prefixes = query_prefixes(query)
+    g = Graph().parse(data=ntriples.decode("utf-8"), format="nt")
+    if rdf_format == "json-ld":
+        serialisation = serialise(g, "application/ld+json", context=prefixes)
+    else:
+        for prefix, namespace in prefixes.items():
+            g.bind(prefix, namespace)
+        serialisation = g.serialize(format=rdf_format, encoding="utf-8")
+    construct_cache.set(f"{key} {rdf_format}", serialisation, expire=page_configs.CONSTRUCT_CACHE_EXPIRE)
+    return True, serialisation
+
+
+def binding_to_term(binding: Dict):
+    """Make an RDF term from a SPARQL JSON results binding."""
+    if binding["type"] == "uri":
+        return URIRef(binding["value"])
+    if binding["type"] == "bnode":
+        return BNode(binding["value"])
+    return RdfLiteral(binding["value"], lang=binding.get("xml:lang"), datatype=binding.get("datatype"))
+
+
+def english_literals(literals: List) -> List:
+    """The literals that are in English or have no language, as FILTER(lang(?x) = "en" || lang(?x) = "")."""
+    return [literal for literal in literals if isinstance(literal, RdfLiteral) and literal.language in ("en", None)]
+
+
+def date_time_literal(date) -> RdfLiteral:
+    """A dcterms:date such as "2008-06-02 14:04:51.0" as an xsd:dateTime, as the queries' BIND of
+    STRDT(REPLACE(STRBEFORE(?date, "."), " ", "T"), xsd:dateTime)."""
+    value = str(date)
+    return RdfLiteral(value.split(".", 1)[0].replace(" ", "T") if "." in value else "", datatype=XSD.dateTime)
+
+
 def cache_clear():
     logging.debug("cleared cache")
+    construct_cache.clear()
     if collections_pickle.is_file():
         collections_pickle.unlink()
     if conceptschemes_pickle.is_file():
@@ -89,6 +215,7 @@ def cache_fill(collections_or_conceptschemes_or_both: Literal["collections", "co
             PREFIX owl: <http://www.w3.org/2002/07/owl#>
             SELECT ?uri ?id ?systemUri ?prefLabel ?created ?issued ?modified ?creator ?publisher ?license
             (GROUP_CONCAT(?conformsto;SEPARATOR=",") AS ?conforms_to) ?versionInfo ?description ?registermanager ?registerowner ?seeAlso
+            (SAMPLE(?m) AS ?date) (SAMPLE(?t) AS ?title)
             WHERE {
                 ?uri a skos:Collection .
                 BIND (STRAFTER(STRBEFORE(STR(?uri), "/current/"), "/collection/") AS ?id)
@@ -116,6 +243,7 @@ def cache_fill(collections_or_conceptschemes_or_both: Literal["collections", "co
                     ?uri <http://www.isotc211.org/schemas/grg/RE_RegisterOwner> ?registerowner .
                 }
                 OPTIONAL { ?uri rdfs:seeAlso ?seeAlso }
+                OPTIONAL { ?uri dcterms:title ?t }
             }
 group by ?uri ?id ?systemUri ?prefLabel ?created ?issued ?modified ?creator ?publisher ?license ?versionInfo ?description ?registermanager ?registerowner ?seeAlso
             ORDER BY ?prefLabel 
@@ -125,6 +253,7 @@ group by ?uri ?id ?systemUri ?prefLabel ?created ?issued ?modified ?creator ?pub
         if collections_json[0]:  # i.e. we got no error
             with open(collections_pickle, "wb") as cache_file:
                 pickle.dump(collections_json[1], cache_file)
+            ords.in_background(prefetch_external_mappings)
         else:
             raise TriplestoreError(
                 f"The call to fill the Collections index cache failed. Status Code: {collections_json[1]} , "
@@ -137,6 +266,7 @@ group by ?uri ?id ?systemUri ?prefLabel ?created ?issued ?modified ?creator ?pub
             PREFIX dcterms: <http://purl.org/dc/terms/>
             PREFIX owl: <http://www.w3.org/2002/07/owl#>
             SELECT ?uri ?id ?systemUri ?prefLabel ?modified ?creator ?publisher ?versionInfo ?description
+            (SAMPLE(?m) AS ?date) (SAMPLE(?t) AS ?title)
             WHERE {
                 ?uri a skos:ConceptScheme .
                 BIND (STRAFTER(STRBEFORE(STR(?uri), "/current/"), "/scheme/") AS ?id)
@@ -154,7 +284,9 @@ group by ?uri ?id ?systemUri ?prefLabel ?created ?issued ?modified ?creator ?pub
                 OPTIONAL { ?uri dcterms:description ?description .
                     FILTER(lang(?description) = "en" || lang(?description) = "") 
                 }
+                OPTIONAL { ?uri dcterms:title ?t }
             }
+            group by ?uri ?id ?systemUri ?prefLabel ?modified ?creator ?publisher ?versionInfo ?description
             ORDER BY ?prefLabel
             """
 
@@ -219,6 +351,77 @@ def cache_return(collections_or_conceptschemes: Literal["collections", "concepts
         return markdown.markdown(text)
 
 
+def cache_version(collections_or_conceptschemes: Literal["collections", "conceptschemes"]) -> int:
+    """Return a token identifying the current fill of an index cache.
+
+    The token is the modification time of the cache's pickle file, so it changes every time the cache is cleared
+    and refilled. Anything derived from the index can be memoised against it.
+    """
+    if collections_or_conceptschemes == "collections":
+        pickle_file = collections_pickle
+    else:
+        pickle_file = conceptschemes_pickle
+
+    if not pickle_file.is_file():
+        cache_fill(collections_or_conceptschemes_or_both=collections_or_conceptschemes)
+
+    return pickle_file.stat().st_mtime_ns
+
+
+# {(collections_or_conceptschemes, instance_uri): {version, members, serialisations}}
+_container_members = {}
+
+# the context the mem profile JSON-LD is compacted against
+MEM_CONTEXT = {"rdf": str(RDF), "rdfs": str(RDFS)}
+
+
+def get_container_members(
+    collections_or_conceptschemes: Literal["collections", "conceptschemes"], instance_uri: str, label: str
+) -> Dict:
+    """Get the mem profile member list of a container, and its serialisations, for the current index cache.
+
+    The member list, its JSON and its RDF in each of RDF_MEDIATYPES are built once per index cache fill and then
+    held in process, so repeated mem profile requests are served from bytes. The JSON-LD is compacted against
+    MEM_CONTEXT.
+
+    Returns (Dict): {"members": [{uri, systemUri, label}, ...], "serialisations": {mediatype: bytes, ...}}.
+    """
+    key = (collections_or_conceptschemes, instance_uri)
+    version = cache_version(collections_or_conceptschemes)
+    cached = _container_members.get(key)
+    if cached is not None and cached["version"] == version:
+        return cached
+
+    members = tuple(
+        {
+            "uri": item["uri"]["value"],
+            "systemUri": item["systemUri"]["value"],
+            "label": item["prefLabel"]["value"],
+        }
+        for item in cache_return(collections_or_conceptschemes=collections_or_conceptschemes)
+    )
+
+    serialisations = {
+        "application/json": json.dumps([{"uri": m["uri"], "label": m["label"]} for m in members]).encode("utf-8")
+    }
+
+    def triples():
+        container = URIRef(instance_uri)
+        yield container, RDF.type, RDF.Bag
+        yield container, RDFS.label, RdfLiteral(label)
+        for member in members:
+            yield container, RDFS.member, URIRef(member["uri"])
+        for member in members:
+            yield URIRef(member["uri"]), RDFS.label, RdfLiteral(member["label"])
+
+    for mediatype in RDF_MEDIATYPES:
+        serialisations[mediatype] = serialise(triples(), mediatype, context=MEM_CONTEXT)
+
+    cached = {"version": version, "members": members, "serialisations": serialisations}
+    _container_members[key] = cached
+    return cached
+
+
 def render_concept_tree(html_doc):
     soup = BeautifulSoup(html_doc, "html.parser")
 
@@ -241,6 +444,14 @@ def get_accepts(accept_header: str):
     return [accept.split(";")[0].replace("*/*", "text/html") for accept in accept_header.split(",")]
 
 
+def etag_matches(request, etag: str) -> bool:
+    """Whether a request's If-None-Match header matches an ETag, so a 304 Not Modified can be returned."""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
 def exists_triple(s: str):
     query = f"select count(*) where {{ <{page_configs.DATA_URI + s}> ?p ?o .}}"
     rr = sparql_query(query)
@@ -248,7 +459,8 @@ def exists_triple(s: str):
     return True if bool(int(count)) else False
 
 
-@ords_cache.memoize(expire=604800, tag="ords")
+@memoize_in_process(page_configs.ORDS_L1_TTL)
+@ords.memoize
 def get_ontologies() -> Dict:
     """Get ontologies from livbodcsos ords endpoint.
 
@@ -258,17 +470,11 @@ def get_ontologies() -> Dict:
     if page_configs.ORDS_ENDPOINT_URL is None:
         logging.error("Environment variable ORDS_ENDPOINT_URL is not set.")
         return {}
-    try:
-        url = f"{page_configs.ORDS_ENDPOINT_URL}/ontology"
-        resp_json = requests.get(url).json()
-        ont_data_by_prefix = {ont["prefix"]: ont for ont in resp_json["items"]}
-        return ont_data_by_prefix
-    except requests.RequestException as exc:
-        logging.error("Failed to retrieve ontology information from %s.\n%s", url, exc)
-        return {}  # Return blank dict to avoid internal server error.
+    return {ont["prefix"]: ont for ont in ords.fetch_items("ontology")}
 
 
-@ords_cache.memoize(expire=604800, tag="ords")
+@memoize_in_process(page_configs.ORDS_L1_TTL)
+@ords.memoize
 def get_alt_profiles() -> Dict:
     """Get alt profiles from livbodcsos ords endpoint.
 
@@ -278,14 +484,7 @@ def get_alt_profiles() -> Dict:
     if page_configs.ORDS_ENDPOINT_URL is None:
         logging.error("Environment variable ORDS_ENDPOINT_URL is not set.")
         return {}
-    try:
-        url = f"{page_configs.ORDS_ENDPOINT_URL}/altprof"
-        resp_json = requests.get(url).json()
-        altprof_data_by_url = {alt["url"]: alt for alt in resp_json["items"]}
-        return altprof_data_by_url
-    except requests.RequestException as exc:
-        logging.error("Failed to retrieve alternate profile information from %s.\n%s", url, exc)
-        return {}  # Return blank dict to avoid internal server error.
+    return {alt["url"]: alt for alt in ords.fetch_items("altprof")}
 
 
 def get_alt_profile_objects(
@@ -338,23 +537,7 @@ def get_collection_query(profile: Profile, instance_uri: str, ontologies: Dict):
         str: The construncted sparql query.
     """
 
-    prefix_text = ""
-    filter_text = ""
-    if profile.id != "nvs":
-        # Build prefix text.
-        for ontology, data in profile.ontologies.items():
-            prefix_text += f'PREFIX {data["prefix"]}: <{data["url"]}>\n'
-        filter_text += """
-            FILTER ( ?p2 != skos:broader )
-            FILTER ( ?p2 != skos:narrower )
-            FILTER ( ?p2 != skos:related )
-            FILTER ( ?p2 != owl:sameAs )
-        """
-
-    for ontology, data in ontologies.items():
-        if ontology not in profile.ontologies:
-            # Build filter text.
-            filter_text += f'FILTER (!STRSTARTS(STR(?p2), "{data["url"]}"))\n'
+    prefix_text, filter_text = _collection_query_prefixes_and_filters(profile, ontologies)
 
     query = f"""
         PREFIX dc: <http://purl.org/dc/terms/>
@@ -389,7 +572,129 @@ def get_collection_query(profile: Profile, instance_uri: str, ontologies: Dict):
     return query
 
 
-@ords_cache.memoize(expire=604800, tag="ords")
+def get_collection_page_query(
+    profile: Profile, instance_uri: str, ontologies: Dict, page: int, page_size: int, acc_dep_term: str = ""
+):
+    """Generate a query for one page of a collection's RDF, over its members ordered by URI.
+
+    The first page also carries the collection's own properties. Each page holds the same member properties as
+    the whole collection query from get_collection_query.
+
+    Args:
+        profile (Profile): Profile object representing the current profile.
+        instance_uri (str): Instance URI.
+        ontologies: Dict of all ontologies. {ontology_prefix : {ontology_object}, ...}.
+        page (int): 1-based page number.
+        page_size (int): Number of members per page.
+        acc_dep_term (str): Optional pattern on ?m to restrict members to accepted or deprecated ones.
+    Returns:
+        str: The constructed sparql query.
+    """
+    prefix_text, filter_text = _collection_query_prefixes_and_filters(profile, ontologies)
+
+    collection_properties = f"""
+            {{
+            <{instance_uri}> ?p ?o .
+            MINUS {{ <{instance_uri}> skos:member ?o . }}
+            }}
+            UNION"""
+
+    query = f"""
+        PREFIX dc: <http://purl.org/dc/terms/>
+        PREFIX dce: <http://purl.org/dc/elements/1.1/>
+        PREFIX grg: <http://www.isotc211.org/schemas/grg/>
+        PREFIX owl: <http://www.w3.org/2002/07/owl#>
+        PREFIX pav: <http://purl.org/pav/>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        PREFIX void: <http://rdfs.org/ns/void#>
+        {prefix_text}
+        CONSTRUCT {{
+            <{instance_uri}> ?p ?o .
+            <{instance_uri}> skos:member ?m .
+            ?m ?p2 ?o2 .
+        }}
+        WHERE {{
+            {collection_properties if page == 1 else ""}
+            {{
+            {{
+                SELECT ?m
+                WHERE {{
+                    <{instance_uri}> skos:member ?m .
+                    ?m a skos:Concept .
+                    {acc_dep_term}
+                }}
+                ORDER BY ?m
+                OFFSET {(page - 1) * page_size}
+                LIMIT {page_size}
+            }}
+            ?m ?p2 ?o2 .
+            FILTER ( ?p2 != skos:broaderTransitive )
+            FILTER ( ?p2 != skos:narrowerTransitive )
+            {filter_text}
+            }}
+        }}
+    """
+    return query
+
+
+# {(instance_uri, acc_dep_term): (dcterms:date of the collection, count)}
+_member_counts = {}
+
+
+def get_collection_member_count(instance_uri: str, acc_dep_term: str = "", date: str = None, recount=False) -> int:
+    """Count the Concept members of a collection, optionally restricted to accepted or deprecated ones (on ?m).
+
+    If the collection's full dcterms:date is given the count is memoised against it, and made again once the
+    collection has another date, rather than for every page. Without a date, or with recount, it is made afresh.
+    """
+    key = (instance_uri, acc_dep_term)
+    cached = _member_counts.get(key)
+    if date is not None and not recount and cached is not None and cached[0] == date:
+        return cached[1]
+
+    q = f"""
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        SELECT (COUNT(DISTINCT ?m) AS ?count)
+        WHERE {{
+            <{instance_uri}> skos:member ?m .
+            ?m a skos:Concept .
+            {acc_dep_term}
+        }}
+    """
+    r = sparql_query(q)
+    if not r[0]:
+        raise TriplestoreError(f"The call to count the members of {instance_uri} failed. Status Code: {r[1]}")
+    count = int(r[1][0]["count"]["value"])
+    if date is not None:
+        _member_counts[key] = (date, count)
+    return count
+
+
+def _collection_query_prefixes_and_filters(profile: Profile, ontologies: Dict):
+    """Build the PREFIX lines and member property FILTERs a profile's collection queries need."""
+    prefix_text = ""
+    filter_text = ""
+    if profile.id != "nvs":
+        # Build prefix text.
+        for ontology, data in profile.ontologies.items():
+            prefix_text += f'PREFIX {data["prefix"]}: <{data["url"]}>\n'
+        filter_text += """
+            FILTER ( ?p2 != skos:broader )
+            FILTER ( ?p2 != skos:narrower )
+            FILTER ( ?p2 != skos:related )
+            FILTER ( ?p2 != owl:sameAs )
+        """
+
+    for ontology, data in ontologies.items():
+        if ontology not in profile.ontologies:
+            # Build filter text.
+            filter_text += f'FILTER (!STRSTARTS(STR(?p2), "{data["url"]}"))\n'
+
+    return prefix_text, filter_text
+
+
+@memoize_in_process(page_configs.ORDS_L1_TTL)
+@ords.memoize
 def get_external_mappings(collection_id: str) -> Dict:
     """Get external mappings title from livbodcsos ords endpoint.
 
@@ -399,14 +704,15 @@ def get_external_mappings(collection_id: str) -> Dict:
     if page_configs.ORDS_ENDPOINT_URL is None:
         logging.error("Environment variable ORDS_ENDPOINT_URL is not set.")
         return {}
-    try:
-        url = f"{page_configs.ORDS_ENDPOINT_URL}/collection-external-mappings/{collection_id}"
-        resp_json = requests.get(url).json()
-        external_mapping_data = {mapping["url"]: mapping for mapping in resp_json["items"]}
-        return external_mapping_data
-    except requests.RequestException as exc:
-        logging.error("Failed to retrieve external mappings information from %s.\n%s", url, exc)
-        return {}  # Return blank dict to avoid internal server error.
+    return {mapping["url"]: mapping for mapping in ords.fetch_items(f"collection-external-mappings/{collection_id}")}
+
+
+def prefetch_external_mappings():
+    """Fetch the external mappings of every collection in the index that aren't in ords_cache or are due a refresh,
+    in parallel, so no concept request waits on ORDS for its collection's. Run in the background at startup and
+    whenever the collections index cache is filled."""
+    collections = cache_return(collections_or_conceptschemes="collections")
+    get_external_mappings.prefetch((collection["id"]["value"],) for collection in collections)
 
 
 def extract_external_mapping_url(tag: str) -> str: